@@ -0,0 +1,115 @@
+import sys
+sys.path.append('wordwars-1311')
+
+from board import Board, EMPTY, bits, runAround
+
+class Test():
+
+    def assertTrue(self, booleanExpression, description):
+        if not booleanExpression:
+            raise ValueError("{} is not True".format(description))
+        else:
+            print('passed test: {}'.format(description))
+
+    def test_create_empty(self):
+        board = Board(25, 25)
+        self.assertTrue(
+            board.asString() == EMPTY * 625,
+            "new 25x25 board has 625 empty cells")
+        self.assertTrue(board.isEmpty(24, 24), "bottom right is empty")
+
+    def test_rows_and_columns(self):
+        board = Board(4, 3)
+        board.setLetter(1, 0, 'c')
+        board.setLetter(1, 1, 'a')
+        board.setLetter(1, 2, 't')
+        board.setLetter(2, 1, 'x')
+        self.assertTrue(board.letter(1, 1) == 'a', "letter reads back")
+        self.assertTrue(board.row(1).asString() == '_ax_', "row 1 is _ax_")
+        self.assertTrue(
+            board.column(1).asString() == 'cat', "column 1 reads cat")
+        self.assertTrue(
+            ''.join(board.column(2)) == '_x_', "iterate column 2")
+        self.assertTrue(board.column(1)[-1] == 't', "index column from end")
+
+    def test_round_trip(self):
+        board = Board(5, 2)
+        board.setLetter(4, 1, 'z')
+        copy = Board.fromString(5, 2, board.asString())
+        self.assertTrue(copy.letter(4, 1) == 'z', "string round trip")
+        try:
+            board.letter(0, 2)
+            self.assertTrue(False, "able to read below the board")
+        except ValueError, e:
+            self.assertTrue(True, "error reading below the board")
+
+    def test_no_wrap(self):
+        board = Board(4, 3)
+        try:
+            board.letter(4, 0)
+            self.assertTrue(False, "able to read past the end of a row")
+        except ValueError, e:
+            self.assertTrue(True, "error reading past the end of a row")
+        self.assertTrue(
+            not board.fits(2, 0, True, 3), "word running off the right edge")
+        self.assertTrue(board.fits(1, 0, True, 3), "word that fits a row")
+
+    def test_occupancy(self):
+        board = Board(5, 5)
+        board.setLetter(2, 2, 'a')
+        board.setLetter(3, 2, 't')
+        self.assertTrue(
+            board.rows[2] == 0b01100 and board.cols[3] == 0b00100,
+            "row and column masks follow placements")
+        self.assertTrue(
+            list(bits(board.anchors(True, 2))) == [1, 4],
+            "anchors either side of 'at'")
+        self.assertTrue(
+            list(bits(board.anchors(True, 1))) == [2, 3],
+            "anchors above 'at'")
+        self.assertTrue(board.touches(0, 1, True, 3), "play above touches")
+        self.assertTrue(
+            not board.touches(0, 0, True, 5), "play two rows up does not")
+        self.assertTrue(
+            runAround(board.rows[2], 4) == (2, 5),
+            "run through the square after 'at'")
+        board.setLetter(2, 2, EMPTY)
+        self.assertTrue(
+            board.rows[2] == 0b01000 and board.count == 1,
+            "clearing a square updates masks")
+
+    def test_hash(self):
+        board = Board(5, 5)
+        self.assertTrue(board.hash == 0, "empty board hashes to zero")
+        board.setLetter(2, 2, 'a')
+        board.setLetter(3, 2, 't')
+        loaded = Board.fromString(5, 5, board.asString())
+        self.assertTrue(
+            board.hash == loaded.hash, "placed letters hash like loaded ones")
+        board.setLetter(3, 2, 'n')
+        self.assertTrue(board.hash != loaded.hash, "replaced letter changes hash")
+        board.setLetter(3, 2, EMPTY)
+        board.setLetter(2, 2, EMPTY)
+        self.assertTrue(board.hash == 0, "clearing letters restores hash")
+
+    def test_occupied(self):
+        board = Board(40, 30)
+        self.assertTrue(board.occupied() == [], "empty board has no letters")
+        board.setLetter(39, 29, 'z')
+        board.setLetter(5, 1, 'b')
+        board.setLetter(2, 1, 'a')
+        positions = board.occupied()
+        self.assertTrue(
+            positions == [42, 45, 1199] and
+            ''.join([board.letter(i % 40, i // 40) for i in positions]) ==
+            'abz', "occupied cells listed in row order")
+
+
+t = Test()
+t.test_create_empty()
+t.test_rows_and_columns()
+t.test_round_trip()
+t.test_no_wrap()
+t.test_occupancy()
+t.test_hash()
+t.test_occupied()
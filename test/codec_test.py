@@ -0,0 +1,97 @@
+import sys
+sys.path.append('wordwars-1311')
+
+from codec import (
+    encodeGame, decodeGame, writeVarint, readVarint, zigzag, unzigzag)
+from game import Game, Member
+from letters import LetterBag
+
+
+# this tests the compact encoding of a game's bag, board and players
+class Test():
+
+    def assertTrue(self, booleanExpression, description):
+        if not booleanExpression:
+            raise ValueError("{} is not True".format(description))
+        else:
+            print('passed test: {}'.format(description))
+
+    def userFields(self, user):
+        return [user.name, user.email]
+
+    def newGame(self):
+        game = Game.create(15, 15, LetterBag.standardSet())
+        game.addPlayer(Member('joe', 'joe@gmail.com'))
+        game.addPlayer(Member(u'j\xf6rg', 'jorg@gmail.com'))
+        game.start()
+        return game
+
+    def test_varint(self):
+        values = [0, 1, 127, 128, 300, 16383, 16384, 2 ** 40]
+        out = bytearray()
+        for n in values:
+            writeVarint(out, n)
+        pos = 0
+        read = []
+        for n in values:
+            n, pos = readVarint(out, pos)
+            read.append(n)
+        self.assertTrue(read == values and pos == len(out),
+                        "varints read back as written")
+        self.assertTrue(
+            [unzigzag(zigzag(n)) for n in (0, -1, 1, -64, 64)] ==
+            [0, -1, 1, -64, 64] and zigzag(-1) == 1,
+            "zigzag maps signed scores to unsigned and back")
+
+    def test_round_trip(self):
+        game = self.newGame()
+        joe = game.players[0].player
+        game.players[0].bag = LetterBag.fromString('catgegae')
+        game.playWord(joe, 7, 7, True, 'cat')
+        game.players[1].score = -3
+        data = encodeGame(game, self.userFields)
+        packed = decodeGame(data)
+        self.assertTrue(
+            packed.counts == game.bagOfLetters.counts and
+            str(packed.cells) == game.boardContent.asString(),
+            "bag and board decode as encoded")
+        self.assertTrue(
+            [(p.turnNumber, p.score, p.counts, p.user)
+             for p in packed.players] ==
+            [(p.turnNumber, p.score, p.bag.counts,
+              [p.player.name, p.player.email]) for p in game.players],
+            "players decode as encoded, with negative scores and unicode")
+
+    def test_size(self):
+        game = self.newGame()
+        data = encodeGame(game, self.userFields)
+        strings = (len(game.bagOfLetters.asString()) +
+                   len(game.boardContent.asString()) +
+                   sum(len(p.bag.asString()) for p in game.players))
+        self.assertTrue(
+            len(data) < strings,
+            "encoding ({} bytes) is smaller than the letter strings ({})"
+            .format(len(data), strings))
+
+    def test_large_counts(self):
+        game = self.newGame()
+        game.bagOfLetters = LetterBag.fromString('e' * 300 + 'q')
+        packed = decodeGame(encodeGame(game, self.userFields))
+        self.assertTrue(packed.counts == game.bagOfLetters.counts,
+                        "counts of 128 or more round trip")
+
+    def test_format(self):
+        data = encodeGame(self.newGame(), self.userFields)
+        try:
+            decodeGame(chr(99) + data[1:])
+            self.assertTrue(False, "decoded an unknown format")
+        except ValueError:
+            self.assertTrue(True, "unknown format is rejected")
+
+
+t = Test()
+t.test_varint()
+t.test_round_trip()
+t.test_size()
+t.test_large_counts()
+t.test_format()
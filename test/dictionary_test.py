@@ -0,0 +1,64 @@
+import sys
+sys.path.append('wordwars-1311')
+
+import os
+import tempfile
+import dictionary
+from dictionary import Dictionary, build
+
+class Test():
+
+    def assertTrue(self, booleanExpression, description):
+        if not booleanExpression:
+            raise ValueError("{} is not True".format(description))
+        else:
+            print('passed test: {}'.format(description))
+
+    def load(self, words):
+        fd, path = tempfile.mkstemp(suffix='.dawg')
+        os.close(fd)
+        build(words, path)
+        return Dictionary.load(path)
+
+    def test_lookup(self):
+        d = self.load(['cat', 'cats', 'cage', 'gag', 'gate', 'Dog', "can't"])
+        for w in ['cat', 'cats', 'cage', 'gag', 'gate', 'dog']:
+            self.assertTrue(w in d, "{} is in the dictionary".format(w))
+        for w in ['ca', 'catss', 'dogs', '', 'cant', 'zebra']:
+            self.assertTrue(
+                w not in d, "{} is not in the dictionary".format(w))
+
+    def test_walk(self):
+        d = self.load(['at', 'ate', 'eat', 'tea'])
+        node = d.follow(d.root, 'a')
+        self.assertTrue(not d.isWord(node), "'a' alone is not a word")
+        node = d.follow(node, 't')
+        self.assertTrue(d.isWord(node), "'at' is a word")
+        self.assertTrue(
+            [l for l, n in d.children(node)] == ['e'],
+            "only 'e' follows 'at'")
+        self.assertTrue(d.follow(node, 'x') < 0, "no 'atx' path")
+        self.assertTrue(
+            [l for l, n in d.children(d.root)] == ['a', 'e', 't'],
+            "root letters in order")
+
+    def test_empty(self):
+        d = self.load([])
+        self.assertTrue('a' not in d, "empty dictionary has no words")
+
+    def test_without_mmap(self):
+        saved = dictionary.mmap
+        dictionary.mmap = None     # as in the App Engine sandbox
+        try:
+            d = self.load(['cat', 'gate'])
+        finally:
+            dictionary.mmap = saved
+        self.assertTrue('cat' in d and 'gat' not in d,
+                        "dictionary read into memory without mmap")
+
+
+t = Test()
+t.test_lookup()
+t.test_walk()
+t.test_empty()
+t.test_without_mmap()
@@ -1,9 +1,13 @@
 import sys
 sys.path.append('wordwars-1311')
 
-from models import User, GameState, PlayerState, LetterBag
-from repositories import GameStateRepository
+from models import User, GameState, PlayerState, LetterBag, Move
+from repositories import (
+  GameStateRepository, PlayerStateRepository, UserRepository,
+  UserStatsRepository, MoveRepository, GameCache, ConcurrentUpdate,
+  LAYOUT_AGGREGATE, LAYOUT_ENTITIES)
 from print_view import PrintView
+import repositories
 import utils
 
 import unittest
@@ -96,5 +100,494 @@ class Test():
 
     self.tearDown()
 
+  def testRestorePlayers(self):
+    self.setUp()
+
+    repository = GameStateRepository(LAYOUT_ENTITIES)
+    joe = User.create('joe', 'joe@gmail.com')
+    steve = User.create('steve', 'steve@gmail.com')
+    for i in range(2):
+      game = GameState.create()
+      game.addPlayer(joe)
+      game.addPlayer(steve)
+      game.start()
+      repository.register(game)
+
+    games = list(repository.allActive())
+    self.assertTrue(len(games) == 2, "found both active games")
+    self.assertTrue(
+      all([p.game is game for game in games for p in game.players]),
+      "players share the game already loaded")
+    self.assertTrue(
+      sorted([p.player.name for p in games[0].players]) == ['joe', 'steve'],
+      "players' users restored")
+    roles = PlayerStateRepository().findByUser(joe)
+    self.assertTrue(
+      len(roles) == 2 and all([p.player is joe for p in roles]),
+      "user's roles restored with the known user")
+
+    self.tearDown()
+
+  def testUpdateWritesChanges(self):
+    self.setUp()
+
+    repository = GameStateRepository(LAYOUT_ENTITIES)
+    game = GameState.create()
+    users = [User.create(name, name + '@gmail.com')
+             for name in ('joe', 'steve', 'jan', 'rich')]
+    for user in users:
+      game.addPlayer(user)
+    for p in game.players:
+      p.bag = LetterBag.fromString('catgegae')
+    game.start()
+    repository.register(game)
+
+    saved = []
+    putMulti = ndb.put_multi
+    def recordPuts(entities, **options):
+      saved.extend(entities)
+      return putMulti(entities, **options)
+    ndb.put_multi = recordPuts
+    try:
+      game2 = repository.findById(repository.id(game))
+      repository.update(game2)
+      self.assertTrue(saved == [], "unchanged game is not written")
+      game2.playWord(users[0], 0, 0, True, 'cat')
+      move = Move.create(game2, users[0], 'cat', True, 0, 0, 4)
+      repository.update(game2, [MoveRepository().setPersistents(move)])
+      self.assertTrue(
+        len(saved) == 3 and game2 in saved and move in saved and
+        game2.getPlayerState(users[0]) in saved,
+        "move writes only game, move and the player who moved")
+    finally:
+      ndb.put_multi = putMulti
+
+    self.tearDown()
+
+  def testGameCache(self):
+    self.setUp()
+
+    cache = GameCache()
+    repository = GameStateRepository(LAYOUT_AGGREGATE, cache)
+    joe = User.create('joe', 'joe@gmail.com')
+    game = GameState.create()
+    game.addPlayer(joe)
+    game.players[0].bag = LetterBag.fromString('catgegae')
+    game.start()
+    repository.register(game)
+    id = repository.id(game)
+    self.assertTrue(game.version == 1, "saving a new game sets version 1")
+
+    game2 = repository.findById(id)
+    game3 = repository.findById(id)
+    self.assertTrue(
+      cache.stats()['localHits'] == 2 and cache.stats()['misses'] == 0,
+      "games found in the instance cache")
+    self.assertTrue(game2 is not game3, "each caller gets its own copy")
+    game2.playWord(joe, 0, 0, True, 'cat')
+    self.assertTrue(
+      game3.boardContent.letter(0, 0) == '_', "copies share no board")
+    repository.update(game2)
+    self.assertTrue(game2.version == 2, "saving a change bumps version")
+    repository.update(game2)
+    self.assertTrue(game2.version == 2, "saving no change keeps version")
+    game4 = repository.findById(id)
+    self.assertTrue(
+      game4.version == 2 and game4.leader().score == 4,
+      "cache returns the latest version")
+
+    self.tearDown()
+
+  def testConcurrentUpdate(self):
+    self.setUp()
+
+    repository = GameStateRepository()
+    game = GameState.create()
+    for name in ('joe', 'steve', 'jan'):
+      game.addPlayer(User.create(name, name + '@gmail.com'))
+    game.start()
+    repository.register(game)
+    id = repository.id(game)
+
+    first = repository.findById(id)
+    second = repository.findById(id)
+    first.skipTurn(first.nextPlayer().player)
+    repository.update(first)
+    second.skipTurn(second.nextPlayer().player)
+    try:
+      repository.update(second)
+      self.assertTrue(False, "stale update overwrote the game")
+    except ConcurrentUpdate:
+      self.assertTrue(True, "stale update is rejected")
+    self.assertTrue(
+      second.version == 1 and not second.tallied,
+      "rejected update leaves version and tally as they were")
+
+    attempts = []
+    def skip(game):
+      attempts.append(game.version)
+      if len(attempts) == 1:
+        # someone else moves before this change is saved
+        other = repository.findById(id, fresh=True)
+        other.skipTurn(other.nextPlayer().player)
+        repository.update(other)
+      game.skipTurn(game.nextPlayer().player)
+    game, related = repository.mutate(id, skip)
+    self.assertTrue(
+      attempts == [2, 3] and game.version == 4,
+      "conflicting change is retried on the latest game")
+    self.assertTrue(
+      repository.findById(id).mode == 'over',
+      "no pass was lost")
+
+    self.tearDown()
+
+  def testMigrateToAggregate(self):
+    self.setUp()
+
+    legacy = GameStateRepository(LAYOUT_ENTITIES)
+    joe = User.create('joe', 'joe@gmail.com')
+    steve = User.create('steve', 'steve@gmail.com')
+    game = GameState.create()
+    game.addPlayer(joe)
+    game.addPlayer(steve)
+    for p in game.players:
+      p.bag = LetterBag.fromString('catgegae')
+    game.start()
+    legacy.register(game)
+    id = legacy.id(game)
+
+    repository = GameStateRepository(LAYOUT_AGGREGATE)
+    self.assertTrue(
+      repository.idsForUser(joe) == [id], "finds game stored with players")
+    game2 = repository.findById(id)
+    game2.playWord(joe, 0, 0, True, 'cat')
+    repository.update(game2)
+    self.assertTrue(
+      PlayerState.query().count() == 0, "update migrates players into game")
+    stored = ndb.Key(urlsafe=id).get()
+    self.assertTrue(
+      stored.packed is not None and stored.letters is None and
+      stored.board is None, "migrated game is saved packed")
+    game3 = repository.findById(id)
+    self.assertTrue(
+      game3.leader().player.name == 'joe' and game3.leader().score == 4,
+      "migrated game keeps players and scores")
+    self.assertTrue(
+      repository.idsForUser(steve) == [id], "finds migrated game")
+
+    self.tearDown()
+
+  def testLargeBoard(self):
+    self.setUp()
+
+    joe = User.create('joe', 'joe@gmail.com')
+    jan = User.create('jan', 'jan@gmail.com')
+    for layout in (LAYOUT_AGGREGATE, LAYOUT_ENTITIES):
+      repository = GameStateRepository(layout)
+      game = GameState.create(50, 50)
+      game.addPlayer(joe)
+      game.addPlayer(jan)
+      game.start()
+      repository.register(game)
+      loaded = repository.findById(repository.id(game), fresh=True)
+      self.assertTrue(
+        loaded.boardContent.asString() == game.boardContent.asString(),
+        "50x50 board saved in {} layout".format(layout))
+
+    self.tearDown()
+
+  def testPaging(self):
+    self.setUp()
+
+    users = UserRepository()
+    for name in ('steve', 'joe', 'jan'):
+      users.register(User.create(name, name + '@gmail.com'))
+    names, cursor, more = users.namesPage(size=2)
+    rest, cursor, last = users.namesPage(cursor, 2)
+    self.assertTrue(
+      names == ['jan', 'joe'] and more and rest == ['steve'] and not last,
+      "user names listed a page at a time, in order")
+
+    repository = GameStateRepository()
+    joe = users.findByName('joe')
+    ids = []
+    for i in range(3):
+      game = GameState.create()
+      game.addPlayer(joe)
+      game.addPlayer(users.findByName('jan'))
+      game.start()
+      repository.register(game)
+      ids.append(repository.id(game))
+    first, cursor, more = repository.idsPageForUser(joe, size=2)
+    second, cursor, last = repository.idsPageForUser(joe, cursor, 2)
+    self.assertTrue(
+      sorted(first + second) == sorted(ids) and more and not last,
+      "user's games listed a page at a time")
+
+    # games kept with PlayerStates, with and without playerKeys
+    entities = GameStateRepository(LAYOUT_ENTITIES)
+    for i in range(3):
+      game = GameState.create()
+      game.addPlayer(joe)
+      game.addPlayer(users.findByName('jan'))
+      game.start()
+      entities.register(game)
+      ids.append(entities.id(game))
+      if i > 0:
+        game.playerKeys = []   # as saved before playerKeys
+        game.put()
+    listed, cursor, more = [], None, True
+    while more:
+      page, cursor, more = repository.idsPageForUser(
+        joe, repository.cursorForUser(cursor.urlsafe()) if cursor else None,
+        2)
+      self.assertTrue(len(page) <= 2, "page of at most 2 games")
+      listed.extend(page)
+    self.assertTrue(
+      sorted(listed) == sorted(ids),
+      "games found by PlayerState listed once, with their own cursor")
+
+    moves = MoveRepository()
+    for word in ('cat', 'tag', 'gate'):
+      moves.register(Move.create(game, joe, word, True, 0, 0, 1))
+    page, cursor, more = moves.historyPage(game, size=2)
+    rest, cursor, last = moves.historyPage(game, cursor, 2)
+    self.assertTrue(
+      [m.word for m in page + rest] == ['cat', 'tag', 'gate'] and
+      more and not last and page[0].user.name == 'joe',
+      "game history listed a page at a time, oldest first")
+
+    self.tearDown()
+
+  def testRankings(self):
+    self.setUp()
+
+    repository = GameStateRepository()
+    stats = UserStatsRepository()
+    joe = User.create('joe', 'joe@gmail.com')
+    jan = User.create('jan', 'jan@gmail.com')
+    for winner in (joe, joe, jan):
+      game = GameState.create()
+      game.addPlayer(joe)
+      game.addPlayer(jan)
+      game.start()
+      repository.register(game)
+      game.players[[joe, jan].index(winner)].score = 10
+      for p in game.players:
+        game.skipTurn(p.player)
+      repository.update(game)
+    self.assertTrue(
+      game.mode == 'over' and game.tallied, "completed game is counted")
+    records, cursor, more = stats.rankingPage()
+    self.assertTrue(
+      [(s.name, s.wins, s.losses, s.played, s.totalScore)
+       for s in records] == [('joe', 2, 1, 3, 20), ('jan', 1, 2, 3, 10)],
+      "rankings sorted by win/loss ratio")
+    repository.update(game)
+    self.assertTrue(
+      stats.findByUser(joe).played == 3, "saving again does not recount")
+    over = GameState.create()
+    over.addPlayer(joe)
+    over.addPlayer(jan)
+    over.start()
+    for p in over.players:
+      over.skipTurn(p.player)
+    repository.register(over)
+    self.assertTrue(
+      not over.tallied and stats.findByUser(joe).played == 3,
+      "game saved new and over is left to be counted later")
+    repository.update(over)
+    self.assertTrue(
+      over.tallied and stats.findByUser(joe).played == 4,
+      "game saved new and over is counted when next saved")
+    ndb.delete_multi([over.key])
+
+    # forget the counts, as if the games completed before rankings were kept
+    ndb.delete_multi([s.key for s in records])
+    for game in GameState.query().fetch():
+      game.tallied = False
+      game.put()
+    ndb.get_context().clear_cache()
+    tallied, cursor, more = repository.tallyBatch()
+    self.assertTrue(
+      tallied == 3 and stats.findByUser(jan).wins == 1 and
+      stats.findByUser(joe).wins == 2, "backfill counts completed games")
+    self.assertTrue(
+      repository.tallyBatch()[0] == 0 and stats.findByUser(joe).played == 3,
+      "backfill skips games already counted")
+
+    self.tearDown()
+
+  def testChangesSince(self):
+    self.setUp()
+
+    repository = GameStateRepository()
+    moves = MoveRepository()
+    joe = User.create('joe', 'joe@gmail.com')
+    jan = User.create('jan', 'jan@gmail.com')
+    game = GameState.create()
+    game.addPlayer(joe)
+    game.addPlayer(jan)
+    for p in game.players:
+      p.bag = LetterBag.fromString('catgegae')
+    game.start()
+    repository.register(game)
+    id = repository.id(game)
+    before = game.version
+    self.assertTrue(
+      repository.versionOf(id) == before, "version read without the game")
+
+    game.playWord(joe, 0, 0, True, 'cat')
+    move = Move.create(game, joe, 'cat', True, 0, 0, 4)
+    repository.update(game, [moves.setPersistents(move)])
+    game.playWord(jan, 0, 0, False, 'cage')
+    move = Move.create(game, jan, 'cage', False, 0, 0, 8)
+    repository.update(game, [moves.setPersistents(move)])
+    self.assertTrue(
+      move.version == game.version and repository.versionOf(id) == before + 2,
+      "move records the version saved with it")
+    self.assertTrue(
+      repository.waitForVersion(id, before, 1) == before + 2 and
+      repository.waitForVersion(id, before + 2, 0) is None,
+      "saved versions published to waiters")
+    self.assertTrue(
+      moves.changesSince(game, before) ==
+        (set([0, 1, 2, 10, 20, 30]), set([joe.key, jan.key])) and
+      moves.changesSince(game, before + 1) == (set([10, 20, 30]),
+                                               set([jan.key])) and
+      moves.changesSince(game, game.version) == (set(), set()),
+      "cells placed and players moved since a version")
+
+    # as if the first move was saved before moves recorded versions
+    ndb.delete_multi([m.key for m in Move.query().fetch()])
+    old = Move.create(game, joe, 'cat', True, 0, 0, 4)
+    old.version = None
+    moves.register(old)
+    self.assertTrue(
+      moves.changesSince(game, before + 1) is None,
+      "changes unknown past moves saved without versions")
+    move.key = None
+    moves.register(move)
+    self.assertTrue(
+      moves.changesSince(game, before + 1) == (set([10, 20, 30]),
+                                               set([jan.key])) and
+      moves.changesSince(game, before) is None,
+      "changes known only from the first move saved with a version")
+
+    game.cancel()
+    repository.update(game)
+    self.assertTrue(
+      moves.changesSince(game, before + 1) is None and
+      moves.changesSince(game, game.version) == (set(), set()),
+      "changes unknown past a version saved without a move")
+
+    self.tearDown()
+
+  def testFindByIds(self):
+    self.setUp()
+
+    joe = User.create('joe', 'joe@gmail.com')
+    jan = User.create('jan', 'jan@gmail.com')
+    ids = []
+    for layout in (LAYOUT_AGGREGATE, LAYOUT_ENTITIES, LAYOUT_AGGREGATE):
+      repository = GameStateRepository(layout)
+      game = GameState.create()
+      game.addPlayer(joe)
+      game.addPlayer(jan)
+      game.start()
+      repository.register(game)
+      ids.append(repository.id(game))
+    repository = GameStateRepository()
+    repository.findById(ids[0])    # cached
+    games = repository.findByIds(ids + ['nonsense', repository.id(joe)])
+    self.assertTrue(
+      [repository.id(game) for game in games[:3]] == ids and
+      games[3:] == [None, None], "games found in the order of their ids")
+    self.assertTrue(
+      all([sorted(p.player.name for p in game.players) == ['jan', 'joe']
+           for game in games[:3]]),
+      "games found with their players")
+
+    self.tearDown()
+
+  def testPositions(self):
+    self.setUp()
+    interval = repositories.CHECKPOINT_INTERVAL
+    repositories.CHECKPOINT_INTERVAL = 2
+
+    repository = GameStateRepository()
+    moves = MoveRepository()
+    joe = User.create('joe', 'joe@gmail.com')
+    jan = User.create('jan', 'jan@gmail.com')
+    game = GameState.create()
+    game.addPlayer(joe)
+    game.addPlayer(jan)
+    for p in game.players:
+      p.bag = LetterBag.fromString('catgegae')
+    game.start()
+    repository.register(game)
+
+    def position(game):
+      return (game.boardContent.asString(), game.bagOfLetters.asString(),
+              [(p.score, p.bag.asString()) for p in game.players],
+              game.turn, game.consecutivePasses, game.mode)
+    expected = {game.version: position(game)}
+    for user, word, across in [(joe, 'cat', True), (jan, 'cage', False),
+                               (joe, '', None), (jan, '', None)]:
+      before = game.scoreForUser(user)
+      if word:
+        game.playWord(user, 0, 0, across, word)
+      else:
+        game.skipTurn(user)
+      move = Move.create(game, user, word, across, 0, 0,
+                         game.scoreForUser(user) - before)
+      repository.update(game, [moves.setPersistents(move)])
+      expected[game.version] = position(game)
+    repositories.CHECKPOINT_INTERVAL = interval
+
+    self.assertTrue(
+      sorted(c.version for c in repositories.Checkpoint.query().fetch()) ==
+      [1, 2, 4], "checkpoints saved as the game starts and every interval")
+    self.assertTrue(
+      all([position(repository.positionAt(game, version)) == state
+           for version, state in expected.items()]),
+      "position at each version rebuilt from checkpoints and moves")
+    self.assertTrue(
+      repository.positionAt(game, 0) is None and
+      repository.positionAt(game, game.version + 1) is None,
+      "no position before the game started or after its last version")
+
+    game = GameState.create()
+    game.addPlayer(joe)
+    game.addPlayer(jan)
+    for p in game.players:
+      p.bag = LetterBag.fromString('catgegae')
+    game.start()
+    repository.register(game)
+    game.playWord(joe, 0, 0, True, 'cat')
+    move = Move.create(game, joe, 'cat', True, 0, 0, game.scoreForUser(joe))
+    repository.update(game, [moves.setPersistents(move)])
+    played = position(game)
+    game.cancel()
+    repository.update(game)
+    self.assertTrue(
+      position(repository.positionAt(game, game.version - 1)) == played and
+      position(repository.positionAt(game, game.version)) == position(game),
+      "position at a version saved without a move, as when cancelled")
+
+    self.tearDown()
+
 t = Test().testShortGame()
+t = Test().testRestorePlayers()
+t = Test().testUpdateWritesChanges()
+t = Test().testGameCache()
+t = Test().testConcurrentUpdate()
+t = Test().testMigrateToAggregate()
+t = Test().testLargeBoard()
+t = Test().testPaging()
+t = Test().testRankings()
+t = Test().testChangesSince()
+t = Test().testFindByIds()
+t = Test().testPositions()
 t = Test().testPlayersToNotify()
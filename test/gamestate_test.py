@@ -3,6 +3,10 @@ sys.path.append('wordwars-1311')
 
 from models import User, GameState, PlayerState, LetterBag
 from print_view import PrintView
+from game import MAX_PLAYERS
+import dictionary
+import os
+import tempfile
 
 class Test():
   joe = User.create('joe', 'joe@gmail.com')
@@ -67,4 +71,90 @@ class Test():
         game.scoreForUser(steve) == 7,
         "score for adding cage (reusing the c) is 7")
 
+  def testRejectWordNotInDictionary(self):
+    joe = User.create('joe', 'joe@gmail.com')
+    steve = User.create('steve', 'steve@gmail.com')
+    game = GameState.create()
+    game.addPlayer(joe)
+    game.addPlayer(steve)
+    game.start()
+    for p in game.players:
+      p.bag = LetterBag.fromString('catgegae')
+    fd, path = tempfile.mkstemp(suffix='.dawg')
+    os.close(fd)
+    dictionary.build(['cat', 'cage'], path)
+    dictionary.install(dictionary.Dictionary.load(path))
+    try:
+      try:
+        game.playWord(joe,0,0,True,'tac')
+        self.assertTrue(False, 'playing tac should raise exception')
+      except ValueError, e:
+        self.assertTrue(True, 'word not in dictionary raised error: {}'.format(e))
+      self.assertTrue(
+          game.letter(0,0) == '_' and game.scoreForUser(joe) == 0,
+          "rejected word leaves board and score unchanged")
+      game.playWord(joe,0,0,True,'cat')
+      self.assertTrue(game.scoreForUser(joe) == 4, "cat is in the dictionary")
+    finally:
+      dictionary.install(None)
+
+  def testRejectedMovesLeaveNoTrace(self):
+    joe = User.create('joe', 'joe@gmail.com')
+    steve = User.create('steve', 'steve@gmail.com')
+    game = GameState.create()
+    game.addPlayer(joe)
+    game.addPlayer(steve)
+    game.start()
+    for p in game.players:
+      p.bag = LetterBag.fromString('catgegae')
+    game.playWord(joe,0,0,True,'cat')
+    board = game.boardContent.asString()
+    letters = game.getPlayerState(steve).bag.asString()
+    for x, y, across, word, why in [
+        (8, 1, True, 'cage', 'runs off the right edge'),
+        (0, 0, False, 'tag', 'conflicts with c on the board'),
+        (5, 5, True, 'age', 'does not touch the board'),
+        (0, 1, True, 'eggs', 'needs letters not in the bag')]:
+      try:
+        game.playWord(steve, x, y, across, word)
+        self.assertTrue(False, 'playing {} should raise exception'.format(word))
+      except ValueError, e:
+        self.assertTrue(
+            game.boardContent.asString() == board and
+            game.getPlayerState(steve).bag.asString() == letters and
+            game.scoreForUser(steve) == 0 and game.turn == 1,
+            'move that {} is rejected without side effects'.format(why))
+    # fail after letters are on the board: journal must undo everything
+    bag = game.bagOfLetters
+    remaining = bag.asString()
+    def failingDraw(k, rng=None):
+      raise ValueError('bag failure')
+    bag.drawK = failingDraw
+    try:
+      game.playWord(steve, 0, 0, False, 'cage')
+      self.assertTrue(False, 'failing refill should raise exception')
+    except ValueError, e:
+      del bag.drawK
+      self.assertTrue(
+          game.boardContent.asString() == board and
+          game.getPlayerState(steve).bag.asString() == letters and
+          bag.asString() == remaining and
+          game.scoreForUser(steve) == 0 and game.turn == 1,
+          'failure while applying move is rolled back exactly')
+
+  def testPlayerLimit(self):
+    game = GameState.create()
+    for i in range(MAX_PLAYERS):
+      game.addPlayer(User.create('p{}'.format(i), 'p{}@gmail.com'.format(i)))
+    try:
+      game.addPlayer(User.create('extra', 'extra@gmail.com'))
+      self.assertTrue(False, "added a player past the limit")
+    except ValueError:
+      self.assertTrue(
+        len(game.players) == MAX_PLAYERS,
+        "at most {} players in a game".format(MAX_PLAYERS))
+
 t = Test().testScoreOnlyWhenAddingLetters()
+t = Test().testRejectedMovesLeaveNoTrace()
+t = Test().testRejectWordNotInDictionary()
+t = Test().testPlayerLimit()
@@ -0,0 +1,73 @@
+import sys
+sys.path.append('wordwars-1311')
+
+import threading
+import time
+
+from hub import Hub, LocalBroker
+
+
+# this tests publishing and waiting for versions of games
+class Test():
+
+    def assertTrue(self, booleanExpression, description):
+        if not booleanExpression:
+            raise ValueError("{} is not True".format(description))
+        else:
+            print('passed test: {}'.format(description))
+
+    def waitInThread(self, hub, topic, version, timeout):
+        """start waiting on hub in a thread; return dict set with the
+        result and seconds waited once the wait is over"""
+        result = {}
+
+        def wait():
+            start = time.time()
+            result['version'] = hub.wait(topic, version, timeout)
+            result['seconds'] = time.time() - start
+        thread = threading.Thread(target=wait)
+        thread.start()
+        result['thread'] = thread
+        return result
+
+    def test_publish_wakes_waiter(self):
+        hub = Hub()
+        result = self.waitInThread(hub, 'game1', 3, 5)
+        time.sleep(0.05)
+        hub.publish('game2', 9)
+        hub.publish('game1', 4)
+        result['thread'].join()
+        self.assertTrue(
+            result['version'] == 4 and result['seconds'] < 1,
+            "waiter woken by the next version of its game")
+        self.assertTrue(
+            hub.wait('game1', 3, 5) == 4,
+            "version already published is returned at once")
+        hub.publish('game1', 2)
+        self.assertTrue(hub.latest('game1') == 4, "older version is ignored")
+
+    def test_timeout(self):
+        hub = Hub()
+        hub.publish('game1', 3)
+        start = time.time()
+        self.assertTrue(
+            hub.wait('game1', 3, 0.1) is None and time.time() - start >= 0.1,
+            "wait without a change ends at the timeout")
+
+    def test_shared_broker(self):
+        broker = LocalBroker()
+        waiting = Hub(broker, pollInterval=0.05)
+        saving = Hub(broker, pollInterval=0.05)
+        result = self.waitInThread(waiting, 'game1', 0, 5)
+        time.sleep(0.05)
+        saving.publish('game1', 1)
+        result['thread'].join()
+        self.assertTrue(
+            result['version'] == 1 and result['seconds'] < 1,
+            "version published on another hub reaches the waiter")
+
+
+t = Test()
+t.test_publish_wakes_waiter()
+t.test_timeout()
+t.test_shared_broker()
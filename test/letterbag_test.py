@@ -83,9 +83,33 @@ class Test():
             'found all letters in bag2')
 
 
+    def test_drawK(self):
+        bag = LetterBag.standardSet()
+        total = bag.contentCount()
+        before = bag.copy()
+        drawn = bag.drawK(7)
+        self.assertTrue(
+            drawn.contentCount() == 7 and bag.contentCount() == total - 7,
+            'drawK moves 7 letters out of the bag')
+        bag.addAll(drawn)
+        self.assertTrue(
+            bag.asString() == before.asString(),
+            'drawn letters came from the bag')
+        small = LetterBag.fromString('abc')
+        rest = small.drawK(5)
+        self.assertTrue(
+            rest.asString() == 'abc' and small.contentCount() == 0,
+            'drawK stops when bag is empty')
+        for i in range(total):
+            before.removeByIndex(0)
+        self.assertTrue(
+            before.contentCount() == 0 and before.letterAtIndex(0) is None,
+            'letterAtIndex past the end is None')
+
 
 t = Test()
 t.test_create_empty()
 t.test_simple_example()
 t.test_letterAtIndex()
 t.test_removeRandom()
+t.test_drawK()
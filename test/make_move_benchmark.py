@@ -0,0 +1,73 @@
+import sys
+sys.path.append('wordwars-1311')
+
+from models import User, GameState, Move, LetterBag
+from repositories import GameStateRepository, MoveRepository
+
+import time
+
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+# moves timed for each way of saving them
+MOVES = 200
+
+
+# compares the datastore calls of make_move done one after another with
+# the tasklet pipeline make_move uses (see WordWarsApi.makeMoveAsync)
+class Benchmark():
+
+  def setUp(self):
+    self.testbed = testbed.Testbed()
+    self.testbed.activate()
+    self.testbed.init_datastore_v3_stub()
+    self.testbed.init_memcache_stub()
+    ndb.get_context().clear_cache()
+    self.games = GameStateRepository()
+    self.moves = MoveRepository()
+    game = GameState.create(10, 10, LetterBag.fromString('a' * 500))
+    for name in ('joe', 'steve', 'jan', 'rich'):
+      game.addPlayer(User.create(name, name + '@gmail.com'))
+    game.start()
+    self.games.register(game)
+    self.id = self.games.id(game)
+
+  def tearDown(self):
+    self.testbed.deactivate()
+
+  def play(self, game):
+    """skip the next player's turn; return Move to save for it"""
+    user = game.nextPlayer().player
+    game.skipTurn(user)
+    game.consecutivePasses = 0    # keep the game going
+    return Move.create(game, user, '', None, None, None, 0)
+
+  def serial(self):
+    game = self.games.findById(self.id)
+    move = self.play(game)
+    self.games.update(game)
+    self.moves.register(move)
+
+  @ndb.toplevel
+  def pipelined(self):
+    game = yield self.games.findByIdAsync(self.id)
+    move = self.play(game)
+    yield self.games.updateAsync(game), self.moves.registerAsync(move)
+
+  def time(self, makeMove):
+    self.setUp()
+    start = time.time()
+    for i in range(MOVES):
+      makeMove()
+    elapsed = time.time() - start
+    self.tearDown()
+    return elapsed * 1000.0 / MOVES
+
+  def run(self):
+    serial = self.time(self.serial)
+    pipelined = self.time(self.pipelined)
+    print('serial make_move:    {:.2f} ms/move'.format(serial))
+    print('pipelined make_move: {:.2f} ms/move'.format(pipelined))
+
+
+Benchmark().run()
@@ -0,0 +1,100 @@
+import sys
+sys.path.append('wordwars-1311')
+
+import os
+import tempfile
+from board import Board
+from cache import LRUCache
+from dictionary import Dictionary, build
+from models import LetterBag
+from movegen import MoveGenerator, searchMoves, suggestMoves
+
+class Test():
+
+    def assertTrue(self, booleanExpression, description):
+        if not booleanExpression:
+            raise ValueError("{} is not True".format(description))
+        else:
+            print('passed test: {}'.format(description))
+
+    def load(self, words):
+        fd, path = tempfile.mkstemp(suffix='.dawg')
+        os.close(fd)
+        build(words, path)
+        return Dictionary.load(path)
+
+    def test_empty_board(self):
+        d = self.load(['cat', 'act', 'at', 'ta'])
+        board = Board(5, 5)
+        moves = MoveGenerator(d, board, LetterBag.fromString('cat'),
+                              None, None).generate()
+        words = set([m.word for m in moves])
+        self.assertTrue(
+            words == set(['cat', 'act', 'at', 'ta']),
+            "finds every word on an empty board")
+        self.assertTrue(
+            all([(m.x, m.y) in [(2 - i, 2) for i in range(3)] or
+                 (m.x, m.y) in [(2, 2 - i) for i in range(3)]
+                 for m in moves]),
+            "every play covers the centre square")
+
+    def test_cross_checks(self):
+        d = self.load(['cat', 'cats', 'at', 'as', 'ta'])
+        board = Board.fromString(5, 3, 'cat__' + '_____' + '_____')
+        best = suggestMoves(d, board, LetterBag.fromString('sa'), 3,
+                            None, None)
+        self.assertTrue(
+            best[0].word == 'cats' and best[0].score == 5,
+            "best move extends cat to cats")
+        for m in MoveGenerator(d, board, LetterBag.fromString('sa'),
+                               None, None).generate():
+            for s in m.scored:
+                self.assertTrue(
+                    s.word in d, "{} forms dictionary words".format(m))
+
+    def test_budget(self):
+        d = self.load(['cat', 'act', 'at', 'ta'])
+        generator = MoveGenerator(d, Board(5, 5), LetterBag.fromString('cat'),
+                                  2, None)
+        generator.generate()
+        self.assertTrue(
+            not generator.complete, "node budget stops the search")
+
+    def test_transposition_cache(self):
+        d = self.load(['cat', 'cats', 'at', 'as', 'ta'])
+        board = Board.fromString(5, 3, 'cat__' + '_____' + '_____')
+        cache = LRUCache(10)
+        first = searchMoves(d, board, LetterBag.fromString('sa'), 3,
+                            None, None, cache)
+        again = searchMoves(d, board, LetterBag.fromString('as'), 3,
+                            None, None, cache)
+        self.assertTrue(
+            again == first and cache.hits == 1,
+            "same board and rack answered from the cache")
+        board.setLetter(3, 0, 's')
+        searchMoves(d, board, LetterBag.fromString('sa'), 3,
+                    None, None, cache)
+        self.assertTrue(cache.misses == 2, "new letter on board searches again")
+
+    def test_incomplete_not_reused(self):
+        d = self.load(['cat', 'cats', 'at', 'as', 'ta'])
+        board = Board.fromString(5, 3, 'cat__' + '_____' + '_____')
+        cache = LRUCache(10)
+        rack = LetterBag.fromString('sa')
+        cut, complete = searchMoves(d, board, rack, 3, 2, None, cache)
+        again, repeated = searchMoves(d, board, rack, 3, 1, None, cache)
+        self.assertTrue(
+            not complete and not repeated and cache.hits == 1,
+            "cut short search answers a smaller budget from the cache")
+        full, complete = searchMoves(d, board, rack, 3, None, None, cache)
+        self.assertTrue(
+            complete and len(full) == 3 and len(cut) == 1,
+            "cut short search is repeated for a larger budget")
+
+
+t = Test()
+t.test_empty_board()
+t.test_cross_checks()
+t.test_budget()
+t.test_transposition_cache()
+t.test_incomplete_not_reused()
@@ -0,0 +1,64 @@
+import sys
+sys.path.append('wordwars-1311')
+
+from board import Board
+from scoring import scorePlacement, total
+
+class Test():
+
+    def assertTrue(self, booleanExpression, description):
+        if not booleanExpression:
+            raise ValueError("{} is not True".format(description))
+        else:
+            print('passed test: {}'.format(description))
+
+    def boardWith(self, rows):
+        return Board.fromString(len(rows[0]), len(rows), ''.join(rows))
+
+    def test_main_word_only(self):
+        board = self.boardWith(['_____'] * 5)
+        scored = scorePlacement(
+            board, {(0, 0): 'c', (1, 0): 'a', (2, 0): 't'}, True)
+        self.assertTrue(
+            [s.word for s in scored] == ['cat'], "cat is the only word")
+        self.assertTrue(total(scored) == 4, "cat scores 4")
+
+    def test_cross_words(self):
+        board = self.boardWith(['cat__',
+                                '_____',
+                                '_____'])
+        # play 'at' across on row 1 under 'ca': forms 'ca' and 'at' down
+        scored = scorePlacement(board, {(0, 1): 'a', (1, 1): 't'}, True)
+        words = [(s.word, s.x, s.y, s.across) for s in scored]
+        self.assertTrue(
+            words == [('at', 0, 1, True),
+                      ('ca', 0, 0, False),
+                      ('at', 1, 0, False)],
+            "main word then a cross-word for each new letter")
+        self.assertTrue(total(scored) == 2 + 3 + 2, "all words scored")
+
+    def test_extends_existing_word(self):
+        board = self.boardWith(['_at__'])
+        scored = scorePlacement(board, {(0, 0): 'c', (3, 0): 's'}, True)
+        self.assertTrue(
+            [s.word for s in scored] == ['cats'],
+            "main word runs through letters already on the board")
+
+    def test_single_letter(self):
+        board = self.boardWith(['c____',
+                                '_____'])
+        scored = scorePlacement(board, {(0, 1): 'a'}, True)
+        self.assertTrue(
+            [(s.word, s.across) for s in scored] == [('ca', False)],
+            "one letter played across scores the word it forms down")
+        scored = scorePlacement(board, {(4, 1): 'a'}, True)
+        self.assertTrue(
+            [s.word for s in scored] == ['a'],
+            "lone letter scores by itself")
+
+
+t = Test()
+t.test_main_word_only()
+t.test_cross_words()
+t.test_extends_existing_word()
+t.test_single_letter()
@@ -0,0 +1,42 @@
+import sys
+sys.path.append('wordwars-1311')
+
+import os
+import tempfile
+import dictionary
+from dictionary import Dictionary, build
+from letters import LetterBag
+from simulate import playGame, STRATEGIES
+
+class Test():
+
+    def assertTrue(self, booleanExpression, description):
+        if not booleanExpression:
+            raise ValueError("{} is not True".format(description))
+        else:
+            print('passed test: {}'.format(description))
+
+    def test_all_pass(self):
+        stats = playGame(1, [STRATEGIES['pass']] * 3, None)
+        self.assertTrue(
+            stats['moves'] == 3 and stats['plays'] == 0,
+            "game is over once every player passes")
+
+    def test_seeded_games_repeat(self):
+        fd, path = tempfile.mkstemp(suffix='.dawg')
+        os.close(fd)
+        build(['at', 'ate', 'eat', 'tea', 'ten', 'net', 'an', 'in', 'it',
+               'tin', 'tan', 'ant', 'sat', 'set', 'sit', 'east', 'seat'], path)
+        lexicon = Dictionary.load(path)
+        dictionary.install(lexicon)
+        players = [STRATEGIES['greedy'], STRATEGIES['random']]
+        letters = LetterBag.fromString('aeinst' * 10)
+        first = playGame(42, players, lexicon, 10, 10, letters)
+        second = playGame(42, players, lexicon, 10, 10, letters)
+        self.assertTrue(first['plays'] > 0, "players made some plays")
+        self.assertTrue(first == second, "same seed plays the same game")
+
+
+t = Test()
+t.test_all_pass()
+t.test_seeded_games_repeat()
@@ -0,0 +1,101 @@
+import sys
+sys.path.append('wordwars-1311')
+
+import datetime
+
+from game import Game, Member, MODE_PLAYING
+from letters import LetterBag
+from storage import (
+    MemoryStore, SQLiteStore, HistoryEntry, ConcurrentUpdate, openStore)
+
+
+# this tests the storage backends that run without App Engine
+class Test():
+
+    def assertTrue(self, booleanExpression, description):
+        if not booleanExpression:
+            raise ValueError("{} is not True".format(description))
+        else:
+            print('passed test: {}'.format(description))
+
+    def newGame(self, store):
+        joe = store.registerUser(Member('joe', 'joe@gmail.com'))
+        steve = Member('steve', 'steve@gmail.com', True)
+        game = Game.create(5, 5, LetterBag.fromString('catgegae' * 3))
+        game.addPlayer(joe)
+        game.addPlayer(steve)
+        for p in game.players:
+            p.bag = LetterBag.fromString('catgegae')
+        game.start()
+        store.registerGame(game)
+        return game
+
+    def test_round_trip(self, store, name):
+        game = self.newGame(store)
+        id = store.id(game)
+        loaded = store.findGame(id)
+        self.assertTrue(
+            loaded is not game and loaded.version == 1,
+            "{} finds a copy of the saved game".format(name))
+        joe = loaded.players[0].player
+        loaded.playWord(joe, 0, 0, True, 'cat')
+        store.updateGame(loaded)
+        again = store.findGame(id)
+        self.assertTrue(
+            again.letter(1, 0) == 'a' and again.scoreForUser(joe) == 4 and
+            again.nextPlayer().player.name == 'steve' and
+            again.nextPlayer().player.bot,
+            "{} saves board, score, turn and players".format(name))
+        self.assertTrue(
+            store.gameIdsForUser(joe) == [id] and
+            [store.id(g) for g in store.gamesInMode(MODE_PLAYING)] == [id],
+            "{} finds games by user and mode".format(name))
+
+    def test_conflict(self, store, name):
+        game = self.newGame(store)
+        id = store.id(game)
+        first = store.findGame(id)
+        second = store.findGame(id)
+        first.skipTurn(first.nextPlayer().player)
+        store.updateGame(first)
+        second.skipTurn(second.nextPlayer().player)
+        try:
+            store.updateGame(second)
+            self.assertTrue(False, "{} kept a stale update".format(name))
+        except ConcurrentUpdate:
+            self.assertTrue(True, "{} rejects a stale update".format(name))
+        game = store.mutateGame(
+            id, lambda game: game.skipTurn(game.nextPlayer().player))
+        self.assertTrue(
+            game.version == 3 and store.findGame(id).consecutivePasses == 2,
+            "{} applies a change to the latest game".format(name))
+
+    def test_history(self, store, name):
+        game = self.newGame(store)
+        joe = game.players[0].player
+        scored = game.playWord(joe, 0, 0, True, 'cat')
+        store.updateGame(game)
+        store.registerMove(HistoryEntry(game, joe, 'cat', True, 0, 0, 4,
+                                        scored))
+        moves = store.movesForGame(game)
+        self.assertTrue(
+            [(m.word, m.moveScore, m.user.name) for m in moves] ==
+            [('cat', 4, 'joe')] and moves[0].words[0].word == 'cat',
+            "{} keeps game history".format(name))
+        before = datetime.datetime.now() - datetime.timedelta(seconds=1)
+        store.registerNotification(game, joe, 'your turn')
+        self.assertTrue(
+            [u.name for u in store.usersNotifiedSince(before)] == ['joe'],
+            "{} records notifications".format(name))
+
+    def test_backends(self):
+        for name, newStore in [('memory', MemoryStore),
+                               ('sqlite', SQLiteStore),
+                               ('openStore', lambda: openStore('sqlite'))]:
+            self.test_round_trip(newStore(), name)
+            self.test_conflict(newStore(), name)
+            self.test_history(newStore(), name)
+
+
+t = Test()
+t.test_backends()
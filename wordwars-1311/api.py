@@ -9,6 +9,7 @@ service from the application logic."""
 import re
 import logging
 import endpoints
+from google.appengine.ext import ndb
 from protorpc import (
     remote,
     messages,
@@ -21,34 +22,91 @@ from models import (
 from repositories import (
     GameStateRepository,
     UserRepository,
-    PlayerStateRepository,
+    UserStatsRepository,
     MoveRepository,
+    ConcurrentUpdate,
 )
 from print_view import PrintView
+from game import MAX_PLAYERS
+from bots import queueTurns
+import dictionary
+import movegen
 from utils import get_by_urlsafe
 from messages import (
     StringMessage,
     StringList,
     GameForm,
+    CompactGameForm,
+    GameChangeForm,
+    GameSummary,
+    GameSummaryList,
     MakeMoveForm,
     IdForm,
     WinLossRecord,
     RankingList,
     MoveList,
-    MoveRecord
+    MoveRecord,
+    CellRecord,
+    CompactBoard,
+    PlayerRecord,
+    WordScoreRecord,
+    MoveSuggestion,
+    SuggestionList
 )
 
 EMAIL_REGEX = re.compile(r"[^@]+@[^@]+\.[^@]+")
 
 GAME_ID_REQUEST = endpoints.ResourceContainer(gameid=messages.StringField(1))
+CHANGES_REQUEST = endpoints.ResourceContainer(
+    gameid=messages.StringField(1), since_version=messages.IntegerField(2),
+    if_none_match=messages.StringField(3))
 MAKE_MOVE_REQUEST = endpoints.ResourceContainer(
     MakeMoveForm, gameid=messages.StringField(1))
 NEW_USER_REQUEST = endpoints.ResourceContainer(
-    user_name=messages.StringField(1), email=messages.StringField(2))
+    user_name=messages.StringField(1), email=messages.StringField(2),
+    bot=messages.BooleanField(3))
 USERNAME_REQUEST = endpoints.ResourceContainer(user_name=messages.StringField(1))
 ADD_USER_REQUEST = endpoints.ResourceContainer(
     gameid=messages.StringField(1), user_name=messages.StringField(2))
+SUGGEST_REQUEST = endpoints.ResourceContainer(
+    gameid=messages.StringField(1), user_name=messages.StringField(2),
+    limit=messages.IntegerField(3))
+NEW_GAME_REQUEST = endpoints.ResourceContainer(
+    width=messages.IntegerField(1), height=messages.IntegerField(2))
 PLAIN_REQUEST = endpoints.ResourceContainer()
+PAGE_REQUEST = endpoints.ResourceContainer(
+    cursor=messages.StringField(1), limit=messages.IntegerField(2))
+USER_GAMES_REQUEST = endpoints.ResourceContainer(
+    user_name=messages.StringField(1), cursor=messages.StringField(2),
+    limit=messages.IntegerField(3))
+GET_GAMES_REQUEST = endpoints.ResourceContainer(
+    gameids=messages.StringField(1, repeated=True),
+    user_name=messages.StringField(2), cursor=messages.StringField(3),
+    limit=messages.IntegerField(4))
+WAIT_REQUEST = endpoints.ResourceContainer(
+    gameid=messages.StringField(1), version=messages.IntegerField(2),
+    timeout=messages.IntegerField(3))
+HISTORY_REQUEST = endpoints.ResourceContainer(
+    gameid=messages.StringField(1), cursor=messages.StringField(2),
+    limit=messages.IntegerField(3))
+POSITION_REQUEST = endpoints.ResourceContainer(
+    gameid=messages.StringField(1), version=messages.IntegerField(2))
+
+# limits on board dimensions requested for new games
+DEFAULT_BOARD_SIZE = 10
+MAX_BOARD_SIZE = 50
+
+# limits on the number of moves returned by suggest_moves
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+
+# limits on the number of items returned by each page of a list
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# limits on seconds wait_for_change waits, within the request deadline
+DEFAULT_WAIT = 20
+MAX_WAIT = 50
 
 
 @endpoints.api(
@@ -63,6 +121,7 @@ class WordWarsApi(remote.Service):
         """initialize objects available to all api endpoint methods"""
         self.games = GameStateRepository()
         self.users = UserRepository()
+        self.stats = UserStatsRepository()
         self.moves = MoveRepository()
 
     @endpoints.method(request_message=NEW_USER_REQUEST,
@@ -78,33 +137,68 @@ class WordWarsApi(remote.Service):
         if not EMAIL_REGEX.match(request.email):
             raise endpoints.BadRequestException(
                 'Email address is not valid: {}'.format(request.email))
-        user = User.create(request.user_name, request.email)
+        user = User.create(
+            request.user_name, request.email, bool(request.bot))
         self.users.register(user)
         return StringMessage(message='User {} created!'.format(request.user_name))
 
-    @endpoints.method(request_message=USERNAME_REQUEST,
+    @endpoints.method(request_message=USER_GAMES_REQUEST,
                       response_message=StringList,
                       path='user/{user_name}/games',
                       name='get_user_games',
                       http_method='GET')
     def get_user_games(self, request):
-        """Return id values for all games where this user is a player."""
+        """Return id values for a page of games where this user is a player."""
         user = self.userByName(request.user_name)
-        idList = []
-        for p in PlayerStateRepository().findByUser(user):
-            idList.append(self.games.id(p.game))
-        gameIds = StringList()
-        gameIds.strings = idList
-        return gameIds
-
-    @endpoints.method(request_message=PLAIN_REQUEST,
+        cursor, limit = self.pageOf(request, self.games.cursorForUser)
+        ids, cursor, more = self.games.idsPageForUser(user, cursor, limit)
+        return StringList(strings=ids,
+                          next_cursor=self.nextCursor(cursor, more))
+
+    @endpoints.method(request_message=GET_GAMES_REQUEST,
+                      response_message=GameSummaryList,
+                      path='games',
+                      name='get_games',
+                      http_method='GET')
+    def get_games(self, request):
+        """Return summaries of the games with gameids or, given only
+        user_name, of a page of that user's games.  Given user_name, each
+        summary has that user's score and letters."""
+        user = None
+        if request.user_name:
+            user = self.userByName(request.user_name)
+        cursor, more = None, False
+        if request.gameids:
+            if len(request.gameids) > MAX_PAGE_SIZE:
+                raise endpoints.BadRequestException(
+                    'At most {} gameids per request.'.format(MAX_PAGE_SIZE))
+            ids = request.gameids
+        elif user is not None:
+            cursor, limit = self.pageOf(request, self.games.cursorForUser)
+            ids, cursor, more = self.games.idsPageForUser(user, cursor, limit)
+        else:
+            raise endpoints.BadRequestException(
+                'Must request gameids or user_name.')
+        games = self.games.findByIds(ids)
+        return GameSummaryList(
+            games=[self.gameSummaryFrom(game, user)
+                   for game in games if game is not None],
+            next_cursor=self.nextCursor(cursor, more))
+
+    @endpoints.method(request_message=NEW_GAME_REQUEST,
                       response_message=IdForm,
                       path='game/new',
                       name='new_unstarted_game',
                       http_method='POST')
     def new_unstarted_game(self, request):
         """Create a new game with no users and return its ID."""
-        game = GameState.create()
+        width = request.width or DEFAULT_BOARD_SIZE
+        height = request.height or DEFAULT_BOARD_SIZE
+        if not (0 < width <= MAX_BOARD_SIZE and 0 < height <= MAX_BOARD_SIZE):
+            raise endpoints.BadRequestException(
+                'Board must be between 1x1 and {0}x{0}.'.format(
+                    MAX_BOARD_SIZE))
+        game = GameState.create(width, height)
         # "register" on next line sets "board" and other persistent variables
         self.games.register(game)
         # TODO: JSON response
@@ -121,6 +215,66 @@ class WordWarsApi(remote.Service):
         game = self.gameById(request.gameid)
         return self.gameFormFrom(game, '')
 
+    @endpoints.method(request_message=GAME_ID_REQUEST,
+                      response_message=CompactGameForm,
+                      path='game/{gameid}/compact',
+                      name='get_game_compact',
+                      http_method='GET')
+    def get_game_compact(self, request):
+        """Return game state for requested ID, with its board as a
+        CompactBoard."""
+        game = self.gameById(request.gameid)
+        return self.compactFormFrom(game, '')
+
+    @endpoints.method(request_message=CHANGES_REQUEST,
+                      response_message=GameChangeForm,
+                      path='game/{gameid}/changes',
+                      name='get_game_changes',
+                      http_method='GET')
+    def get_game_changes(self, request):
+        """Return changes to game since the client's copy.
+
+        If the client's copy, named by its etag or since_version, is still
+        current, return only that it is not modified; given since_version,
+        return only the cells changed since then."""
+        etag = request.if_none_match or self.requestHeader('If-None-Match')
+        since = request.since_version
+        if etag or since is not None:
+            version = self.games.versionOf(request.gameid)
+            if version is None:
+                raise endpoints.NotFoundException(
+                    'Game not found for id: {}'.format(request.gameid))
+            if etag == self.etag(version) or since == version:
+                return self.notModifiedForm(request.gameid, version)
+        return self.changeFormFrom(self.gameById(request.gameid), since)
+
+    @endpoints.method(request_message=WAIT_REQUEST,
+                      response_message=GameChangeForm,
+                      path='game/{gameid}/wait',
+                      name='wait_for_change',
+                      http_method='GET')
+    def wait_for_change(self, request):
+        """Return changes to game since the requested version as soon as
+        the game is saved with a later version, or not_modified after
+        timeout seconds."""
+        timeout = (DEFAULT_WAIT if request.timeout is None
+                   else request.timeout)
+        if timeout < 0 or timeout > MAX_WAIT:
+            raise endpoints.BadRequestException(
+                'timeout must be from 0 to {} seconds'.format(MAX_WAIT))
+        version = request.version or 0
+        current = self.games.versionOf(request.gameid)
+        if current is None:
+            raise endpoints.NotFoundException(
+                'Game not found for id: {}'.format(request.gameid))
+        if current <= version:
+            self.games.waitForVersion(request.gameid, version, timeout)
+            # the saved version is the authority, whatever the hub heard
+            current = self.games.versionOf(request.gameid)
+        if current <= version:
+            return self.notModifiedForm(request.gameid, current)
+        return self.changeFormFrom(self.gameById(request.gameid), version)
+
     @endpoints.method(request_message=ADD_USER_REQUEST,
                       response_message=StringMessage,
                       path='game/{gameid}/add_user',
@@ -128,13 +282,17 @@ class WordWarsApi(remote.Service):
                       http_method='PUT')
     def add_user(self, request):
         """Add user to requested game."""
-        game = self.gameById(request.gameid)
-        if game.started():
-            raise endpoints.BadRequestException(
-                'Can''t add user after game is started.')
         user = self.userByName(request.user_name)
-        game.addPlayer(user)
-        self.games.update(game)
+
+        def addUser(game):
+            if game.started():
+                raise endpoints.BadRequestException(
+                    'Can''t add user after game is started.')
+            if len(game.players) >= MAX_PLAYERS:
+                raise endpoints.BadRequestException(
+                    'A game has at most {} players.'.format(MAX_PLAYERS))
+            game.addPlayer(user)
+        self.mutateGame(request.gameid, addUser)
         return StringMessage(message='User {} added!'.format(request.user_name))
 
     @endpoints.method(request_message=GAME_ID_REQUEST,
@@ -144,14 +302,15 @@ class WordWarsApi(remote.Service):
                       http_method='PUT')
     def start_game(self, request):
         """Start requested game (no more players may be added)."""
-        game = self.gameById(request.gameid)
-        if len(game.players) <= 0:
-            raise endpoints.BadRequestException(
-                'Must add players before starting.')
-        self.validateNotOver(game)
-        self.validateNotCancelled(game)
-        game.start()
-        self.games.update(game)
+        def start(game):
+            if len(game.players) <= 0:
+                raise endpoints.BadRequestException(
+                    'Must add players before starting.')
+            self.validateNotOver(game)
+            self.validateNotCancelled(game)
+            game.start()
+        game, related = self.mutateGame(request.gameid, start)
+        self.queueBotTurns(game)
         return self.gameFormFrom(game, '')
 
     @endpoints.method(request_message=MAKE_MOVE_REQUEST,
@@ -161,47 +320,88 @@ class WordWarsApi(remote.Service):
                       http_method='PUT')
     def make_move(self, request):
         """Add requested word to the board at x,y, across or not."""
+        return self.makeMoveAsync(request).get_result()
+
+    @ndb.tasklet
+    def makeMoveAsync(self, request):
+        """Play make_move request; return future for its GameForm.
+
+        The user is taken from the game's players, so the game is the only
+        read; the game update and the new Move are written together."""
+        def play(game):
+            self.validateStarted(game)
+            self.validateNotOver(game)
+            self.validateNotCancelled(game)
+            if game.nextPlayer().player.name != request.user_name:
+                raise endpoints.BadRequestException(
+                    'Not turn yet for {}'.format(request.user_name))
+            user = game.nextPlayer().player
+            word = request.word
+            across = request.across
+            x = request.x
+            y = request.y
+            scoreBefore = game.scoreForUser(user)
+            scored = []
+            if len(request.word) <= 0:
+                game.skipTurn(user)
+            else:
+                try:
+                    scored = game.playWord(user, x, y, across, word)
+                except Exception, e:
+                    raise endpoints.BadRequestException(
+                        'Illegal move: {}'.format(e.message))
+            playScore = game.scoreForUser(user) - scoreBefore
+            # keep history of moves
+            move = Move.create(game, user, word, across, x, y, playScore,
+                               scored)
+            return [self.moves.setPersistents(move)]
+        game, (move,) = yield self.mutateGameAsync(request.gameid, play)
+        self.queueBotTurns(game)
+        scoreAfter = game.scoreForUser(move.user)
+        raise ndb.Return(self.gameFormFrom(
+            game, self.lastPlayDescription(
+                scoreAfter - move.moveScore, scoreAfter)))
+
+    @endpoints.method(request_message=SUGGEST_REQUEST,
+                      response_message=SuggestionList,
+                      path='game/{gameid}/suggest',
+                      name='suggest_moves',
+                      http_method='GET')
+    def suggest_moves(self, request):
+        """Return best scoring legal moves for user's letters, best first."""
         game = self.gameById(request.gameid)
-        self.validateStarted(game)
-        self.validateNotOver(game)
-        self.validateNotCancelled(game)
-        if game.nextPlayer().player.name != request.user_name:
+        lexicon = dictionary.current()
+        if lexicon is None:
             raise endpoints.BadRequestException(
-                'Not turn yet for {}'.format(request.user_name))
-        user = self.users.findByName(request.user_name)
-        word = request.word
-        across = request.across
-        x = request.x
-        y = request.y
-        scoreBefore = game.scoreForUser(user)
-        if len(request.word) <= 0:
-            game.skipTurn(user)
-        else:
-            try:
-                game.playWord(user, x, y, across, word)
-            except Exception, e:
-                raise endpoints.BadRequestException(
-                    'Illegal move: {}'.format(e.message))
-        scoreAfter = game.scoreForUser(user)
-        playScore = scoreAfter - scoreBefore
-        self.games.update(game)
-        # keep history of moves
-        self.moves.register(
-            Move.create(game, user, word, across, x, y, playScore))
-        return self.gameFormFrom(
-            game, self.lastPlayDescription(scoreBefore, scoreAfter))
-
-    @endpoints.method(request_message=PLAIN_REQUEST,
+                'No dictionary is deployed to suggest words from.')
+        user = self.userByName(request.user_name)
+        playerState = game.getPlayerState(user)
+        if playerState is None:
+            raise endpoints.BadRequestException(
+                'User {} is not playing this game.'.format(request.user_name))
+        limit = min(request.limit or DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS)
+        moves, complete = movegen.searchMoves(
+            lexicon, game.boardContent, playerState.bag, limit)
+        return SuggestionList(
+            suggestions=[MoveSuggestion(
+                word=s.word,
+                x=s.x,
+                y=s.y,
+                across=s.across,
+                score=s.score) for s in moves],
+            complete=complete)
+
+    @endpoints.method(request_message=PAGE_REQUEST,
                       response_message=StringList,
                       path='user/all',
                       name='get_all_users',
                       http_method='GET')
     def get_all_users(self, request):
-        """Return list of all known users."""
-        nameList = []
-        for u in self.users.all():
-            nameList.append(u.name)
-        return StringList(strings=nameList)
+        """Return a page of the names of known users, in order."""
+        cursor, limit = self.pageOf(request)
+        names, cursor, more = self.users.namesPage(cursor, limit)
+        return StringList(strings=names,
+                          next_cursor=self.nextCursor(cursor, more))
 
     @endpoints.method(request_message=GAME_ID_REQUEST,
                       response_message=StringMessage,
@@ -210,52 +410,39 @@ class WordWarsApi(remote.Service):
                       http_method='PUT')
     def cancel_game(self, request):
         """Mark game as cancelled, with no winner."""
-        game = self.gameById(request.gameid)
-        game.cancel()
-        self.games.update(game)
+        self.mutateGame(request.gameid, lambda game: game.cancel())
         return StringMessage(message='Game is cancelled.')
 
-    @endpoints.method(request_message=PLAIN_REQUEST,
+    @endpoints.method(request_message=PAGE_REQUEST,
                       response_message=RankingList,
                       path='user/rankings',
                       name='get_user_rankings',
                       http_method='GET')
     def get_user_rankings(self, request):
-        """Return sorted list of the win/loss ratio by player."""
-        wins = {}
-        losses = {}
-        for user in self.users.all():
-            wins[user.name] = 0
-            losses[user.name] = 0
-        for game in self.games.allCompleted():
-            winner = game.leader().player
-            wins[winner.name] += 1
-            for p in game.players:
-                if p.player != winner:
-                    losses[p.player.name] += 1
-        records = []
-        for userName in wins:
-            records.append(WinLossRecord(
-                name=userName,
-                wins=wins[userName],
-                losses=losses[userName]))
+        """Return a page of players' records, highest win/loss ratio first."""
+        cursor, limit = self.pageOf(request)
+        stats, cursor, more = self.stats.rankingPage(cursor, limit)
         return RankingList(
-            # sort highest ratio first
-            rankings=sorted(
-                records,
-                key=lambda record: record.wins/(1+record.losses),
-                reverse=True))
+            rankings=[WinLossRecord(
+                name=s.name,
+                wins=s.wins,
+                losses=s.losses,
+                played=s.played,
+                total_score=s.totalScore) for s in stats],
+            next_cursor=self.nextCursor(cursor, more))
 
-    @endpoints.method(request_message=GAME_ID_REQUEST,
+    @endpoints.method(request_message=HISTORY_REQUEST,
                       response_message=MoveList,
                       path='game/{gameid}/history',
                       name='get_game_history',
                       http_method='GET')
     def get_game_history(self, request):
-        """Return sorted list of the win/loss ratio by player."""
+        """Return a page of the moves played in game, oldest first."""
         game = self.gameById(request.gameid)
+        cursor, limit = self.pageOf(request)
+        moves, cursor, more = self.moves.historyPage(game, cursor, limit)
         moveList = []
-        for move in self.moves.historyForGame(game):
+        for move in moves:
             moveList.append(MoveRecord(
                 user_name=move.user.name,
                 x=move.x,
@@ -263,61 +450,200 @@ class WordWarsApi(remote.Service):
                 across=move.across,
                 word=move.word,
                 moveScore=move.moveScore,
-                time=move.time))
-        # return sorted by time
-        return MoveList(
-            moves=sorted(moveList, key=lambda move: move.time))
+                time=move.time,
+                words=[WordScoreRecord(
+                    word=w.word,
+                    score=w.score,
+                    x=w.x,
+                    y=w.y,
+                    across=w.across) for w in move.words],
+                version=move.version))
+        return MoveList(moves=moveList,
+                        next_cursor=self.nextCursor(cursor, more))
+
+    @endpoints.method(request_message=POSITION_REQUEST,
+                      response_message=GameForm,
+                      path='game/{gameid}/position',
+                      name='get_game_position',
+                      http_method='GET')
+    def get_game_position(self, request):
+        """Return game as it was when saved at version, e.g. after a move
+        in its history."""
+        game = self.gameById(request.gameid)
+        if request.version is None or not (
+                0 <= request.version <= game.version):
+            raise endpoints.BadRequestException(
+                'version must be from 0 to {}'.format(game.version))
+        position = self.games.positionAt(game, request.version)
+        if position is None:
+            raise endpoints.NotFoundException(
+                'No position saved for version {}'.format(request.version))
+        return self.gameFormFrom(position, '')
 
     # The methods below provide common utility functions.
 
     def gameFormFrom(self, game, lastPlay):
         """Return game state, including identity of whose turn is next."""
+        form = self.turnFormFrom(game, lastPlay,
+                                 GameForm(gameid=self.games.id(game)))
+        rows = self.firstRows(game, 10)
+        form.board = game.boardContent.asString()
+        form.y0 = rows[0]
+        form.y1 = rows[1]
+        form.y2 = rows[2]
+        form.y3 = rows[3]
+        form.y4 = rows[4]
+        form.y5 = rows[5]
+        form.y6 = rows[6]
+        form.y7 = rows[7]
+        form.y8 = rows[8]
+        form.y9 = rows[9]
+        return form
+
+    def gameSummaryFrom(self, game, user):
+        """Return GameSummary of game, with user's score and letters if
+        user is a player."""
+        next = game.nextPlayer()
+        summary = GameSummary(
+            gameid=self.games.id(game), status=game.mode,
+            user_turn=next.player.name if next else None,
+            version=game.version, last_update=game.lastUpdate)
+        player = user and game.getPlayerState(user)
+        if player:
+            summary.user_score = player.score
+            summary.user_letters = player.bag.asString()
+        return summary
+
+    def compactFormFrom(self, game, lastPlay):
+        """Return game state with its board as a CompactBoard, sized by
+        the letters placed rather than the board's area."""
+        form = self.turnFormFrom(game, lastPlay, CompactGameForm(
+            gameid=self.games.id(game), version=game.version,
+            etag=self.etag(game.version)))
+        board = game.boardContent
+        positions = board.occupied()
+        form.compact_board = CompactBoard(
+            width=board.width, height=board.height, positions=positions,
+            letters=''.join([chr(board.cells[i]) for i in positions]))
+        return form
+
+    def changeFormFrom(self, game, since):
+        """Return the changes to game since version since: the cells
+        changed and the players who moved since then if those are known,
+        else the whole board and every player."""
+        form = self.turnFormFrom(game, '', GameChangeForm(
+            gameid=self.games.id(game), version=game.version,
+            etag=self.etag(game.version)))
+        board = game.boardContent
+        changes = None
+        if since is not None and 0 <= since < game.version:
+            changes = self.moves.changesSince(game, since)
+        if changes is None:
+            form.board = board.asString()
+            form.players = [self.playerRecordFrom(p) for p in game.players]
+            return form
+        placed, users = changes
+        form.since_version = since
+        form.cells = [CellRecord(x=i % board.width, y=i // board.width,
+                                 letter=chr(board.cells[i]))
+                      for i in sorted(placed)]
+        form.players = [self.playerRecordFrom(p) for p in game.players
+                        if p.player.key in users]
+        return form
+
+    def playerRecordFrom(self, playerState):
+        """Return PlayerRecord of a player's letters and score."""
+        return PlayerRecord(user_name=playerState.player.name,
+                            user_letters=playerState.bag.asString(),
+                            user_score=playerState.score)
+
+    def notModifiedForm(self, gameid, version):
+        """Return GameChangeForm saying game gameid is still at version."""
+        return GameChangeForm(gameid=gameid, version=version,
+                              etag=self.etag(version), not_modified=True)
+
+    def turnFormFrom(self, game, lastPlay, form):
+        """Set game status and whose turn is next, with that player's
+        letters and score, in form; return form."""
         next = game.nextPlayer()
         if next is None:
-            return GameForm(
-                gameid=self.games.id(game),
-                board=game.board,
-                status=game.mode,
-                user_turn='None',
-                user_letters='',
-                user_score=0,
-                y0=game.board[0:10],
-                y1=game.board[10:20],
-                y2=game.board[20:30],
-                y3=game.board[30:40],
-                y4=game.board[40:50],
-                y5=game.board[50:60],
-                y6=game.board[60:70],
-                y7=game.board[70:80],
-                y8=game.board[80:90],
-                y9=game.board[90:100]
-                )
+            form.status = game.mode
+            form.user_turn = 'None'
+            form.user_letters = ''
+            form.user_score = 0
         else:
-            return GameForm(
-                gameid=self.games.id(game),
-                board=game.board,
-                status=game.mode + ":  " + lastPlay,
-                user_turn=next.player.name,
-                user_letters=next.bag.asString(),
-                user_score=next.score,
-                y0=game.board[0:10],
-                y1=game.board[10:20],
-                y2=game.board[20:30],
-                y3=game.board[30:40],
-                y4=game.board[40:50],
-                y5=game.board[50:60],
-                y6=game.board[60:70],
-                y7=game.board[70:80],
-                y8=game.board[80:90],
-                y9=game.board[90:100]
-                )
+            form.status = game.mode + ":  " + lastPlay
+            form.user_turn = next.player.name
+            form.user_letters = next.bag.asString()
+            form.user_score = next.score
+        return form
+
+    def etag(self, version):
+        """Return entity tag for version of a game."""
+        return '"{}"'.format(version)
+
+    def requestHeader(self, name):
+        """Return value of HTTP header name sent with request, or None."""
+        state = getattr(self, 'request_state', None)
+        if state is None:
+            return None
+        return state.headers.get(name)
+
+    def firstRows(self, game, count):
+        """Return strings for the first count rows, '' past the last row."""
+        board = game.boardContent
+        return [board.row(y).asString() if y < board.height else ''
+                for y in range(count)]
 
     def gameById(self, id):
-        game = self.games.findById(id)
+        return self.gameByIdAsync(id).get_result()
+
+    @ndb.tasklet
+    def gameByIdAsync(self, id):
+        game = yield self.games.findByIdAsync(id)
         if not game:
             raise endpoints.NotFoundException(
                 'Game not found for id: {}'.format(id))
-        return game
+        raise ndb.Return(game)
+
+    def mutateGame(self, id, operation):
+        """Apply operation to game with id and save it; return (game,
+        related).  See GameStateRepository.mutate."""
+        return self.mutateGameAsync(id, operation).get_result()
+
+    @ndb.tasklet
+    def mutateGameAsync(self, id, operation):
+        try:
+            game, related = yield self.games.mutateAsync(id, operation)
+        except ConcurrentUpdate:
+            raise endpoints.ConflictException(
+                'Game {} is busy, please try again.'.format(id))
+        if not game:
+            raise endpoints.NotFoundException(
+                'Game not found for id: {}'.format(id))
+        raise ndb.Return(game, related)
+
+    def pageOf(self, request, parse=None):
+        """return (cursor, limit) requested for a page of a list; parse
+        turns the cursor string into a cursor, by default an ndb.Cursor"""
+        limit = request.limit or DEFAULT_PAGE_SIZE
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise endpoints.BadRequestException(
+                'limit must be from 1 to {}'.format(MAX_PAGE_SIZE))
+        if not request.cursor:
+            return None, limit
+        try:
+            if parse is None:
+                return ndb.Cursor(urlsafe=request.cursor), limit
+            return parse(request.cursor), limit
+        except Exception:
+            raise endpoints.BadRequestException('Invalid cursor.')
+
+    def nextCursor(self, cursor, more):
+        """return cursor string for the next page, or None if none"""
+        if more and cursor is not None:
+            return cursor.urlsafe()
+        return None
 
     def userByName(self, name):
         user = self.users.findByName(name)
@@ -326,6 +652,12 @@ class WordWarsApi(remote.Service):
                 'User {} not found!'.format(name))
         return user
 
+    def queueBotTurns(self, game):
+        """Queue a task to play bot turns if a bot is next in game."""
+        next = game.nextPlayer()
+        if next is not None and next.player.bot:
+            queueTurns(self.games.id(game))
+
     def lastPlayDescription(self, before, total):
         added = total - before
         if total <= 0:
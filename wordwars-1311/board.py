@@ -0,0 +1,290 @@
+"""board.py - Board class holding the letters placed on a game board.
+
+The board is a width x height grid of letters stored row by row in a single
+bytearray, one byte per cell, with EMPTY marking cells with no letter.  The
+persisted GameState.board string is exactly these bytes, so converting to
+and from the persistent form is a single buffer copy rather than a per-cell
+list of one-char strings.
+
+Alongside the letters the board keeps an occupancy index: one integer
+bitmask per row (bit x set if (x, y) holds a letter) and one per column
+(bit y set).  Questions like "does this play fit, and does it touch a
+letter already on the board?" or "which squares are anchors?" are then
+answered with a few integer operations instead of scanning cells.
+
+The board also keeps its Zobrist hash (see zobrist.py) up to date as
+letters are placed, so a position can be identified without reading it."""
+
+import zobrist
+
+# marker for a board position with no letter
+EMPTY = '_'
+EMPTY_BYTE = ord(EMPTY)
+# byte of the first letter, 'a', at offset 0 in a cell's Zobrist keys
+FIRST_LETTER_BYTE = ord('a')
+
+
+class LineView(object):
+    """Read-only view of one row or column of a Board.
+
+    Creating a view is O(1): it only remembers where the line starts in the
+    board's cells and the stride between its letters."""
+
+    def __init__(self, cells, start, step, length):
+        self.cells = cells
+        self.start = start
+        self.step = step
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.length
+        if i < 0 or i >= self.length:
+            raise IndexError('line index {} out of range'.format(i))
+        return chr(self.cells[self.start + i * self.step])
+
+    def __iter__(self):
+        cells = self.cells
+        for i in xrange(self.start, self.start + self.length * self.step,
+                        self.step):
+            yield chr(cells[i])
+
+    def asString(self):
+        """Return the letters of this line as a string."""
+        end = self.start + (self.length - 1) * self.step + 1
+        return str(self.cells[self.start:end:self.step])
+
+
+class Board(object):
+    """Grid of letters addressed by (x, y) with (0, 0) at the top left."""
+
+    def __init__(self, width, height):
+        """Create an empty board of the given dimensions."""
+        if width <= 0 or height <= 0:
+            raise ValueError(
+                'board dimensions must be positive, not {}x{}'.format(
+                    width, height))
+        self.width = width
+        self.height = height
+        self.cells = bytearray(EMPTY * (width * height))
+        self.rows = [0] * height
+        self.cols = [0] * width
+        self.count = 0      # number of letters on the board
+        self.keys = zobrist.boardKeys(width, height)
+        self.hash = 0       # Zobrist hash of the letters on the board
+
+    @classmethod
+    def fromString(cls, width, height, s):
+        """Construct a Board from its persisted string form."""
+        if len(s) != width * height:
+            raise ValueError('board string has {} cells, expected {}x{}'.format(
+                len(s), width, height))
+        return cls.fromCells(width, height, bytearray(s))
+
+    @classmethod
+    def fromCells(cls, width, height, cells):
+        """Construct a Board that takes ownership of bytearray cells."""
+        if len(cells) != width * height:
+            raise ValueError('board has {} cells, expected {}x{}'.format(
+                len(cells), width, height))
+        board = cls.__new__(cls)
+        board.width = width
+        board.height = height
+        board.cells = cells
+        board.reindex()
+        return board
+
+    def reindex(self):
+        """Rebuild the occupancy index from the cells."""
+        self.rows = [0] * self.height
+        self.cols = [0] * self.width
+        self.count = 0
+        self.keys = keys = zobrist.boardKeys(self.width, self.height)
+        self.hash = 0
+        cells = self.cells
+        width = self.width
+        if cells.count(EMPTY) == len(cells):
+            return
+        for y in range(self.height):
+            offset = y * width
+            if cells.count(EMPTY, offset, offset + width) == width:
+                continue    # skip rows with no letters
+            for x in range(width):
+                byte = cells[offset + x]
+                if byte != EMPTY_BYTE:
+                    self.rows[y] |= 1 << x
+                    self.cols[x] |= 1 << y
+                    self.count += 1
+                    self.hash ^= keys[
+                        (offset + x) * 26 + byte - FIRST_LETTER_BYTE]
+
+    def asString(self):
+        """Return persistent string form: rows concatenated top-down."""
+        return str(self.cells)
+
+    def view(self):
+        """Return a zero-copy memoryview of the underlying cells."""
+        return memoryview(self.cells)
+
+    def index(self, x, y):
+        """Return offset of (x, y) in cells, raising ValueError if outside."""
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            raise ValueError(
+                'cannot access board position ({},{})'.format(x, y))
+        return x + (y * self.width)
+
+    def coordinates(self, index):
+        """Return (x, y) of cell at offset index; the inverse of index."""
+        return index % self.width, index // self.width
+
+    def letter(self, x, y):
+        """Return letter at (x, y), or EMPTY if there is none."""
+        return chr(self.cells[self.index(x, y)])
+
+    def setLetter(self, x, y, letter):
+        """Place letter at (x, y), or clear it if letter is EMPTY."""
+        i = self.index(x, y)
+        old = self.cells[i]
+        wasEmpty = old == EMPTY_BYTE
+        self.cells[i] = ord(letter)
+        if not wasEmpty:
+            self.hash ^= self.keys[i * 26 + old - FIRST_LETTER_BYTE]
+        if letter != EMPTY:
+            self.hash ^= self.keys[i * 26 + ord(letter) - FIRST_LETTER_BYTE]
+        if letter == EMPTY:
+            if not wasEmpty:
+                self.rows[y] &= ~(1 << x)
+                self.cols[x] &= ~(1 << y)
+                self.count -= 1
+        elif wasEmpty:
+            self.rows[y] |= 1 << x
+            self.cols[x] |= 1 << y
+            self.count += 1
+
+    def isEmpty(self, x, y):
+        """Return True if no letter is at (x, y)."""
+        self.index(x, y)    # raises ValueError if off the board
+        return not (self.rows[y] >> x) & 1
+
+    def isBlank(self):
+        """Return True if no letters have been placed."""
+        return self.count == 0
+
+    def occupied(self):
+        """Return list of offsets in cells holding letters, in row order.
+
+        Read from the occupancy index, so empty rows cost one test each and
+        empty cells in other rows nothing."""
+        width = self.width
+        return [y * width + x for y, mask in enumerate(self.rows) if mask
+                for x in bits(mask)]
+
+    # occupancy index queries.  A line is a row (across) or column (down);
+    # pos is the position along it: x for rows, y for columns.
+
+    def lineMask(self, across, line):
+        """Return occupancy bitmask of row (across) or column line."""
+        return self.rows[line] if across else self.cols[line]
+
+    def lineCount(self, across):
+        """Return number of rows (across) or columns."""
+        return self.height if across else self.width
+
+    def lineLength(self, across):
+        """Return length of a row (across) or column."""
+        return self.width if across else self.height
+
+    def fits(self, x, y, across, length):
+        """Return True if length squares from (x, y) are all on the board."""
+        if x < 0 or y < 0 or length <= 0:
+            return False
+        if across:
+            return x + length <= self.width and y < self.height
+        return y + length <= self.height and x < self.width
+
+    def touches(self, x, y, across, length):
+        """Return True if the length squares from (x, y) hold or are next
+        to any letter.  The squares must fit on the board."""
+        if across:
+            line, pos, count = y, x, self.height
+            masks = self.rows
+        else:
+            line, pos, count = x, y, self.width
+            masks = self.cols
+        span = ((1 << length) - 1) << pos
+        near = masks[line] & ((span << 1) | span | (span >> 1))
+        if line > 0:
+            near |= masks[line - 1] & span
+        if line < count - 1:
+            near |= masks[line + 1] & span
+        return near != 0
+
+    def anchors(self, across, line):
+        """Return bitmask of empty squares in line next to a letter."""
+        if across:
+            masks, count, length = self.rows, self.height, self.width
+        else:
+            masks, count, length = self.cols, self.width, self.height
+        mask = masks[line]
+        near = (mask << 1) | (mask >> 1)
+        if line > 0:
+            near |= masks[line - 1]
+        if line < count - 1:
+            near |= masks[line + 1]
+        return near & ~mask & ((1 << length) - 1)
+
+    def crossMask(self, across, line, pos):
+        """Return occupancy bitmask of the line crossing line at pos."""
+        if across:
+            return self.cols[pos]
+        return self.rows[pos]
+
+    def row(self, y):
+        """Return a view of the letters in row y."""
+        if y < 0 or y >= self.height:
+            raise ValueError('no row {} on the board'.format(y))
+        return LineView(self.cells, y * self.width, 1, self.width)
+
+    def column(self, x):
+        """Return a view of the letters in column x."""
+        if x < 0 or x >= self.width:
+            raise ValueError('no column {} on the board'.format(x))
+        return LineView(self.cells, x, self.width, self.height)
+
+    def copy(self):
+        """Return copy of this board."""
+        board = Board.__new__(Board)
+        board.width = self.width
+        board.height = self.height
+        board.cells = bytearray(self.cells)
+        board.rows = list(self.rows)
+        board.cols = list(self.cols)
+        board.count = self.count
+        board.keys = self.keys
+        board.hash = self.hash
+        return board
+
+    def __repr__(self):
+        return '\n'.join(
+            [self.row(y).asString() for y in range(self.height)])
+
+
+def runAround(mask, pos):
+    """Return (start, end) of the run of set bits in mask through pos,
+    counting pos as set; end is exclusive."""
+    below = ~mask & ((1 << pos) - 1)
+    start = below.bit_length()      # just past the last clear bit below pos
+    above = (mask >> pos) | 1
+    end = pos + ((above + 1) & ~above).bit_length() - 1
+    return start, end
+
+
+def bits(mask):
+    """Yield position of each set bit in mask, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
@@ -0,0 +1,103 @@
+"""bots.py - Computer players that take their turns automatically.
+
+A bot is a User with bot=True.  Whenever a game's next player is a bot,
+the API queues a task (see main.py) that calls playBotTurns for the game.
+Each task plays at most TURNS_PER_TASK turns, so a game of bots is played
+by a chain of short tasks rather than one long one.  The tasks go on the
+BOT_QUEUE push queue, whose max_concurrent_requests (see queue.yaml) bounds
+how many searches run at once.
+
+The move search runs in the task's own request (the App Engine python27
+sandbox cannot start processes), limited by node and time budgets after
+which the bot plays the best move found so far, or skips its turn if
+there is none.  The chosen move is applied through GameState.playWord or
+skipTurn, exactly as for a human player, then saved with the game's move
+history.  If the game rejects the move, the bot tries its next best one."""
+
+import logging
+
+from google.appengine.api import taskqueue
+
+from models import Move
+from repositories import GameStateRepository, MoveRepository
+import dictionary
+import movegen
+
+# nodes and seconds a bot may search for its move
+MOVE_NODE_BUDGET = 2000000
+MOVE_TIME_BUDGET = 2.0
+# moves a bot tries before giving up and skipping its turn
+MOVE_ATTEMPTS = 3
+# bot turns played by each task before queueing the rest
+TURNS_PER_TASK = 10
+# push queue of bot turn tasks, defined in queue.yaml
+BOT_QUEUE = 'bots'
+
+
+def queueTurns(gameid):
+    """Queue a task on BOT_QUEUE to play the bot turns of game gameid."""
+    taskqueue.add(url='/tasks/bot_turns', params={'gameid': gameid},
+                  queue_name=BOT_QUEUE)
+
+
+def searchMoves(game, playerState, limit, nodeBudget, timeBudget):
+    """Return up to limit best plays for playerState, as a list of
+    movegen.Suggestion, best first; empty if there is no dictionary."""
+    lexicon = dictionary.current()
+    if lexicon is None:
+        return []
+    return movegen.suggestMoves(
+        lexicon, game.boardContent, playerState.bag, limit,
+        nodeBudget=nodeBudget, timeBudget=timeBudget)
+
+
+class BotScheduler(object):
+    """Play the turns of bot players in a game."""
+
+    def __init__(self, games=None, moves=None, timeBudget=MOVE_TIME_BUDGET,
+                 nodeBudget=MOVE_NODE_BUDGET):
+        self.games = games or GameStateRepository()
+        self.moves = moves or MoveRepository()
+        self.timeBudget = timeBudget
+        self.nodeBudget = nodeBudget
+
+    def botUp(self, game):
+        """Return True if it is a bot's turn in game."""
+        next = game.nextPlayer()
+        return next is not None and bool(next.player.bot)
+
+    def playBotTurns(self, gameid, maxTurns=TURNS_PER_TASK):
+        """Play bot turns in game until a human is up, the game is over or
+        maxTurns are played.
+
+        Return True if a bot is still up, for another task to play on."""
+        game = self.games.findById(gameid)
+        turns = 0
+        while game is not None and self.botUp(game):
+            if turns >= maxTurns:
+                return True
+            self.takeTurn(game)
+            turns += 1
+        return False
+
+    def takeTurn(self, game):
+        """Search for and play the next (bot) player's move, then save."""
+        playerState = game.nextPlayer()
+        user = playerState.player
+        scoreBefore = playerState.score
+        scored = []
+        word, x, y, across = '', None, None, None
+        for move in searchMoves(game, playerState, MOVE_ATTEMPTS,
+                                self.nodeBudget, self.timeBudget):
+            try:
+                scored = game.playWord(user, move.x, move.y, move.across,
+                                       move.word)
+                word, x, y, across = move.word, move.x, move.y, move.across
+                break
+            except ValueError, e:
+                logging.warning('bot %s move rejected: %s', user.name, e)
+        if not word:
+            game.skipTurn(user)
+        move = Move.create(game, user, word, across, x, y,
+                           playerState.score - scoreBefore, scored)
+        self.games.update(game, [self.moves.setPersistents(move)])
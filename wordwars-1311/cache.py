@@ -0,0 +1,48 @@
+"""cache.py - Bounded caches shared by the game engines and repositories."""
+
+import collections
+
+
+class LRUCache(object):
+    """Map holding at most capacity entries, evicting least recently used.
+
+    Counts hits and misses so callers can report cache effectiveness."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Return value cached for key (marking it recently used)."""
+        try:
+            value = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Cache value for key, evicting the oldest entry if full."""
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def discard(self, key):
+        """Remove any entry for key."""
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        """Return dict of size, hits and misses."""
+        return {'size': len(self.entries), 'hits': self.hits,
+                'misses': self.misses}
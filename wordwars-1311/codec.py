@@ -0,0 +1,158 @@
+"""codec.py - Compact binary encoding of a game's letters, board and players.
+
+The encoding starts with a format version byte, so stored games can be read
+after the format changes.  Format 1 is:
+
+    version     1 byte
+    bag         26 letter counts, as varints (one byte each below 128)
+    board       varint length, then the board's cells, one byte each
+    players     varint count, then for each player:
+                    varint turn number, zigzag varint score,
+                    26 letter counts of the player's bag,
+                    varint count of user fields, then each field as a
+                    varint length and its UTF-8 bytes
+
+A varint holds 7 bits per byte, low bits first, with the high bit set on
+all but the last byte.  User fields are strings given by the caller (e.g.
+a datastore key and the user's name), so the format does not depend on
+how users are stored.  Encoding appends to one bytearray and decoding
+reads from one buffer; neither works letter by letter."""
+
+from letters import alphabet
+
+FORMAT = 1
+LETTERS = len(alphabet)
+
+
+class PackedPlayer(object):
+    """A player as decoded: turn number, score, letter counts and the
+    user fields given when encoding."""
+
+    def __init__(self, turnNumber, score, counts, user):
+        self.turnNumber = turnNumber
+        self.score = score
+        self.counts = counts
+        self.user = user
+
+
+class PackedGame(object):
+    """A game as decoded: bag letter counts, board cells (a bytearray) and
+    list of PackedPlayer."""
+
+    def __init__(self, counts, cells, players):
+        self.counts = counts
+        self.cells = cells
+        self.players = players
+
+
+def writeVarint(out, n):
+    """Append non-negative integer n to bytearray out as a varint."""
+    if n < 0:
+        raise ValueError('cannot encode negative varint {}'.format(n))
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def readVarint(buf, pos):
+    """Return (integer, next position) for the varint at buf[pos]."""
+    n = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def zigzag(n):
+    """Map signed n to unsigned: 0, -1, 1, -2, ... to 0, 1, 2, 3, ..."""
+    return n << 1 if n >= 0 else ((-n) << 1) - 1
+
+
+def unzigzag(n):
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+
+def writeCounts(out, counts):
+    if max(counts) < 0x80:
+        out.extend(counts)     # the usual case: one byte per count
+    else:
+        for c in counts:
+            writeVarint(out, c)
+
+
+def readCounts(buf, pos):
+    end = pos + LETTERS
+    counts = buf[pos:end]
+    if max(counts) < 0x80:
+        return list(counts), end
+    counts = []
+    for i in range(LETTERS):
+        c, pos = readVarint(buf, pos)
+        counts.append(c)
+    return counts, pos
+
+
+def writeString(out, s):
+    if isinstance(s, unicode):
+        s = s.encode('utf-8')
+    writeVarint(out, len(s))
+    out.extend(s)
+
+
+def readString(buf, pos):
+    length, pos = readVarint(buf, pos)
+    end = pos + length
+    return str(buf[pos:end]).decode('utf-8'), end
+
+
+def encodeGame(game, userFields):
+    """Return str encoding game's bag, board and players.
+
+    userFields(user) returns the list of strings to store for a player's
+    user; they are returned as PackedPlayer.user by decodeGame."""
+    out = bytearray()
+    out.append(FORMAT)
+    writeCounts(out, game.bagOfLetters.counts)
+    cells = game.boardContent.cells
+    writeVarint(out, len(cells))
+    out.extend(cells)
+    writeVarint(out, len(game.players))
+    for p in game.players:
+        writeVarint(out, p.turnNumber)
+        writeVarint(out, zigzag(p.score))
+        writeCounts(out, p.bag.counts)
+        fields = userFields(p.player)
+        writeVarint(out, len(fields))
+        for field in fields:
+            writeString(out, field)
+    return str(out)
+
+
+def decodeGame(data):
+    """Return PackedGame from a str made by encodeGame."""
+    buf = bytearray(data)
+    if not buf or buf[0] != FORMAT:
+        raise ValueError('unknown game encoding format {}'.format(
+            buf[0] if buf else None))
+    counts, pos = readCounts(buf, 1)
+    length, pos = readVarint(buf, pos)
+    cells = buf[pos:pos + length]
+    pos += length
+    count, pos = readVarint(buf, pos)
+    players = []
+    for i in range(count):
+        turnNumber, pos = readVarint(buf, pos)
+        score, pos = readVarint(buf, pos)
+        playerCounts, pos = readCounts(buf, pos)
+        fieldCount, pos = readVarint(buf, pos)
+        user = []
+        for j in range(fieldCount):
+            field, pos = readString(buf, pos)
+            user.append(field)
+        players.append(
+            PackedPlayer(turnNumber, unzigzag(score), playerCounts, user))
+    return PackedGame(counts, cells, players)
@@ -0,0 +1,264 @@
+"""dictionary.py - Compact word dictionary used to validate words played.
+
+Words are compiled into a DAWG (a trie with identical suffix subtrees
+merged) and written to a flat file of 32 bit words.  Loading the file
+memory-maps it read-only, so every process on a host shares the same pages
+and startup costs nothing beyond opening the file.
+
+File layout (little-endian):
+    header: 8 byte MAGIC, uint32 word count, uint32 index of root node
+    words:  uint32 each; word 0 is an unused sentinel so that a child index
+            of 0 means "no children".  A node is a letter mask word (bit n
+            set if the node has an edge for the nth letter of the alphabet)
+            followed by its edges in letter order, so following a letter is
+            a bit test and a jump, whatever the node's fan-out.
+
+    edge bits 0-7   letter (ascii code)
+              8     LAST: final edge leaving this node
+              9     TERMINAL: a word ends with this letter
+              10-31 index of the child node
+
+To compile a word list (one word per line):
+    python dictionary.py words.txt words.dawg
+"""
+
+import array
+import os
+import struct
+import sys
+
+try:
+    import mmap
+except ImportError:     # e.g. the App Engine python27 sandbox
+    mmap = None
+
+MAGIC = 'WWDAWG02'
+HEADER = struct.Struct('<8sII')
+EDGE = struct.Struct('<I')
+LAST = 1 << 8
+TERMINAL = 1 << 9
+CHILD_SHIFT = 10
+MAX_EDGES = 1 << (32 - CHILD_SHIFT)
+FIRST = ord('a')
+
+# where the game looks for its dictionary unless one is installed
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), 'words.dawg')
+
+
+class _Node(object):
+    """Trie node used while compiling."""
+    __slots__ = ('terminal', 'edges', 'id')
+
+    def __init__(self, id):
+        self.terminal = False
+        self.edges = []     # (letter, _Node) in increasing letter order
+        self.id = id
+
+    def signature(self):
+        return (self.terminal,
+                tuple([(l, child.id) for l, child in self.edges]))
+
+
+def build(words, path):
+    """Build a minimized DAWG from words and write it to path.
+
+    Words are lowercased; words with characters outside a-z are skipped.
+    Uses incremental minimization over the sorted word list, so memory
+    stays proportional to the size of the minimized graph."""
+    words = sorted(set(
+        [w.strip().lower() for w in words]))
+    words = [w for w in words if w and w.isalpha() and
+             all(['a' <= c <= 'z' for c in w])]
+    ids = [0]
+
+    def newNode():
+        ids[0] += 1
+        return _Node(ids[0])
+
+    root = newNode()
+    register = {}
+    unchecked = []      # (parent, letter, child) along the previous word
+    previous = ''
+
+    def minimize(downTo):
+        while len(unchecked) > downTo:
+            parent, letter, child = unchecked.pop()
+            key = child.signature()
+            if key in register:
+                parent.edges[-1] = (letter, register[key])
+            else:
+                register[key] = child
+
+    for word in words:
+        common = 0
+        while (common < len(word) and common < len(previous) and
+               word[common] == previous[common]):
+            common += 1
+        minimize(common)
+        node = unchecked[-1][2] if unchecked else root
+        for letter in word[common:]:
+            child = newNode()
+            node.edges.append((letter, child))
+            unchecked.append((node, letter, child))
+            node = child
+        node.terminal = True
+        previous = word
+    minimize(0)
+    _write(root, path)
+    return len(words)
+
+
+def _write(root, path):
+    """Lay out each node as its letter mask and edges, and save them."""
+    start = {}          # node id -> index of its letter mask
+    order = []
+    pending = [root]
+    count = 1           # word 0 is the sentinel
+    while pending:
+        node = pending.pop()
+        if not node.edges or node.id in start:
+            continue
+        start[node.id] = count
+        count += 1 + len(node.edges)
+        order.append(node)
+        for l, child in reversed(node.edges):
+            pending.append(child)
+    if count > MAX_EDGES:
+        raise ValueError('dictionary too large: {} edges'.format(count))
+    edges = array.array('I', [0]) * count
+    if edges.itemsize != 4:
+        edges = array.array('L', [0]) * count
+    for node in order:
+        i = start[node.id]
+        mask = 0
+        for l, child in node.edges:
+            mask |= 1 << (ord(l) - FIRST)
+        edges[i] = mask
+        i += 1
+        for n, (l, child) in enumerate(node.edges):
+            e = ord(l) | (start.get(child.id, 0) << CHILD_SHIFT)
+            if child.terminal:
+                e |= TERMINAL
+            if n == len(node.edges) - 1:
+                e |= LAST
+            edges[i + n] = e
+    if sys.byteorder != 'little':
+        edges.byteswap()
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, count, start.get(root.id, 0)))
+        edges.tofile(f)
+
+
+class Dictionary(object):
+    """Read-only view of a compiled DAWG file.
+
+    Graph positions are integer handles: the index of the node shifted left
+    one bit, with the low bit set if a word ends there."""
+
+    def __init__(self, buf):
+        magic, count, root = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError('not a WordWars dictionary file')
+        self.buf = buf
+        self.count = count
+        self.root = root << 1
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a compiled dictionary file read-only, or read it into
+        memory where mmap is not available."""
+        with open(path, 'rb') as f:
+            if mmap is None:
+                return cls(f.read())
+            try:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (EnvironmentError, ValueError):
+                buf = f.read()     # mmap unavailable: private copy instead
+        return cls(buf)
+
+    def edge(self, i):
+        return EDGE.unpack_from(self.buf, HEADER.size + 4 * i)[0]
+
+    def follow(self, node, letter):
+        """Return handle reached from node along letter, or -1 if none."""
+        i = node >> 1
+        if i == 0:
+            return -1
+        bit = ord(letter) - FIRST
+        if bit < 0 or bit > 25:
+            return -1
+        mask = EDGE.unpack_from(self.buf, HEADER.size + 4 * i)[0]
+        if not (mask >> bit) & 1:
+            return -1
+        e = self.edge(i + 1 + bin(mask & ((1 << bit) - 1)).count('1'))
+        return ((e >> CHILD_SHIFT) << 1) | ((e & TERMINAL) >> 9)
+
+    def children(self, node):
+        """Return list of (letter, handle) for edges leaving node."""
+        i = node >> 1
+        result = []
+        if i == 0:
+            return result
+        while True:
+            i += 1
+            e = self.edge(i)
+            result.append((chr(e & 0xff),
+                           ((e >> CHILD_SHIFT) << 1) | ((e & TERMINAL) >> 9)))
+            if e & LAST:
+                return result
+
+    def isWord(self, node):
+        """Return True if a word ends at node."""
+        return node > 0 and bool(node & 1)
+
+    def __contains__(self, word):
+        # same walk as follow(), inlined: this is the hot path for validation
+        unpack = EDGE.unpack_from
+        buf = self.buf
+        base = HEADER.size
+        i = self.root >> 1
+        e = 0
+        for letter in word:
+            bit = ord(letter) - FIRST
+            if i == 0 or bit < 0 or bit > 25:
+                return False
+            mask = unpack(buf, base + 4 * i)[0]
+            if not (mask >> bit) & 1:
+                return False
+            below = mask & ((1 << bit) - 1)
+            e = unpack(buf, base + 4 * (i + 1 + bin(below).count('1')))[0]
+            i = e >> CHILD_SHIFT
+        return bool(e & TERMINAL)
+
+
+# the dictionary used to validate plays, loaded on first use
+_current = None
+_loaded = False
+
+
+def current():
+    """Return the installed dictionary, or None if there is none.
+
+    Unless install() was called, loads DEFAULT_PATH once if it exists."""
+    global _current, _loaded
+    if not _loaded:
+        _loaded = True
+        if os.path.exists(DEFAULT_PATH):
+            _current = Dictionary.load(DEFAULT_PATH)
+    return _current
+
+
+def install(dictionary):
+    """Use dictionary (or None to disable validation) for this process."""
+    global _current, _loaded
+    _current = dictionary
+    _loaded = True
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('usage: python dictionary.py <wordlist> <output.dawg>')
+        sys.exit(1)
+    with open(sys.argv[1]) as f:
+        count = build(f, sys.argv[2])
+    print('compiled {} words into {}'.format(count, sys.argv[2]))
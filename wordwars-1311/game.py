@@ -0,0 +1,245 @@
+"""game.py - WordWars game rules, independent of persistence.
+
+GameRules implements the game logic for a game state with the fields set
+by GameRules.create; PlayerRules does the same for each player's state.
+The persistent models in models.py mix these in with ndb.Model.  Game,
+Player and Member are plain classes with the same rules, for playing
+games without the datastore (see simulate.py)."""
+
+import random
+
+from board import Board
+from letters import LetterBag
+from placement import Placement, MoveJournal
+import dictionary
+import scoring
+
+# Game state constant strings
+MODE_NEW = 'new'
+MODE_PLAYING = 'playing'
+MODE_CANCELLED = 'cancelled'
+MODE_OVER = 'over'
+
+# number of letters each player holds
+RACK_SIZE = 7
+# most players in a game: saving a completed game updates each player's
+# UserStats in one cross-group transaction, limited to 25 entity groups
+MAX_PLAYERS = 10
+
+
+class GameRules(object):
+    """Rules of a wordwars game."""
+
+    # player class created by addPlayer; subclasses may override
+    playerClass = None
+    # source of random letter draws; set a seeded random.Random to replay
+    rng = random
+    # MoveJournal of the last word played, None after a pass
+    lastPlay = None
+
+    @classmethod
+    def create(cls, width=10, height=10, letters=None):
+        """Class factory method to create a game.
+
+        letters is the LetterBag of letters to play with, by default the
+        standard set."""
+        game = cls()    # get new instance (e.g. ndb.Model instance)
+        game.mode = MODE_NEW
+        game.turn = 0
+        game.bagOfLetters = letters or LetterBag.standardSet()
+        game.width = width
+        game.height = height
+        game.boardContent = Board(width, height)    # all cells EMPTY
+        game.players = []
+        game.consecutivePasses = 0
+        return game
+
+    def addPlayer(self, user):
+        """Add user as a player in this game."""
+        if self.started():
+            raise ValueError('Cannot add player to game in progress.')
+        if len(self.players) >= MAX_PLAYERS:
+            raise ValueError(
+                'Cannot add more than {} players.'.format(MAX_PLAYERS))
+        # okay to add players until started with first turn
+        playerSequence = len(self.players)   # zero for first player
+        # initialize each player with 7 letters from game bag
+        lettersForPlayer = self.bagOfLetters.drawK(RACK_SIZE, self.rng)
+        pState = self.playerClass.create(
+            self, user, playerSequence, lettersForPlayer)
+        self.players.append(pState)
+
+    def start(self):
+        """Start the game.  No more players may be added."""
+        self.turn = 0
+        self.mode = MODE_PLAYING
+        return self.nextPlayer()
+
+    def cancel(self):
+        """Cancel the game.  There is no winner."""
+        self.mode = MODE_CANCELLED
+
+    def started(self):
+        """Return True if game has started."""
+        return self.mode != MODE_NEW
+
+    def cancelled(self):
+        """Return True if game has been cancelled."""
+        return self.mode == MODE_CANCELLED
+
+    def nextPlayer(self):
+        """Return PlayerState for player with next turn."""
+        if self.mode != MODE_PLAYING:
+            return None
+        for p in self.players:
+            if p.turnNumber == self.turn:
+                return p
+        return None
+
+    def directionString(self, across):
+        """Translate boolean direction to 'across' or 'down'."""
+        if across:
+            return 'across'
+        else:
+            return 'down'
+
+    def getPlayerState(self, user):
+        """Return PlayerState for user or None."""
+        for p in self.players:
+            if p.player.identity() == user.identity():
+                return p
+        return None
+
+    def incrementTurn(self):
+        """Advance game state to next turn."""
+        self.turn += 1
+        if self.turn == len(self.players):
+            self.turn = 0
+
+    def playWord(self, user, x, y, across, word):
+        """Play word as instructed by user.
+
+        The whole play is validated before anything changes; if applying
+        it fails anyway, board, bags, score and turn are rolled back.
+        Return list of scoring.ScoredWord for the main word and every
+        cross-word formed."""
+        playerState = self.getPlayerState(user)
+        placement = Placement(self.boardContent, x, y, across, word)
+        placement.validate(playerState.bag)
+        scored = scoring.scorePlacement(
+            self.boardContent, placement.placed, across)
+        for s in scored:
+            self.validateWord(s.word)
+        journal = MoveJournal(self, playerState)
+        try:
+            journal.place(placement.placed)
+            journal.addScore(scoring.total(scored))
+            journal.refill(len(placement.placed))
+            self.incrementTurn()
+            self.consecutivePasses = 0
+        except Exception, e:
+            journal.rollback()
+            raise e
+        self.lastPlay = journal
+        return scored
+
+    def replayWord(self, user, squares, letters, drawn, score):
+        """Repeat a play by user recorded earlier (see Move in models.py):
+        put letters on squares, move LetterBag drawn from the game's bag to
+        user's and add score.  Nothing is validated or drawn at random."""
+        playerState = self.getPlayerState(user)
+        for (x, y), letter in zip(squares, letters):
+            playerState.bag.remove(letter)
+            self.setBoardContent(x, y, letter)
+        self.bagOfLetters.removeAll(drawn)
+        playerState.bag.addAll(drawn)
+        playerState.score += score
+        self.incrementTurn()
+        self.consecutivePasses = 0
+
+    def validateWord(self, word):
+        """Raise ValueError if a dictionary is installed without word."""
+        lexicon = dictionary.current()
+        if lexicon is not None and word not in lexicon:
+            raise ValueError('{} is not in the dictionary.'.format(word))
+
+    def skipTurn(self, user):
+        """Advance turn without playing a word."""
+        ps = self.getPlayerState(user)  # confirm it is this user's turn
+        self.lastPlay = None
+        self.consecutivePasses += 1
+        if self.consecutivePasses >= len(self.players):
+            self.mode = MODE_OVER
+        self.incrementTurn()
+
+    def gameOver(self):
+        """Return True if game is complete/over or cancelled."""
+        return self.mode == MODE_OVER or self.mode == MODE_CANCELLED
+
+    def gameComplete(self):
+        """Return True if game is over."""
+        return self.mode == MODE_OVER
+
+    def boardIndex(self, x, y):
+        return self.boardContent.index(x, y)
+
+    def letter(self, x, y):
+        return self.boardContent.letter(x, y)
+
+    def setBoardContent(self, x, y, letter):
+        self.boardContent.setLetter(x, y, letter)
+
+    def leader(self):
+        """Return PlayerState with current high score."""
+        if not self.players:
+            return None
+        leader = self.players[0]
+        for p in self.players:
+            if p.score > leader.score:
+                leader = p
+        return leader
+
+    def scoreForUser(self, user):
+        """Return current score for user."""
+        for p in self.players:
+            if p.player.identity() == user.identity():
+                return p.score
+        raise ValueError('user {} is not a player'.format(user.name))
+
+
+class PlayerRules(object):
+    """Rules of a player's part in a game."""
+
+    @classmethod
+    def create(cls, game, user, turnNumber, bag):
+        """Class factory method to create a player state."""
+        state = cls()       # new instance of class
+        state.game = game
+        state.player = user
+        state.turnNumber = turnNumber
+        state.bag = bag
+        state.score = 0
+        return state
+
+
+class Member(object):
+    """User playing in games outside the datastore."""
+
+    def __init__(self, name, email=None, bot=False):
+        self.name = name
+        self.email = email
+        self.bot = bot
+
+    def identity(self):
+        """Return unique identity for this Member."""
+        return self.name
+
+
+class Player(PlayerRules):
+    """State of a player in a Game."""
+    pass
+
+
+class Game(GameRules):
+    """Game state held only in memory."""
+    playerClass = Player
@@ -0,0 +1,115 @@
+"""hub.py - Publish and wait for the versions of changing things, e.g. games.
+
+A Hub tracks the latest version published for each topic (a game id).
+Requests wait on the hub for a topic to pass the version they have, and
+are woken as soon as it does, instead of polling the datastore.  Waiters
+on the same instance are woken directly, through a Condition.
+
+A Hub may also share versions with other instances through a broker:
+publish sends each version to the broker too, and waiters check the broker
+every pollInterval seconds.  Broker is the interface; LocalBroker is a
+stand-in that shares versions between hubs in one process, and
+MemcacheBroker (in repositories.py) shares them between App Engine
+instances."""
+
+import threading
+import time
+
+from cache import LRUCache
+
+# topics whose latest version each hub remembers
+HUB_TOPICS = 10000
+# seconds between a waiter's checks of the broker
+POLL_INTERVAL = 1.0
+
+
+class Broker(object):
+    """Interface to versions shared by several hubs."""
+
+    def publish(self, topic, version):
+        """record version of topic, unless a later one is recorded; may
+        return a future (e.g. an ndb.Future) to wait on for the result"""
+        raise NotImplementedError()
+
+    def latest(self, topic):
+        """return latest version recorded for topic, or None"""
+        raise NotImplementedError()
+
+
+class LocalBroker(Broker):
+    """Broker holding versions in this process's memory, shared by every
+    hub given it, e.g. to stand in for a real broker in tests."""
+
+    def __init__(self, capacity=HUB_TOPICS):
+        self.lock = threading.Lock()
+        self.versions = LRUCache(capacity)
+
+    def publish(self, topic, version):
+        with self.lock:
+            if version > self.versions.get(topic, 0):
+                self.versions.put(topic, version)
+
+    def latest(self, topic):
+        with self.lock:
+            return self.versions.get(topic)
+
+
+class Hub(object):
+    """Latest version of each topic, with waiting for it to change.
+
+    Safe to share between threads: every method holds the hub's lock,
+    except while waiting on the broker."""
+
+    def __init__(self, broker=None, pollInterval=POLL_INTERVAL,
+                 capacity=HUB_TOPICS):
+        self.broker = broker
+        self.pollInterval = pollInterval
+        self.changed = threading.Condition()
+        self.versions = LRUCache(capacity)
+
+    def publish(self, topic, version):
+        """Record version of topic and wake those waiting for it.
+
+        Return what the broker's publish returns, e.g. a future for
+        sharing the version, or None without a broker."""
+        self.record(topic, version)
+        if self.broker is not None:
+            return self.broker.publish(topic, version)
+        return None
+
+    def record(self, topic, version):
+        with self.changed:
+            if version > self.versions.get(topic, 0):
+                self.versions.put(topic, version)
+                self.changed.notify_all()
+
+    def latest(self, topic):
+        """Return latest version of topic known here, or None."""
+        with self.changed:
+            return self.versions.get(topic)
+
+    def wait(self, topic, version, timeout):
+        """Wait up to timeout seconds for topic to pass version.
+
+        Return the later version as soon as one is published, or None if
+        none is by the timeout."""
+        deadline = time.time() + timeout
+        nextPoll = time.time()
+        while True:
+            now = time.time()
+            if self.broker is not None and now >= nextPoll:
+                shared = self.broker.latest(topic)
+                if shared is not None:
+                    self.record(topic, shared)
+                nextPoll = now + self.pollInterval
+            with self.changed:
+                latest = self.versions.get(topic, 0)
+                if latest > version:
+                    return latest
+                now = time.time()
+                if now >= deadline:
+                    return None
+                wake = deadline
+                if self.broker is not None:
+                    wake = min(wake, nextPoll)
+                self.changed.wait(max(0, wake - now))
@@ -0,0 +1,189 @@
+"""letters.py - Letter tables and the LetterBag shared by the game model
+and its engines."""
+
+import random
+
+# simple set of all letters of the alphabet
+alphabet = "abcdefghijklmnopqrstuvwxyz"
+
+# map from each letter to its position in the alphabet
+letterIndex = dict((l, i) for i, l in enumerate(alphabet))
+
+# simple map from each letter to its scoring value when placed on the board
+letterValue = {'a': 1, 'b': 2, 'c': 2, 'd': 2, 'e': 1, 'f': 3, 'g': 3,
+               'h': 2, 'i': 1, 'j': 5, 'k': 3, 'l': 2, 'm': 1, 'n': 1,
+               'o': 1, 'p': 2, 'q': 5, 'r': 2, 's': 1, 't': 1, 'u': 2,
+               'v': 3, 'w': 3, 'x': 9, 'y': 5, 'z': 5}
+
+
+# a cheap way to compute how many of each letter to put in inital bag
+def duplicates(l):
+    return 10/letterValue[l]
+
+
+class LetterBag():
+    """Store count of letters held.
+
+    Counts are kept in a fixed array indexed by letter, together with a
+    cached total and a Fenwick (binary indexed) tree of prefix sums, so
+    contentCount() is O(1) and locating the ith letter is O(log 26)."""
+
+    def __init__(self):
+        self.counts = [0] * len(alphabet)
+        self.tree = [0] * (len(alphabet) + 1)   # 1-based prefix sum tree
+        self.total = 0
+
+    @classmethod
+    def fromString(cls, s):
+        """Construct a LetterBag from string."""
+        bag = cls()
+        for l in s:
+            bag.counts[letterIndex[l]] += 1
+        bag.rebuild()
+        return bag
+
+    @classmethod
+    def fromCounts(cls, counts):
+        """Construct a LetterBag from a sequence of 26 letter counts."""
+        bag = cls()
+        bag.counts = list(counts)
+        bag.rebuild()
+        return bag
+
+    @classmethod
+    def standardSet(cls):
+        """Construct a LetterBag with WordWars standard initial set."""
+        return cls.fromCounts([duplicates(l) for l in alphabet])
+
+    def rebuild(self):
+        """Recompute cached total and prefix sum tree from counts in O(26)."""
+        size = len(self.counts)
+        tree = [0] + self.counts
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self.tree = tree
+        self.total = sum(self.counts)
+
+    def adjust(self, i, delta):
+        """Change count of letter with index i by delta."""
+        self.counts[i] += delta
+        self.total += delta
+        size = len(self.counts)
+        i += 1
+        while i <= size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def count(self, l):
+        """Return how many of letter l are in this bag."""
+        return self.counts[letterIndex[l]]
+
+    def add(self, l):
+        """Add a letter to this bag."""
+        self.adjust(letterIndex[l], 1)
+
+    def addAll(self, bag):
+        """Add all letters from another bag to this bag."""
+        counts = self.counts
+        for i, c in enumerate(bag.counts):
+            counts[i] += c
+        self.rebuild()
+        return self
+
+    def remove(self, l):
+        """Remove letter l from this bag."""
+        i = letterIndex[l]
+        if self.counts[i] > 0:
+            self.adjust(i, -1)
+        else:
+            raise ValueError('no letter {} to remove'.format(l))
+
+    def removeAll(self, bag):
+        """Remove all letters in another bag from this bag."""
+        counts = self.counts
+        for i, c in enumerate(bag.counts):
+            if c > counts[i]:
+                raise ValueError('no letter {} to remove'.format(alphabet[i]))
+        for i, c in enumerate(bag.counts):
+            counts[i] -= c
+        self.rebuild()
+        return self
+
+    def removeRandom(self, count):
+        """Remove and return 'count' random letters from this bag."""
+        return self.drawK(count)
+
+    def drawK(self, k, rng=random):
+        """Remove and return k letters sampled without replacement.
+
+        Picks k distinct tile positions at once and maps them to letters
+        in a single pass over the alphabet, so the cost is O(k log k + 26)
+        no matter how many letters are drawn.  Draws fewer than k letters
+        if the bag runs out."""
+        drawn = LetterBag()
+        k = min(k, self.total)
+        if k <= 0:
+            return drawn
+        positions = sorted(rng.sample(xrange(self.total), k))
+        taken = drawn.counts
+        counts = self.counts
+        p = 0
+        end = 0      # tile positions before end belong to letters seen
+        for i in range(len(counts)):
+            end += counts[i]
+            while p < k and positions[p] < end:
+                taken[i] += 1
+                p += 1
+            if p == k:
+                break
+        for i, c in enumerate(taken):
+            counts[i] -= c
+        self.rebuild()
+        drawn.rebuild()
+        return drawn
+
+    def removeByIndex(self, i):
+        """Remove the ith letter (alphabetic order) from bag."""
+        l = self.letterAtIndex(i)
+        self.remove(l)
+        return l
+
+    def letterAtIndex(self, i):
+        """Compute ith letter (alphabetic order) in bag."""
+        if i < 0 or i >= self.total:
+            return None
+        tree = self.tree
+        size = len(self.counts)
+        pos = 0
+        step = 1
+        while step * 2 <= size:
+            step *= 2
+        while step:     # descend the tree, skipping whole blocks of letters
+            nextPos = pos + step
+            if nextPos <= size and tree[nextPos] <= i:
+                pos = nextPos
+                i -= tree[nextPos]
+            step //= 2
+        return alphabet[pos]
+
+    def contentCount(self):
+        """Return count of all letters in bag."""
+        return self.total
+
+    def asString(self):
+        """Return string representation of bag contents."""
+        return ''.join([l * c for l, c in zip(alphabet, self.counts)])
+
+    def copy(self):
+        """Return copy of this bag."""
+        bag = LetterBag()
+        bag.counts = list(self.counts)
+        bag.tree = list(self.tree)
+        bag.total = self.total
+        return bag
+
+    def __repr__(self):
+        """Return string representation of letter counts."""
+        return dict(zip(alphabet, self.counts)).__repr__()
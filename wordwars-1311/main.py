@@ -4,8 +4,10 @@ cronjobs."""
 
 
 import webapp2
-from google.appengine.api import mail, app_identity
+from google.appengine.api import mail, app_identity, taskqueue
+from google.appengine.ext import ndb
 from repositories import GameStateRepository, NotificationRepository
+from bots import BotScheduler, queueTurns
 
 from models import User, GameState
 
@@ -38,6 +40,59 @@ class TurnNotification(webapp2.RequestHandler):
                     body)
 
 
+class BotTurns(webapp2.RequestHandler):
+    def post(self):
+        """Play the turns of bot players in the game given by 'gameid'.
+        Queued by the API whenever a bot is next to play, so the move
+        search runs off the request path.  Queues another task for the
+        turns left over if there are too many for one.  See bots.py."""
+        gameid = self.request.get('gameid')
+        if BotScheduler().playBotTurns(gameid):
+            queueTurns(gameid)
+
+
+class BotTurnSweep(webapp2.RequestHandler):
+    def get(self):
+        """Queue bot turns for any active game waiting on a bot, in case a
+        queued task was lost.  Called every few minutes by a cron job."""
+        games = GameStateRepository()
+        scheduler = BotScheduler(games)
+        for game in games.allActive():
+            if scheduler.botUp(game):
+                queueTurns(games.id(game))
+
+
+class MigrateGames(webapp2.RequestHandler):
+    def post(self):
+        """Migrate a batch of games stored another way to the configured
+        storage layout, then queue the next batch.  Start it
+        once by posting to /tasks/migrate_games after changing layout."""
+        cursor = self.request.get('cursor')
+        migrated, cursor, more = GameStateRepository().migrateBatch(
+            ndb.Cursor(urlsafe=cursor) if cursor else None)
+        if more:
+            taskqueue.add(url='/tasks/migrate_games',
+                          params={'cursor': cursor.urlsafe()})
+
+
+class BackfillRankings(webapp2.RequestHandler):
+    def post(self):
+        """Count a batch of completed games not yet counted in their
+        players' UserStats, then queue the next batch.  Start it once by
+        posting to /tasks/backfill_rankings; games already counted are
+        skipped, so it is safe to run again."""
+        cursor = self.request.get('cursor')
+        tallied, cursor, more = GameStateRepository().tallyBatch(
+            ndb.Cursor(urlsafe=cursor) if cursor else None)
+        if more:
+            taskqueue.add(url='/tasks/backfill_rankings',
+                          params={'cursor': cursor.urlsafe()})
+
+
 app = webapp2.WSGIApplication([
     ('/crons/turn_notification', TurnNotification),
+    ('/crons/bot_turns', BotTurnSweep),
+    ('/tasks/bot_turns', BotTurns),
+    ('/tasks/migrate_games', MigrateGames),
+    ('/tasks/backfill_rankings', BackfillRankings),
 ], debug=True)
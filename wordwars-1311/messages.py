@@ -13,6 +13,24 @@ class StringMessage(messages.Message):
 class StringList(messages.Message):
     """Outbound list of string messages."""
     strings = messages.StringField(1, repeated=True)
+    next_cursor = messages.StringField(2)  # set if there are more to list
+
+
+class CellRecord(messages.Message):
+    """Outbound letter at x,y on the board ('_' if empty)."""
+    x = messages.IntegerField(1, required=True)
+    y = messages.IntegerField(2, required=True)
+    letter = messages.StringField(3, required=True)
+
+
+class CompactBoard(messages.Message):
+    """Outbound board of any size as its letters only: letters[i] is at
+    offset positions[i], that is x = position % width and
+    y = position // width."""
+    width = messages.IntegerField(1, required=True)
+    height = messages.IntegerField(2, required=True)
+    positions = messages.IntegerField(3, repeated=True)
+    letters = messages.StringField(4)
 
 
 class GameForm(messages.Message):
@@ -35,6 +53,64 @@ class GameForm(messages.Message):
     y9 = messages.StringField(16, required=True)
 
 
+class CompactGameForm(messages.Message):
+    """Outbound description of game state, for a board of any size."""
+    gameid = messages.StringField(1, required=True)
+    version = messages.IntegerField(2, required=True)
+    etag = messages.StringField(3, required=True)
+    status = messages.StringField(4, required=True)
+    user_turn = messages.StringField(5, required=True)
+    user_letters = messages.StringField(6, required=True)
+    user_score = messages.IntegerField(7, required=True)
+    compact_board = messages.MessageField(CompactBoard, 8, required=True)
+
+
+class PlayerRecord(messages.Message):
+    """Outbound letters and score of a player in a game."""
+    user_name = messages.StringField(1, required=True)
+    user_letters = messages.StringField(2, required=True)
+    user_score = messages.IntegerField(3, required=True)
+
+
+class GameChangeForm(messages.Message):
+    """Outbound changes to a game since the client's version.
+
+    A not_modified form has only gameid, version and etag.  Otherwise
+    cells are the cells changed since since_version and players the
+    players whose letters or score changed or, if those are not known,
+    board is the whole board and players are all of them."""
+    gameid = messages.StringField(1, required=True)
+    version = messages.IntegerField(2, required=True)
+    etag = messages.StringField(3, required=True)
+    not_modified = messages.BooleanField(4)
+    since_version = messages.IntegerField(5)
+    status = messages.StringField(6)
+    user_turn = messages.StringField(7)
+    user_letters = messages.StringField(8)
+    user_score = messages.IntegerField(9)
+    cells = messages.MessageField(CellRecord, 10, repeated=True)
+    board = messages.StringField(11)
+    players = messages.MessageField(PlayerRecord, 12, repeated=True)
+
+
+class GameSummary(messages.Message):
+    """Outbound summary of a game, for a player's list of games."""
+    gameid = messages.StringField(1, required=True)
+    status = messages.StringField(2, required=True)
+    user_turn = messages.StringField(3)    # None if no one is up
+    version = messages.IntegerField(4)
+    last_update = DateTimeField(5)
+    # the requesting user's score and letters, if a player
+    user_score = messages.IntegerField(6)
+    user_letters = messages.StringField(7)
+
+
+class GameSummaryList(messages.Message):
+    """Outbound list of GameSummary."""
+    games = messages.MessageField(GameSummary, 1, repeated=True)
+    next_cursor = messages.StringField(2)  # set if there are more to list
+
+
 class MakeMoveForm(messages.Message):
     """Input to request a word be added at x,y, across/down, by user."""
     user_name = messages.StringField(1, required=True)
@@ -55,11 +131,23 @@ class WinLossRecord(messages.Message):
     name = messages.StringField(1, required=True)
     wins = messages.IntegerField(2, required=True)
     losses = messages.IntegerField(3, required=True)
+    played = messages.IntegerField(4)
+    total_score = messages.IntegerField(5)
 
 
 class RankingList(messages.Message):
     """Outbound list of WinLossRecord."""
     rankings = messages.MessageField(WinLossRecord, 1, repeated=True)
+    next_cursor = messages.StringField(2)  # set if there are more to list
+
+
+class WordScoreRecord(messages.Message):
+    """Outbound record of one word formed by a move and its score."""
+    word = messages.StringField(1, required=True)
+    score = messages.IntegerField(2, required=True)
+    x = messages.IntegerField(3, required=True)
+    y = messages.IntegerField(4, required=True)
+    across = messages.BooleanField(5, required=True)
 
 
 class MoveRecord(messages.Message):
@@ -71,8 +159,26 @@ class MoveRecord(messages.Message):
     word = messages.StringField(5, required=True)  # empty if skipped turn
     moveScore = messages.IntegerField(6, required=True)
     time = DateTimeField(7, required=True)
+    words = messages.MessageField(WordScoreRecord, 8, repeated=True)
+    version = messages.IntegerField(9)  # of the game saved with the move
 
 
 class MoveList(messages.Message):
     """Outbound list of WinLossRecord."""
     moves = messages.MessageField(MoveRecord, 1, repeated=True)
+    next_cursor = messages.StringField(2)  # set if there are more to list
+
+
+class MoveSuggestion(messages.Message):
+    """Outbound suggestion of a legal word to play and its score."""
+    word = messages.StringField(1, required=True)
+    x = messages.IntegerField(2, required=True)
+    y = messages.IntegerField(3, required=True)
+    across = messages.BooleanField(4, required=True)
+    score = messages.IntegerField(5, required=True)
+
+
+class SuggestionList(messages.Message):
+    """Outbound list of MoveSuggestion, best first."""
+    suggestions = messages.MessageField(MoveSuggestion, 1, repeated=True)
+    complete = messages.BooleanField(2, required=True)
@@ -17,8 +17,12 @@
 # sys.path.insert(1, '/usr/local/google_appengine/lib/yaml/lib')
 
 from google.appengine.ext import ndb
-from random import randint
 from utils import get_by_urlsafe
+from letters import (
+    alphabet, letterIndex, letterValue, duplicates, LetterBag)
+from game import (
+    GameRules, PlayerRules,
+    MODE_NEW, MODE_PLAYING, MODE_CANCELLED, MODE_OVER)
 import datetime
 
 
@@ -27,243 +31,98 @@ class User(ndb.Model):
     # User may be a player in many games: one PlayerState for each GameState
     name = ndb.StringProperty(required=True)
     email = ndb.StringProperty()
+    bot = ndb.BooleanProperty(default=False)  # computer plays its turns
 
     @classmethod
-    def create(cls, name, email):
+    def create(cls, name, email, bot=False):
         """Class factory method to create a User."""
         user = cls()
         user.name = name
         user.email = email
+        user.bot = bot
         return user
 
     def identity(self):
         """Return unique identity for this User."""
         return self.email
 
-# a few declarations to support GameState logic
+# declarations to support GameState logic are in letters.py and game.py
 
-# simple set of all letters of the alphabet
-alphabet = "abcdefghijklmnopqrstuvwxyz"
 
-# simple map from each letter to its scoring value when placed on the board
-letterValue = {'a': 1, 'b': 2, 'c': 2, 'd': 2, 'e': 1, 'f': 3, 'g': 3,
-               'h': 2, 'i': 1, 'j': 5, 'k': 3, 'l': 2, 'm': 1, 'n': 1,
-               'o': 1, 'p': 2, 'q': 5, 'r': 2, 's': 1, 't': 1, 'u': 2,
-               'v': 3, 'w': 3, 'x': 9, 'y': 5, 'z': 5}
-
-
-# a cheap way to compute how many of each letter to put in inital bag
-def duplicates(l):
-    return 10/letterValue[l]
-
-# Game state constant strings
-MODE_NEW = 'new'
-MODE_PLAYING = 'playing'
-MODE_CANCELLED = 'cancelled'
-MODE_OVER = 'over'
-
-
-class GameState(ndb.Model):
+class GameState(ndb.Model, GameRules):
     """Model of wordwars game state."""
     # a GameState is referenced by PlayerState for each player
-    letters = ndb.StringProperty(required=True)
+    # bag and board of games saved before the packed encoding, or in the
+    # PlayerState layout (see GameStateRepository in repositories.py)
+    letters = ndb.TextProperty()
     width = ndb.IntegerProperty(required=True)
     height = ndb.IntegerProperty(required=True)
-    board = ndb.StringProperty(required=True)
+    board = ndb.TextProperty()
     consecutivePasses = ndb.IntegerProperty(required=True)
     createdTime = ndb.DateTimeProperty(auto_now_add=True)
     turn = ndb.IntegerProperty(required=True)
     mode = ndb.StringProperty(required=True)
     lastUpdate = ndb.DateTimeProperty(auto_now=True)
+    # bag, board and players encoded by codec.py, None if not packed
+    packed = ndb.BlobProperty()
+    # players of games packed before codec.py, as a list of dicts
+    playerData = ndb.JsonProperty()
+    # users playing this game: index for finding a user's games
+    playerKeys = ndb.KeyProperty(kind='User', repeated=True)
+    # incremented each time the game is saved
+    version = ndb.IntegerProperty(default=0)
+    # True once a completed game is counted in its players' UserStats
+    tallied = ndb.BooleanProperty(default=False)
 
-    @classmethod
-    def create(cls):
-        """Class factory method to create a GameState."""
-        game = cls()    # get new ndb.Model instance
-        game.mode = MODE_NEW
-        game.turn = 0
-        game.bagOfLetters = LetterBag.standardSet()
-        game.width = 10
-        game.height = 10
-        game.boardContent = []
-        for x in range(game.width):
-            for y in range(game.height):
-                game.boardContent.append('_')    # init board with underscores
-        game.players = []
-        game.consecutivePasses = 0
-        return game
-
-    def addPlayer(self, user):
-        """Add user as a player in this game."""
-        if self.started():
-            raise ValueError('Cannot add player to game in progress.')
-        # okay to add players until started with first turn
-        playerSequence = len(self.players)   # zero for first player
-        # initialize each player with 7 letters from game bag
-        lettersForPlayer = self.bagOfLetters.removeRandom(7)
-        pState = PlayerState.create(
-            self, user, playerSequence, lettersForPlayer)
-        self.players.append(pState)
-
-    def start(self):
-        """Start the game.  No more players may be added."""
-        self.turn = 0
-        self.mode = MODE_PLAYING
-        return self.nextPlayer()
-
-    def cancel(self):
-        """Cancel the game.  There is no winner."""
-        self.mode = MODE_CANCELLED
-
-    def started(self):
-        """Return True if game has started."""
-        return self.mode != MODE_NEW
-
-    def cancelled(self):
-        """Return True if game has been cancelled."""
-        return self.mode == MODE_CANCELLED
-
-    def nextPlayer(self):
-        """Return PlayerState for player with next turn."""
-        if self.mode != MODE_PLAYING:
-            return None
-        for p in self.players:
-            if p.turnNumber == self.turn:
-                return p
-        return None
-
-    def directionString(self, across):
-        """Translate boolean direction to 'across' or 'down'."""
-        if across:
-            return 'across'
-        else:
-            return 'down'
-
-    def getPlayerState(self, user):
-        """Return PlayerState for user or None."""
-        for p in self.players:
-            if p.player.identity() == user.identity():
-                return p
-        return None
-
-    def incrementTurn(self):
-        """Advance game state to next turn."""
-        self.turn += 1
-        if self.turn == len(self.players):
-            self.turn = 0
-
-    def playWord(self, user, x, y, across, word):
-        """Play word as instructed by user."""
-        playerState = self.getPlayerState(user)
-        beforeScore = playerState.score  # so we can reset on error
-        beforeLetters = playerState.bag.copy()
-        try:
-            self.addWordToBoard(playerState, x, y, across, word)
-            lettersPlayed = 7 - playerState.bag.contentCount()
-            self.enforceMinimumOneLetter(lettersPlayed, x, y, across, word)
-            playerState.bag.addAll(
-                self.bagOfLetters.removeRandom(lettersPlayed))
-            self.incrementTurn()
-            self.consecutivePasses = 0
-        except Exception, e:
-            # reset state
-            playerState.score = beforeScore
-            playerState.bag = beforeLetters
-            raise e
-
-    def enforceMinimumOneLetter(self, lettersPlayed, x, y, across, word):
-        if lettersPlayed < 1:
-            dir = 'across'
-            if not across:
-                dir = 'down'
-            raise ValueError(
-                'Playing {} {} at {},{} adds no letters to the board.'.format(
-                    word, dir, x, y))
-
-    def addWordToBoard(self, playerState, x, y, across, word):
-        """Implement algorithm for updating board and accumulating score."""
-        nextX = x
-        nextY = y
-        for i in range(len(word)):
-            letter = word[i]
-            if across:
-                nextX = x + i
-            else:
-                nextY = y + i
-            self.addLetterToBoard(playerState, nextX, nextY, letter)
-
-    def addLetterToBoard(self, playerState, x, y, letter):
-        """Implement algorithm for adding single letter to the board."""
-        if self.letter(x, y) == '_':
-            playerState.bag.remove(letter)  # raises error if not there
-            self.setBoardContent(x, y, letter)
-        playerState.score = playerState.score + letterValue[letter]
-
-    def skipTurn(self, user):
-        """Advance turn without playing a word."""
-        ps = self.getPlayerState(user)  # confirm it is this user's turn
-        self.consecutivePasses += 1
-        if self.consecutivePasses >= len(self.players):
-            self.mode = MODE_OVER
-        self.incrementTurn()
-
-    def gameOver(self):
-        """Return True if game is complete/over or cancelled."""
-        return self.mode == MODE_OVER or self.mode == MODE_CANCELLED
-
-    def gameComplete(self):
-        """Return True if game is over."""
-        return self.mode == MODE_OVER
-
-    def boardIndex(self, x, y):
-        i = x + (y * self.width)
-        if i >= len(self.boardContent):
-            raise ValueError(
-                'cannot access board position ({},{})'.format(x, y))
-        return i
-
-    def letter(self, x, y):
-        return self.boardContent[self.boardIndex(x, y)]
-
-    def setBoardContent(self, x, y, letter):
-        self.boardContent[self.boardIndex(x, y)] = letter
-
-    def leader(self):
-        """Return PlayerState with current high score."""
-        if not self.players:
-            return None
-        leader = self.players[0]
-        for p in self.players:
-            if p.score > leader.score:
-                leader = p
-        return leader
-
-    def scoreForUser(self, user):
-        """Return current score for user."""
-        for p in self.players:
-            if p.player.identity() == user.identity():
-                return p.score
-        raise ValueError('user {} is not a player'.format(user.name))
-
-
-class PlayerState(ndb.Model):
+    # games are cached by GameCache (see repositories.py), not by ndb
+    _use_memcache = False
+
+    # game rules and transient values: see GameRules in game.py
+
+
+class PlayerState(ndb.Model, PlayerRules):
     """Part of a gameState that describes player."""
     gameKey = ndb.KeyProperty(required=True, kind='GameState')
     userKey = ndb.KeyProperty(required=True, kind='User')
     turnNumber = ndb.IntegerProperty(required=True)
     letters = ndb.StringProperty(required=True)
     score = ndb.IntegerProperty(required=True)
+    # player rules and transient values: see PlayerRules in game.py
+
+
+# players added to a GameState are persistent too
+GameState.playerClass = PlayerState
+
+
+class UserStats(ndb.Model):
+    """Model of a user's record in completed games, for rankings."""
+    # keyed by the id of the User's key (see UserStatsRepository)
+    userKey = ndb.KeyProperty(required=True, kind='User')
+    name = ndb.StringProperty(required=True)
+    wins = ndb.IntegerProperty(default=0)
+    losses = ndb.IntegerProperty(default=0)
+    played = ndb.IntegerProperty(default=0)
+    totalScore = ndb.IntegerProperty(default=0)
+    # rankings are sorted highest ratio first
+    ratio = ndb.FloatProperty(default=0.0)
 
     @classmethod
-    def create(cls, game, user, turnNumber, bag):
-        """Class factory method to create a PlayerState."""
-        state = cls()       # new instance of class
-        state.game = game
-        state.player = user
-        state.turnNumber = turnNumber
-        state.bag = bag
-        state.score = 0
-        return state
+    def create(cls, key, user):
+        """Class factory method to create UserStats with no games."""
+        stats = cls(key=key)
+        stats.userKey = user.key
+        stats.name = user.name
+        return stats
+
+    def record(self, won, score):
+        """Count a completed game, won or lost, with the score made."""
+        if won:
+            self.wins += 1
+        else:
+            self.losses += 1
+        self.played += 1
+        self.totalScore += score
+        self.ratio = self.wins / (1.0 + self.losses)
 
 
 class Notification(ndb.Model):
@@ -283,97 +142,24 @@ class Notification(ndb.Model):
         return note
 
 
-class LetterBag():
-    """Store count of letters held."""
-
-    def __init__(self):
-        self.map = {}
-        for l in alphabet:
-            self.map[l] = 0
+class WordScore(ndb.Model):
+    """Model of one word formed by a move and the points it scored."""
+    word = ndb.StringProperty(required=True)
+    score = ndb.IntegerProperty(required=True)
+    across = ndb.BooleanProperty(required=True)
+    x = ndb.IntegerProperty(required=True)
+    y = ndb.IntegerProperty(required=True)
 
     @classmethod
-    def fromString(cls, s):
-        """Construct a LetterBag from string."""
-        bag = cls()
-        for l in s:
-            bag.add(l)
-        return bag
-
-    @classmethod
-    def standardSet(cls):
-        """Construct a LetterBag with WordWars standard initial set."""
-        bag = LetterBag()
-        for l in alphabet:
-            for i in range(duplicates(l)):
-                bag.add(l)
-        return bag
-
-    def add(self, l):
-        """Add a letter to this bag."""
-        self.map[l] += 1
-
-    def addAll(self, bag):
-        """Add all letters from another bag to this bag."""
-        for l in alphabet:
-            self.map[l] += bag.map[l]
-        return self
-
-    def remove(self, l):
-        """Remove letter l from this bag."""
-        if self.map[l] > 0:
-            self.map[l] -= 1
-        else:
-            raise ValueError('no letter {} to remove'.format(l))
-
-    def removeRandom(self, count):
-        """Remove and return 'count' random letters from this bag."""
-        removed = LetterBag()
-        selfSize = self.contentCount()
-        for i in range(count):
-            if self.contentCount() <= 0:
-                return removed
-            l = self.removeByIndex(randint(0, selfSize - 1))
-            selfSize -= 1
-            removed.add(l)
-        return removed
-
-    def removeByIndex(self, i):
-        """Remove the ith letter (alphabetic order) from bag."""
-        l = self.letterAtIndex(i)
-        self.remove(l)
-        return l
-
-    def letterAtIndex(self, i):
-        """Compute ith letter (alphabetic order) in bag."""
-        lettersToGo = i
-        for l in alphabet:
-            if self.map[l] > lettersToGo:
-                return l   # we are at the index we were looking for
-            else:
-                lettersToGo -= self.map[l]   # skip past this letter
-
-    def contentCount(self):
-        """Return count of all letters in bag."""
-        count = 0
-        for l in alphabet:
-            count += self.map[l]
-        return count
-
-    def asString(self):
-        """Return string representation of bag contents."""
-        letters = ''
-        for l in alphabet:
-            for i in range(self.map[l]):
-                letters += l
-        return letters
-
-    def copy(self):
-        """Return copy of this bag."""
-        return LetterBag().addAll(self)
-
-    def __repr__(self):
-        """Return string representation of my map."""
-        return self.map.__repr__()
+    def create(cls, scored):
+        """Class factory method to create a WordScore from a ScoredWord."""
+        ws = cls()
+        ws.word = scored.word
+        ws.score = scored.score
+        ws.across = scored.across
+        ws.x = scored.x
+        ws.y = scored.y
+        return ws
 
 
 class Move(ndb.Model):
@@ -386,10 +172,23 @@ class Move(ndb.Model):
     across = ndb.BooleanProperty(required=False)
     x = ndb.IntegerProperty(required=False)
     y = ndb.IntegerProperty(required=False)
+    words = ndb.StructuredProperty(WordScore, repeated=True)
+    # version of the game saved with this move, and the board indexes of
+    # the letters it placed: what changed since the version before
+    version = ndb.IntegerProperty()
+    placed = ndb.IntegerProperty(repeated=True, indexed=False)
+    # letters put on those indexes, in order, and the letters the player
+    # then drew from the bag: enough to replay the move (see
+    # GameStateRepository.positionAt in repositories.py)
+    letters = ndb.StringProperty(indexed=False)
+    drawn = ndb.StringProperty(indexed=False)
 
     @classmethod
-    def create(cls, game, user, word, across, x, y, score):
-        """Class factory method to create a User."""
+    def create(cls, game, user, word, across, x, y, score, scored=()):
+        """Class factory method to create a Move, just played in game and
+        not yet saved with it.
+
+        scored is the list of ScoredWord the move formed, if any."""
         move = cls()
         move.game = game  # set gameKey from this game
         move.user = user  # set userKey from this user
@@ -398,5 +197,39 @@ class Move(ndb.Model):
         move.x = x
         move.y = y
         move.moveScore = score
+        move.words = [WordScore.create(s) for s in scored]
         move.time = datetime.datetime.now()
+        move.version = (game.version or 0) + 1
+        move.placed = []
+        move.letters = move.drawn = ''
+        if word and game.lastPlay is not None:
+            move.placed = [game.boardIndex(x, y)
+                           for x, y in game.lastPlay.squares]
+            move.letters = ''.join(game.lastPlay.letters)
+            if game.lastPlay.drawn is not None:
+                move.drawn = game.lastPlay.drawn.asString()
         return move
+
+
+class Checkpoint(ndb.Model):
+    """Model of a game as saved at one version, to replay its later moves
+    from."""
+    # child of the GameState, keyed by version (see GameStateRepository)
+    version = ndb.IntegerProperty(required=True)
+    # bag, board and players encoded by codec.py
+    state = ndb.BlobProperty(required=True)
+    turn = ndb.IntegerProperty(required=True, indexed=False)
+    consecutivePasses = ndb.IntegerProperty(required=True, indexed=False)
+    mode = ndb.StringProperty(required=True, indexed=False)
+
+    @classmethod
+    def create(cls, game, state):
+        """Class factory method to create a Checkpoint of game, saved at
+        its current version; state is its codec.py encoding."""
+        checkpoint = cls(key=ndb.Key(cls, game.version, parent=game.key))
+        checkpoint.version = game.version
+        checkpoint.state = state
+        checkpoint.turn = game.turn
+        checkpoint.consecutivePasses = game.consecutivePasses
+        checkpoint.mode = game.mode
+        return checkpoint
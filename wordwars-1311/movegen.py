@@ -0,0 +1,294 @@
+"""movegen.py - Generate legal plays for a rack of letters on a board.
+
+Uses the Appel-Jacobson anchor search over the compiled dictionary (see
+dictionary.py).  Every play must cover an anchor: an empty square next to
+a letter already on the board (or the centre square of an empty board).
+For each anchor, the search builds a left part from the rack in the empty
+squares before the anchor, then extends right through the anchor, walking
+the dictionary graph as it goes so only real word prefixes are explored.
+Letters placed beside other letters must also pass a cross-check: the
+perpendicular word they form has to be in the dictionary.
+
+Search stops early when its node or time budget is spent, returning the
+best plays found so far.
+
+searchMoves and suggestMoves remember the best plays of recent searches in
+a transposition cache keyed by the Zobrist hash of board and rack (see
+zobrist.py), so asking again about an unchanged position costs only a
+hash lookup."""
+
+import heapq
+import time
+
+from board import EMPTY, bits, runAround
+from cache import LRUCache
+from letters import letterIndex
+import scoring
+import zobrist
+
+# default limits for a single search, sized for live hint requests
+NODE_BUDGET = 200000
+TIME_BUDGET = 0.08      # seconds
+# positions remembered by the transposition cache, and plays kept for each
+TRANSPOSITION_SIZE = 1000
+CACHED_MOVES = 50
+
+# this process's transposition cache: position key ->
+# (plays, complete, found, nodeBudget, timeBudget)
+transpositions = LRUCache(TRANSPOSITION_SIZE)
+
+
+class Suggestion(object):
+    """A legal play: word at (x, y) across or down, and its score."""
+
+    def __init__(self, word, x, y, across, score, scored):
+        self.word = word
+        self.x = x
+        self.y = y
+        self.across = across
+        self.score = score
+        self.scored = scored    # list of scoring.ScoredWord
+
+    def __repr__(self):
+        return '{}@({},{},{})={}'.format(
+            self.word, self.x, self.y,
+            'across' if self.across else 'down', self.score)
+
+
+class BudgetSpent(Exception):
+    """Raised inside the search when its node or time budget is used up."""
+    pass
+
+
+class MoveGenerator(object):
+    """Search for plays of rack on board, words taken from dictionary."""
+
+    def __init__(self, dictionary, board, rack,
+                 nodeBudget=NODE_BUDGET, timeBudget=TIME_BUDGET):
+        """rack is a LetterBag; it is not changed by the search."""
+        self.dictionary = dictionary
+        self.board = board
+        self.rack = list(rack.counts)
+        self.nodeBudget = nodeBudget
+        self.deadline = None
+        if timeBudget is not None:
+            self.deadline = time.time() + timeBudget
+        self.nodes = 0
+        self.edges = {}         # node -> dictionary.children(node), memoized
+        self.complete = True    # False if the budget cut the search short
+        self.found = {}         # (word, x, y, across) -> Suggestion
+
+    def generate(self):
+        """Return list of every Suggestion found, in no particular order."""
+        try:
+            for across in (True, False):
+                for line in range(self.board.lineCount(across)):
+                    self.searchLine(across, line)
+        except BudgetSpent:
+            self.complete = False
+        return self.found.values()
+
+    def best(self, limit):
+        """Return up to limit highest scoring suggestions, best first."""
+        return heapq.nlargest(
+            limit, self.generate(), key=lambda s: (s.score, len(s.word)))
+
+    # the board seen as lines: position pos along line number line
+
+    def lineString(self, across, line):
+        if across:
+            return self.board.row(line).asString()
+        return self.board.column(line).asString()
+
+    def children(self, node):
+        edges = self.edges.get(node)
+        if edges is None:
+            edges = self.edges[node] = self.dictionary.children(node)
+        return edges
+
+    def square(self, across, line, pos):
+        """Return (x, y) for position pos along line."""
+        if across:
+            return (pos, line)
+        return (line, pos)
+
+    def searchLine(self, across, line):
+        length = self.board.lineLength(across)
+        anchors = self.anchors(across, line)
+        self.crossChecks = {}
+        self.across = across
+        self.line = line
+        self.length = length
+        self.cells = cells = self.lineString(across, line)
+        root = self.dictionary.root
+        previousAnchor = -1
+        for anchor in anchors:
+            self.anchor = anchor
+            if anchor > 0 and cells[anchor - 1] != EMPTY:
+                # left part is fixed: the letters already before the anchor
+                start = anchor - 1
+                while start > 0 and cells[start - 1] != EMPTY:
+                    start -= 1
+                node = root
+                partial = ''
+                for pos in range(start, anchor):
+                    letter = cells[pos]
+                    node = self.dictionary.follow(node, letter)
+                    if node < 0:
+                        break
+                    partial += letter
+                if node >= 0:
+                    self.extendRight(partial, node, anchor)
+            else:
+                limit = anchor - previousAnchor - 1
+                self.leftPart('', root, limit)
+            previousAnchor = anchor
+
+    def anchors(self, across, line):
+        """Return positions along line that a play must cover one of."""
+        board = self.board
+        if board.isBlank():
+            x, y = board.width // 2, board.height // 2
+            if across and line == y:
+                return [x]
+            if not across and line == x:
+                return [y]
+            return []
+        return list(bits(board.anchors(across, line)))
+
+    def leftPart(self, partial, node, limit):
+        self.extendRight(partial, node, self.anchor)
+        if limit <= 0:
+            return
+        rack = self.rack
+        for letter, child in self.children(node):
+            i = letterIndex[letter]
+            if rack[i] > 0:
+                self.tick()
+                rack[i] -= 1
+                self.leftPart(partial + letter, child, limit - 1)
+                rack[i] += 1
+
+    def extendRight(self, partial, node, pos):
+        if pos >= self.length or self.cells[pos] == EMPTY:
+            if pos > self.anchor and self.dictionary.isWord(node):
+                self.record(partial, pos)
+            if pos >= self.length:
+                return
+            allowed = self.crossCheck(pos)
+            rack = self.rack
+            for letter, child in self.children(node):
+                i = letterIndex[letter]
+                if rack[i] > 0 and (allowed is None or letter in allowed):
+                    self.tick()
+                    rack[i] -= 1
+                    self.extendRight(partial + letter, child, pos + 1)
+                    rack[i] += 1
+        else:
+            letter = self.cells[pos]
+            child = self.dictionary.follow(node, letter)
+            if child >= 0:
+                self.tick()
+                self.extendRight(partial + letter, child, pos + 1)
+
+    def crossCheck(self, pos):
+        """Return set of letters allowed at pos, or None if any letter is.
+
+        A letter is allowed if the word it forms with the letters before
+        and after it, perpendicular to the line, is in the dictionary."""
+        if pos in self.crossChecks:
+            return self.crossChecks[pos]
+        across, line = self.across, self.line
+        start, end = runAround(self.board.crossMask(across, line, pos), line)
+        if end - start == 1:
+            allowed = None
+        else:
+            cross = self.lineString(not across, pos)
+            prefix, suffix = cross[start:line], cross[line + 1:end]
+            allowed = set()
+            d = self.dictionary
+            node = d.root
+            for letter in prefix:
+                node = d.follow(node, letter)
+                if node < 0:
+                    break
+            if node >= 0:
+                for letter, child in self.children(node):
+                    for s in suffix:
+                        child = d.follow(child, s)
+                        if child < 0:
+                            break
+                    if child >= 0 and d.isWord(child):
+                        allowed.add(letter)
+        self.crossChecks[pos] = allowed
+        return allowed
+
+    def record(self, word, end):
+        start = end - len(word)
+        across, line = self.across, self.line
+        placed = {}
+        for i in range(len(word)):
+            if self.cells[start + i] == EMPTY:
+                placed[self.square(across, line, start + i)] = word[i]
+        if not placed:
+            return
+        x, y = self.square(across, line, start)
+        scored = scoring.scorePlacement(self.board, placed, across)
+        self.found[(word, x, y, across)] = Suggestion(
+            word, x, y, across, scoring.total(scored), scored)
+
+    def tick(self):
+        self.nodes += 1
+        if self.nodeBudget is not None and self.nodes > self.nodeBudget:
+            raise BudgetSpent()
+        if (self.deadline is not None and self.nodes & 255 == 0 and
+                time.time() > self.deadline):
+            raise BudgetSpent()
+
+
+def positionKey(dictionary, board, rack):
+    """Return transposition cache key for searching rack on board."""
+    return (id(dictionary), board.width, board.height,
+            zobrist.positionHash(board, rack))
+
+
+def searchMoves(dictionary, board, rack, limit=10,
+                nodeBudget=NODE_BUDGET, timeBudget=TIME_BUDGET,
+                cache=transpositions):
+    """Return (suggestions, complete) for rack on board.
+
+    suggestions are up to limit best Suggestions, best first; complete is
+    False if the budget cut the search short.  A position found in cache
+    is answered from it if its search was complete, or was cut short by
+    budgets at least as large as these; otherwise it is searched again.
+    Pass cache=None to always search."""
+    key = None
+    if cache is not None:
+        key = positionKey(dictionary, board, rack)
+        entry = cache.get(key)
+        if entry is not None:
+            moves, complete, found, nodesSpent, timeSpent = entry
+            if len(moves) >= min(limit, found) and (complete or (
+                    covers(nodesSpent, nodeBudget) and
+                    covers(timeSpent, timeBudget))):
+                return moves[:limit], complete
+    generator = MoveGenerator(dictionary, board, rack, nodeBudget, timeBudget)
+    moves = generator.best(max(limit, CACHED_MOVES))
+    if key is not None:
+        cache.put(key, (moves, generator.complete, len(generator.found),
+                        nodeBudget, timeBudget))
+    return moves[:limit], generator.complete
+
+
+def covers(spent, budget):
+    """Return True if a search with budget spent (None for unlimited)
+    had at least as much to spend as budget."""
+    return spent is None or (budget is not None and spent >= budget)
+
+
+def suggestMoves(dictionary, board, rack, limit=10,
+                 nodeBudget=NODE_BUDGET, timeBudget=TIME_BUDGET,
+                 cache=transpositions):
+    """Return up to limit best Suggestions for rack on board."""
+    return searchMoves(dictionary, board, rack, limit,
+                       nodeBudget, timeBudget, cache)[0]
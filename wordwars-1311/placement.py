@@ -0,0 +1,123 @@
+"""placement.py - Validate a play up front and apply it with an undo journal.
+
+A Placement checks everything about a play before anything changes: the
+word fits on the board without running off an edge, letters already on
+the board match the word, the player holds every new letter, at least one
+letter is new, and the word touches a letter already on the board (any
+position is fine for the first word).  A MoveJournal then applies the play
+and records only what it changed, so an error part way through can be
+rolled back exactly without copying the board or bags beforehand."""
+
+from board import EMPTY
+from letters import alphabet, letterIndex
+
+
+class Placement(object):
+    """Word to be played at (x, y), across or down."""
+
+    def __init__(self, board, x, y, across, word):
+        self.board = board
+        self.x = x
+        self.y = y
+        self.across = across
+        self.word = word
+        self.placed = {}    # (x, y) -> letter, for each new letter
+
+    def describe(self):
+        return '{} {} at {},{}'.format(
+            self.word, 'across' if self.across else 'down', self.x, self.y)
+
+    def squares(self):
+        """Return list of (x, y) covered by the word."""
+        if self.across:
+            return [(self.x + i, self.y) for i in range(len(self.word))]
+        return [(self.x, self.y + i) for i in range(len(self.word))]
+
+    def validate(self, rack):
+        """Raise ValueError unless this play is legal for rack (a LetterBag).
+
+        Sets self.placed to the new letters the play puts on the board."""
+        board = self.board
+        if self.x is None or self.y is None or not self.word:
+            raise ValueError('A play needs a word and a position.')
+        if not board.fits(self.x, self.y, self.across, len(self.word)):
+            raise ValueError(
+                'Playing {} does not fit on the {}x{} board.'.format(
+                    self.describe(), board.width, board.height))
+        placed = {}
+        needed = [0] * len(rack.counts)
+        for (x, y), letter in zip(self.squares(), self.word):
+            onBoard = board.letter(x, y)
+            if onBoard == EMPTY:
+                if letter not in letterIndex:
+                    raise ValueError('{} is not a letter.'.format(letter))
+                placed[(x, y)] = letter
+                needed[letterIndex[letter]] += 1
+            elif onBoard != letter:
+                raise ValueError(
+                    'Playing {} conflicts with {} at {},{}.'.format(
+                        self.describe(), onBoard, x, y))
+        if not placed:
+            raise ValueError(
+                'Playing {} adds no letters to the board.'.format(
+                    self.describe()))
+        for i, count in enumerate(needed):
+            if count > rack.counts[i]:
+                raise ValueError(
+                    'Playing {} needs more {} than the bag holds.'.format(
+                        self.describe(), alphabet[i]))
+        if not board.isBlank() and not board.touches(
+                self.x, self.y, self.across, len(self.word)):
+            raise ValueError(
+                'Playing {} does not connect to the board.'.format(
+                    self.describe()))
+        self.placed = placed
+        return self
+
+
+class MoveJournal(object):
+    """Apply a play to a game and player, recording how to undo it."""
+
+    def __init__(self, game, playerState):
+        self.game = game
+        self.playerState = playerState
+        self.turn = game.turn
+        self.consecutivePasses = game.consecutivePasses
+        self.squares = []       # squares filled on the board
+        self.letters = []       # letters taken from the player's bag
+        self.score = 0          # points added to the player's score
+        self.drawn = None       # LetterBag drawn from the game's bag
+
+    def place(self, placed):
+        """Move each new letter from the player's bag onto the board."""
+        board = self.game.boardContent
+        bag = self.playerState.bag
+        for (x, y), letter in sorted(placed.items()):
+            bag.remove(letter)
+            self.letters.append(letter)
+            board.setLetter(x, y, letter)
+            self.squares.append((x, y))
+
+    def addScore(self, points):
+        self.playerState.score += points
+        self.score += points
+
+    def refill(self, count):
+        """Draw up to count letters from the game's bag into the player's."""
+        self.drawn = self.game.bagOfLetters.drawK(count, self.game.rng)
+        self.playerState.bag.addAll(self.drawn)
+
+    def rollback(self):
+        """Undo everything recorded, restoring game and player exactly."""
+        game = self.game
+        bag = self.playerState.bag
+        if self.drawn is not None:
+            bag.removeAll(self.drawn)
+            game.bagOfLetters.addAll(self.drawn)
+        for x, y in self.squares:
+            game.boardContent.setLetter(x, y, EMPTY)
+        for letter in self.letters:
+            bag.add(letter)
+        self.playerState.score -= self.score
+        game.turn = self.turn
+        game.consecutivePasses = self.consecutivePasses
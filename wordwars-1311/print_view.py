@@ -7,11 +7,8 @@ class PrintView(object):
     def showGameState(self, gameState):
         """Print game state to console."""
         print("Board:")
-        boardString = ''.join(gameState.boardContent)
         for y in range(gameState.height):
-            start = y * gameState.width
-            end = start + gameState.width
-            print(boardString[start:end])
+            print(gameState.boardContent.row(y).asString())
         for p in gameState.players:
             print("Player {} has score {} and letters '{}'".format(p.player.name, p.score, p.bag.asString()))
         if gameState.gameOver():
@@ -16,8 +16,230 @@ For an ndb.Model m and EntityRepository MRepository, clients must:
 
 from google.appengine.ext import ndb
 from utils import get_by_urlsafe
-from models import User, GameState, PlayerState, LetterBag, Move, Notification
+from models import (
+    User, GameState, PlayerState, LetterBag, Move, Notification, UserStats,
+    Checkpoint)
+from game import MODE_NEW, MODE_PLAYING, MODE_OVER
+from board import Board
+from cache import LRUCache
+import codec
+from hub import Hub, Broker
+from storage import (
+    Store, ConcurrentUpdate, MUTATE_ATTEMPTS, MUTATE_BACKOFF)
 import datetime
+import random
+
+# storage layouts of GameState and its players: see GameStateRepository
+LAYOUT_AGGREGATE = 'aggregate'
+LAYOUT_ENTITIES = 'entities'
+# layout games are saved in
+STORAGE_LAYOUT = LAYOUT_AGGREGATE
+# games examined by each GameStateRepository.migrateBatch
+MIGRATION_BATCH = 50
+# hydrated games kept by each instance, and seconds games stay in memcache
+LOCAL_GAMES = 200
+MEMCACHE_SECONDS = 3600
+MEMCACHE_PREFIX = 'game:'
+# attempts to replace a game's memcache entry before dropping it
+MEMCACHE_ATTEMPTS = 3
+# entities fetched by each page of a list query
+PAGE_SIZE = 100
+# memcache key prefix of game versions shared by MemcacheBroker
+VERSION_PREFIX = 'version:'
+# versions between each Checkpoint of a game in play
+CHECKPOINT_INTERVAL = 20
+# prefix of cursors into the games listed by PlayerState (idsPageForUser)
+LEGACY_CURSOR = 'legacy:'
+
+
+def pages(query, size=PAGE_SIZE):
+    """yield lists of query's results, size at a time, each page fetched
+    from the cursor where the last one ended"""
+    cursor, more = None, True
+    while more:
+        results, cursor, more = query.fetch_page(size, start_cursor=cursor)
+        yield results
+
+
+def resolveKeys(keys, known=()):
+    """Return dict mapping each of keys to its entity.
+
+    Entities in known are used as they are; all other keys are fetched
+    with a single ndb.get_multi call."""
+    loaded = dict((entity.key, entity) for entity in known)
+    missing = list(set(key for key in keys if key not in loaded))
+    if missing:
+        loaded.update(zip(missing, ndb.get_multi(missing)))
+    return loaded
+
+
+class UnitOfWork(object):
+    """Save the entities that changed, together.
+
+    Repositories keep a snapshot of each entity's persistent fields as
+    loaded or last saved (entity.savedState).  add() queues an entity only
+    if it is new or its fields differ from that snapshot, and commit()
+    saves all queued entities with a single ndb.put_multi, together with
+    any keys queued by delete()."""
+
+    def __init__(self):
+        self.pending = []   # (entity, snapshot) to save
+        self.deleted = []   # keys of entities to delete
+
+    def add(self, entity, snapshot):
+        """queue entity to be saved if it is new or has changed"""
+        if entity.key is None or getattr(
+                entity, 'savedState', None) != snapshot:
+            self.pending.append((entity, snapshot))
+
+    def put(self, entity):
+        """queue entity to be saved, e.g. a new one with a chosen key"""
+        self.pending.append((entity, None))
+
+    def delete(self, keys):
+        """queue entities with these keys to be deleted"""
+        self.deleted.extend(keys)
+
+    def commit(self):
+        """save queued entities; return list of entities saved"""
+        return self.commitAsync().get_result()
+
+    @ndb.tasklet
+    def commitAsync(self):
+        """issue queued puts and deletes at once; future for commit()"""
+        entities = [entity for entity, snapshot in self.pending]
+        rpcs = []
+        if entities:
+            rpcs.extend(ndb.put_multi_async(entities))
+        if self.deleted:
+            rpcs.extend(ndb.delete_multi_async(self.deleted))
+        if rpcs:
+            yield rpcs
+        for entity, snapshot in self.pending:
+            entity.savedState = snapshot
+        self.pending = []
+        self.deleted = []
+        raise ndb.Return(entities)
+
+
+class GameCache(object):
+    """Two tier write-through cache of games stored as one entity.
+
+    Memcache holds (version, fields) for each game id: the game's persistent
+    fields as saved at that version.  Each instance also keeps an LRU of
+    hydrated games keyed by (id, version), so a game whose version matches
+    memcache's is used without decoding its board and bags again.  An entry
+    in memcache is only replaced by a higher version, so a slow writer
+    cannot overwrite a newer game with an older one.  Games returned are
+    copies callers may change freely."""
+
+    def __init__(self, capacity=LOCAL_GAMES):
+        self.local = LRUCache(capacity)
+        self.memcacheHits = 0
+        self.misses = 0
+
+    @ndb.tasklet
+    def getAsync(self, id, repository):
+        """return future for cached game with id, or None"""
+        entry = yield ndb.get_context().memcache_get(MEMCACHE_PREFIX + id)
+        if entry is None:
+            self.misses += 1
+            raise ndb.Return(None)
+        version, fields = entry
+        game = self.local.get((id, version))
+        if game is None:
+            self.memcacheHits += 1
+            game = self.unpack(id, fields, repository)
+            self.local.put((id, version), game)
+        raise ndb.Return(self.copy(game, repository))
+
+    @ndb.tasklet
+    def versionAsync(self, id):
+        """return future for version of cached game with id, or None,
+        without decoding the game"""
+        entry = yield ndb.get_context().memcache_get(MEMCACHE_PREFIX + id)
+        raise ndb.Return(None if entry is None else entry[0])
+
+    @ndb.tasklet
+    def putAsync(self, id, game, repository):
+        """return future for caching game, just saved, in both tiers"""
+        self.local.put((id, game.version), self.copy(game, repository))
+        key = MEMCACHE_PREFIX + id
+        entry = (game.version, self.pack(game))
+        context = ndb.get_context()
+        for attempt in range(MEMCACHE_ATTEMPTS):
+            cached = yield context.memcache_get(key, for_cas=True)
+            if cached is None:
+                added = yield context.memcache_add(
+                    key, entry, MEMCACHE_SECONDS)
+            elif cached[0] >= game.version:
+                return      # a newer version is cached already
+            else:
+                added = yield context.memcache_cas(
+                    key, entry, MEMCACHE_SECONDS)
+            if added:
+                return
+        yield context.memcache_delete(key)
+
+    def pack(self, game):
+        """return persistent fields of game for memcache"""
+        return game.to_dict()
+
+    def unpack(self, id, fields, repository):
+        """return hydrated game from fields returned by pack"""
+        game = GameState(key=ndb.Key(urlsafe=id), **fields)
+        return repository.restoreTransients(game)
+
+    def copy(self, game, repository):
+        """return hydrated copy of game, sharing no changeable parts"""
+        clone = GameState(key=game.key, **game.to_dict())
+        clone.bagOfLetters = game.bagOfLetters.copy()
+        clone.boardContent = game.boardContent.copy()
+        clone.players = [repository.copyPlayer(clone, p)
+                         for p in game.players]
+        clone.savedState = game.savedState
+        return clone
+
+    def stats(self):
+        """return dict of hits in each tier, misses and local size"""
+        return {'localHits': self.local.hits,
+                'memcacheHits': self.memcacheHits,
+                'misses': self.misses,
+                'size': len(self.local)}
+
+# this instance's cache of games
+gameCache = GameCache()
+
+
+class MemcacheBroker(Broker):
+    """Broker sharing the latest version of each game between instances
+    through memcache (see hub.py).  A version is only replaced by a later
+    one, as in GameCache.  publish returns a future, so a save can wait
+    for it without blocking its other tasklets."""
+
+    @ndb.tasklet
+    def publish(self, topic, version):
+        key = VERSION_PREFIX + topic
+        context = ndb.get_context()
+        for attempt in range(MEMCACHE_ATTEMPTS):
+            latest = yield context.memcache_get(key, for_cas=True)
+            if latest is None:
+                done = yield context.memcache_add(
+                    key, version, MEMCACHE_SECONDS)
+            elif latest >= version:
+                return
+            else:
+                done = yield context.memcache_cas(
+                    key, version, MEMCACHE_SECONDS)
+            if done:
+                return
+
+    def latest(self, topic):
+        return ndb.get_context().memcache_get(
+            VERSION_PREFIX + topic).get_result()
+
+# this instance's hub of game versions, shared with other instances
+gameHub = Hub(MemcacheBroker())
 
 
 class UserRepository():
@@ -45,12 +267,71 @@ class UserRepository():
         return User.query(User.name == name).get()
 
     def all(self):
-        """return list of all users"""
-        return User.query().fetch()
+        """return iterator over all users, fetched a page at a time"""
+        return User.query().iter(batch_size=PAGE_SIZE)
+
+    def namesPage(self, cursor=None, size=PAGE_SIZE):
+        """return (names, cursor, more): up to size user names in order,
+        starting at cursor; cursor resumes with the next page.  Only
+        names are read, from the index."""
+        users, cursor, more = User.query(projection=[User.name]).order(
+            User.name).fetch_page(size, start_cursor=cursor)
+        return [user.name for user in users], cursor, more
+
+
+class LegacyCursor(object):
+    """Cursor into the second part of GameStateRepository.idsPageForUser:
+    games found by PlayerState.  cursor is the ndb.Cursor of that query,
+    None to start it."""
+
+    def __init__(self, cursor=None):
+        self.cursor = cursor
+
+    def urlsafe(self):
+        return LEGACY_CURSOR + (self.cursor.urlsafe() if self.cursor else '')
 
 
 class GameStateRepository():
-    """access persistent collection of GameState"""
+    """access persistent collection of GameState
+
+    In the LAYOUT_AGGREGATE storage layout each game is one entity: the
+    bag, board and players (letters, score, turn and a copy of their user)
+    are encoded by codec.py into GameState.packed, so loading or saving a
+    game is a single get or put of a small blob.  LAYOUT_ENTITIES keeps the
+    bag and board as strings and a PlayerState entity per player.  Games
+    are read in either layout (and in the earlier GameState.playerData
+    form), and saved in the layout of the repository, so games stored
+    another way migrate when next updated (or by migrateBatch).  Either
+    way GameState.playerKeys indexes the users playing each game.
+
+    Games stored as one entity are cached (see GameCache): findById tries
+    the cache before the datastore, and update writes through to it.
+    update also publishes each new version of a game to a Hub, so
+    waitForVersion returns as soon as a game changes.
+
+    update saves a Checkpoint of a game as it starts, whenever it is saved
+    without a move, and every CHECKPOINT_INTERVAL versions; positionAt rebuilds the game at any
+    version from the checkpoint before it and the moves since."""
+
+    def __init__(self, layout=None, cache=None, hub=None):
+        self.layout = layout or STORAGE_LAYOUT
+        self.cache = cache or gameCache
+        self.hub = hub or gameHub
+
+    def caching(self, game=None):
+        """return True if game (or any game) is cached by this repository"""
+        return self.layout == LAYOUT_AGGREGATE and (
+            game is None or not self.hasPlayerStates(game))
+
+    def hasPlayerStates(self, game):
+        """return True if game's players are stored as PlayerState entities"""
+        return game.packed is None and game.playerData is None
+
+    def inLayout(self, game):
+        """return True if game is stored in this repository's layout"""
+        if self.layout == LAYOUT_AGGREGATE:
+            return game.packed is not None
+        return self.hasPlayerStates(game)
 
     def register(self, gameState):
         """add gameState and its parts to this collection and set its identity"""
@@ -58,62 +339,460 @@ class GameStateRepository():
 
     def setPersistents(self, state):
         """set persistent fields from transient values"""
-        state.letters = state.bagOfLetters.asString()
-        state.board = ''.join(state.boardContent)
+        users = UserRepository()
+        for p in state.players:
+            if p.player.key is None:
+                users.register(p.player)
+        state.playerKeys = [p.player.key for p in state.players]
+        if self.layout == LAYOUT_AGGREGATE:
+            state.packed = codec.encodeGame(state, self.userFields)
+            state.letters = state.board = None
+        else:
+            state.packed = None
+            state.letters = state.bagOfLetters.asString()
+            state.board = state.boardContent.asString()
+        state.playerData = None
         return state
 
+    def snapshot(self, state):
+        """return persistent fields of state, to tell if it has changed"""
+        return (state.packed, state.letters, state.board, state.turn,
+                state.mode, state.consecutivePasses, state.playerData,
+                tuple(state.playerKeys), state.tallied)
+
     def restoreTransients(self, state):
         """set transient values from persistent fields"""
-        state.bagOfLetters = LetterBag.fromString(state.letters)
-        state.boardContent = list(state.board)  # list support random access
+        if state.packed is not None:
+            packed = codec.decodeGame(state.packed)
+            state.bagOfLetters = LetterBag.fromCounts(packed.counts)
+            state.boardContent = Board.fromCells(
+                state.width, state.height, packed.cells)
+            state.players = [
+                self.newPlayer(state, self.userFrom(p.user), p.turnNumber,
+                               LetterBag.fromCounts(p.counts), p.score)
+                for p in packed.players]
+        else:
+            state.bagOfLetters = LetterBag.fromString(state.letters)
+            state.boardContent = Board.fromString(
+                state.width, state.height, state.board)
+            if state.playerData is not None:
+                state.players = [self.unpackPlayer(state, data)
+                                 for data in state.playerData]
+        state.savedState = self.snapshot(state)
         return state
 
-    def update(self, gameState):
-        """update persistent gameState and its parts in this collection"""
+    def userFields(self, user):
+        """return list of strings kept for user in GameState.packed"""
+        return [user.key.urlsafe(), user.name, user.email or '',
+                'bot' if user.bot else '']
+
+    def userFrom(self, fields):
+        """return User from the strings returned by userFields"""
+        key, name, email, bot = fields
+        return User(key=ndb.Key(urlsafe=key), name=name,
+                    email=email or None, bot=bool(bot))
+
+    def newPlayer(self, game, user, turnNumber, bag, score):
+        """return PlayerState of user in game, restored from its parts"""
+        p = PlayerState(gameKey=game.key, userKey=user.key,
+                        turnNumber=turnNumber, score=score)
+        p.game = game
+        p.player = user
+        p.bag = bag
+        return p
+
+    def copyPlayer(self, game, p):
+        """return copy of player p for game, a copy of p's game"""
+        user = p.player
+        return self.newPlayer(
+            game, User(key=user.key, name=user.name, email=user.email,
+                       bot=user.bot),
+            p.turnNumber, p.bag.copy(), p.score)
+
+    def unpackPlayer(self, game, data):
+        """return PlayerState of game from a GameState.playerData dict"""
+        user = User(key=ndb.Key(urlsafe=data['user']), name=data['name'],
+                    email=data['email'], bot=data['bot'])
+        return self.newPlayer(game, user, data['turnNumber'],
+                              LetterBag.fromString(data['letters']),
+                              data['score'])
+
+    def update(self, gameState, related=()):
+        """update persistent gameState and its parts in this collection,
+        saving only those that changed since loaded or last saved.
+
+        related entities (e.g. a Move, with persistent fields set) are saved
+        with the game.  The first time a completed game is saved, its result
+        is counted in its players' UserStats, in the same transaction.
+        Raise ConcurrentUpdate, saving nothing, if the game was saved by
+        someone else since gameState was loaded."""
+        return self.updateAsync(gameState, related).get_result()
+
+    @ndb.tasklet
+    def updateAsync(self, gameState, related=()):
+        """return future for update(gameState, related)"""
         self.setPersistents(gameState)
-        gameState.put()
-        for p in gameState.players:
-            p.gameKey = gameState.key
-            PlayerStateRepository().update(p)
-        return gameState
+        new = gameState.key is None
+        # counted by commitIfVersion, so a game saved new stays uncounted
+        # until its next update (or tallyBatch)
+        finished = (not new and gameState.mode == MODE_OVER and
+                    not gameState.tallied)
+        if finished:
+            gameState.tallied = True
+        work = UnitOfWork()
+        snapshot = self.snapshot(gameState)
+        saved = getattr(gameState, 'savedState', None)
+        changed = new or saved != snapshot
+        loadedVersion = gameState.version or 0
+        if changed:
+            gameState.version = loadedVersion + 1
+        for entity in related:
+            work.add(entity, None)
+        if new:
+            # a new game is saved first: its players refer to its key
+            yield gameState.put_async()
+            gameState.savedState = snapshot
+        else:
+            work.add(gameState, snapshot)
+        if changed and self.checkpointDue(gameState, related):
+            work.put(Checkpoint.create(
+                gameState,
+                gameState.packed or codec.encodeGame(
+                    gameState, self.userFields)))
+        if self.layout == LAYOUT_AGGREGATE:
+            # PlayerState entities of a game stored before are replaced
+            stored = [p for p in gameState.players if p.key is not None]
+            work.delete([p.key for p in stored])
+            for p in stored:
+                p.key = None
+        else:
+            players = PlayerStateRepository()
+            for p in gameState.players:
+                players.setPersistents(p)
+                work.add(p, players.snapshot(p))
+        if changed and not new:
+            try:
+                yield ndb.transaction_async(
+                    lambda: self.commitIfVersion(
+                        work, gameState.key, loadedVersion,
+                        gameState if finished else None), xg=True)
+            except ConcurrentUpdate:
+                gameState.version = loadedVersion
+                if finished:
+                    gameState.tallied = False
+                raise
+        else:
+            yield work.commitAsync()
+        if changed and self.caching(gameState):
+            yield self.cache.putAsync(self.id(gameState), gameState, self)
+        if changed:
+            shared = self.hub.publish(self.id(gameState), gameState.version)
+            if shared is not None:
+                yield shared
+        raise ndb.Return(gameState)
+
+    def checkpointDue(self, game, related):
+        """return True if game, about to be saved at its new version with
+        related entities, needs a Checkpoint: once it has started, every
+        version not saved with a Move (as it starts or is cancelled) has
+        one, since there is no move to replay to it"""
+        if game.mode == MODE_NEW:
+            return False
+        moved = any(isinstance(entity, Move) for entity in related)
+        return not moved or game.version % CHECKPOINT_INTERVAL == 0
+
+    @ndb.tasklet
+    def commitIfVersion(self, work, key, version, finished=None):
+        """commit work if the game with key is still at version, and count
+        the result of game finished, if any, in its players' UserStats;
+        call in a transaction so no one can save the game in between"""
+        stored = yield key.get_async()
+        if stored is None or (stored.version or 0) != version:
+            raise ConcurrentUpdate(
+                'Game was changed by another request.')
+        if finished is None:
+            yield work.commitAsync()
+        else:
+            stats = UserStatsRepository()
+            yield work.commitAsync(), stats.tallyAsync(finished)
+
+    def mutate(self, id, operation, attempts=MUTATE_ATTEMPTS):
+        """Apply operation to the game with id and save it, retrying on
+        fresh state if someone else saves the game first.
+
+        operation(game) changes game and returns a list of related entities
+        to save with it (or None); exceptions it raises are not retried.
+        Return (game, related), or (None, []) if there is no such game.
+        Raise ConcurrentUpdate if every attempt conflicted."""
+        return self.mutateAsync(id, operation, attempts).get_result()
+
+    @ndb.tasklet
+    def mutateAsync(self, id, operation, attempts=MUTATE_ATTEMPTS):
+        """return future for mutate(id, operation, attempts)"""
+        delay = MUTATE_BACKOFF
+        for attempt in range(attempts):
+            # after a conflict, skip the cache and load the saved game
+            game = yield self.findByIdAsync(id, fresh=attempt > 0)
+            if game is None:
+                raise ndb.Return(None, [])
+            related = operation(game) or []
+            try:
+                yield self.updateAsync(game, related)
+                raise ndb.Return(game, related)
+            except ConcurrentUpdate:
+                if attempt == attempts - 1:
+                    raise
+            yield ndb.sleep(delay * random.uniform(0.5, 1.5))
+            delay *= 2
 
     def id(self, gameState):
         """return identity for this gameState"""
         return gameState.key.urlsafe()
 
-    def findById(self, id):
-        """return gameState with this id"""
+    def findById(self, id, fresh=False):
+        """return gameState with this id; fresh skips the cache"""
+        return self.findByIdAsync(id, fresh).get_result()
+
+    @ndb.tasklet
+    def findByIdAsync(self, id, fresh=False):
+        """return future for findById(id, fresh)"""
+        if self.caching() and not fresh:
+            game = yield self.cache.getAsync(id, self)
+            if game is not None:
+                raise ndb.Return(game)
         try:
-            game = get_by_urlsafe(id, GameState)
-            self.restoreTransients(game)
-            game.players = PlayerStateRepository().findByGame(game)
+            game = yield ndb.Key(urlsafe=id).get_async()
         except Exception:
             game = None
-        return game
+        if not isinstance(game, GameState):
+            raise ndb.Return(None)
+        self.restoreTransients(game)
+        if self.hasPlayerStates(game):
+            players = PlayerStateRepository()
+            states = yield players.queryByGame(game).fetch_async()
+            game.players = players.restoreAll(states, [game])
+        elif self.caching(game):
+            yield self.cache.putAsync(id, game, self)
+        raise ndb.Return(game)
+
+    def findByIds(self, ids):
+        """return list of games with ids, None for any not found.
+
+        Games are read from the cache in one batch, then the rest from the
+        datastore with one get_multi; see withPlayers for their players."""
+        return self.findByIdsAsync(ids).get_result()
+
+    @ndb.tasklet
+    def findByIdsAsync(self, ids):
+        """return future for findByIds(ids)"""
+        games = [None] * len(ids)
+        if self.caching():
+            # concurrent memcache reads are sent as one batch
+            games = yield [self.cache.getAsync(id, self) for id in ids]
+        keys = {}
+        for i, id in enumerate(ids):
+            if games[i] is None:
+                try:
+                    keys[i] = ndb.Key(urlsafe=id)
+                except Exception:
+                    pass    # not a valid id: no such game
+        order = keys.keys()
+        found = yield ndb.get_multi_async([keys[i] for i in order])
+        loaded = [game for game in found if isinstance(game, GameState)]
+        self.withPlayers(loaded)
+        for i, game in zip(order, found):
+            if isinstance(game, GameState):
+                games[i] = game
+        raise ndb.Return(games)
+
+    def versionOf(self, id):
+        """return version of game with id, or None if there is no such
+        game, without restoring the game or its players"""
+        return self.versionOfAsync(id).get_result()
+
+    @ndb.tasklet
+    def versionOfAsync(self, id):
+        """return future for versionOf(id)"""
+        if self.caching():
+            version = yield self.cache.versionAsync(id)
+            if version is not None:
+                raise ndb.Return(version)
+        try:
+            game = yield ndb.Key(urlsafe=id).get_async()
+        except Exception:
+            game = None
+        if not isinstance(game, GameState):
+            raise ndb.Return(None)
+        raise ndb.Return(game.version or 0)
+
+    def waitForVersion(self, id, version, timeout):
+        """Wait up to timeout seconds for the game with id to be saved
+        with a version after version.  Return that version as soon as it
+        is, or None if it is not by the timeout."""
+        return self.hub.wait(id, version, timeout)
+
+    def positionAt(self, game, version):
+        """return a copy of game as saved at version, or None if no
+        Checkpoint of game was saved at or before version.
+
+        The copy is rebuilt from the latest such checkpoint by replaying
+        the moves saved after it, at most CHECKPOINT_INTERVAL of them; it
+        is for reading only."""
+        if version < 0 or version > game.version:
+            return None
+        checkpoint = Checkpoint.query(
+            Checkpoint.version <= version, ancestor=game.key).order(
+                -Checkpoint.version).get()
+        if checkpoint is None:
+            return None
+        moves = Move.query(
+            Move.gameKey == game.key, Move.version > checkpoint.version,
+            Move.version <= version).order(Move.version).fetch()
+        position = GameState(
+            key=game.key, width=game.width, height=game.height,
+            packed=checkpoint.state, turn=checkpoint.turn,
+            consecutivePasses=checkpoint.consecutivePasses,
+            mode=checkpoint.mode, version=version,
+            createdTime=game.createdTime)
+        self.restoreTransients(position)
+        for move in moves:
+            self.replay(position, move)
+        return position
+
+    def replay(self, game, move):
+        """apply move, saved with the version after game's, to game"""
+        user = MoveRepository().getPlayer(game, move)
+        if move.word:
+            board = game.boardContent
+            game.replayWord(
+                user, [board.coordinates(i) for i in move.placed],
+                move.letters, LetterBag.fromString(move.drawn or ''),
+                move.moveScore)
+        else:
+            game.skipTurn(user)
+
+    def idsForUser(self, user):
+        """return ids of games where user is a player"""
+        ids, cursor, more = self.idsPageForUser(user)
+        while more:
+            page, cursor, more = self.idsPageForUser(user, cursor)
+            ids.extend(page)
+        return ids
+
+    def idsPageForUser(self, user, cursor=None, size=PAGE_SIZE):
+        """return (ids, cursor, more): ids of up to size games where user
+        is a player, starting at cursor; cursor resumes with the next page.
+
+        Games indexed by GameState.playerKeys are listed first, then games
+        saved before that index, found through their PlayerState entities
+        (a LegacyCursor pages through those)."""
+        ids = []
+        if not isinstance(cursor, LegacyCursor):
+            keys, cursor, more = GameState.query(
+                GameState.playerKeys == user.key).fetch_page(
+                    size, start_cursor=cursor, keys_only=True)
+            ids = [key.urlsafe() for key in keys]
+            if more:
+                return ids, cursor, more
+            cursor = LegacyCursor()
+            if len(ids) == size:
+                more = PlayerState.query(
+                    PlayerState.userKey == user.key).get(
+                        keys_only=True) is not None
+                return ids, cursor, more
+        legacy, next, more = self.legacyPageForUser(
+            user, cursor.cursor, size - len(ids))
+        return ids + legacy, LegacyCursor(next), more
+
+    def legacyPageForUser(self, user, cursor, size):
+        """return (ids, cursor, more) for a page of size PlayerStates of
+        user: ids of their games that lack GameState.playerKeys"""
+        players, cursor, more = PlayerState.query(
+            PlayerState.userKey == user.key).fetch_page(
+                size, start_cursor=cursor)
+        games = ndb.get_multi([p.gameKey for p in players])
+        return ([game.key.urlsafe() for game in games
+                 if game is not None and not game.playerKeys],
+                cursor, more)
+
+    def cursorForUser(self, urlsafe):
+        """return cursor for idsPageForUser from its urlsafe() string"""
+        if urlsafe.startswith(LEGACY_CURSOR):
+            rest = urlsafe[len(LEGACY_CURSOR):]
+            return LegacyCursor(ndb.Cursor(urlsafe=rest) if rest else None)
+        return ndb.Cursor(urlsafe=urlsafe)
+
+    def migrateBatch(self, cursor=None, size=MIGRATION_BATCH):
+        """Save games stored another way in this repository's layout, size
+        games at a time.  Return (migrated, cursor, more)
+        where cursor resumes with the next batch."""
+        games, cursor, more = GameState.query().fetch_page(
+            size, start_cursor=cursor)
+        legacy = [game for game in games if not self.inLayout(game)]
+        for game in self.withPlayers(legacy):
+            self.update(game)
+        return len(legacy), cursor, more
+
+    def tallyBatch(self, cursor=None, size=MIGRATION_BATCH):
+        """Count completed games not yet counted in their players'
+        UserStats, size games at a time.  Return (tallied, cursor, more)
+        where cursor resumes with the next batch."""
+        games, cursor, more = GameState.query(
+            GameState.mode == MODE_OVER).fetch_page(size, start_cursor=cursor)
+        untallied = [game for game in games if not game.tallied]
+        for game in self.withPlayers(untallied):
+            try:
+                self.update(game)
+            except ConcurrentUpdate:
+                pass    # saved, so counted, by someone else
+        return len(untallied), cursor, more
 
     def allCompleted(self):
-        """Return all games in completed state."""
-        all = GameState.query(GameState.mode == 'over').fetch()
-        for game in all:
-            game.players = PlayerStateRepository().findByGame(game)
-            self.restoreTransients(game)
-        return all
+        """Return iterator over all games in completed state."""
+        return self.allInMode(MODE_OVER)
 
     def allActive(self):
-        """Return all games in active state."""
-        all = GameState.query(GameState.mode == 'playing').fetch()
-        for game in all:
-            game.players = PlayerStateRepository().findByGame(game)
+        """Return iterator over all games in active state."""
+        return self.allInMode(MODE_PLAYING)
+
+    def allInMode(self, mode, size=PAGE_SIZE):
+        """Yield all games in mode, restoring size games at a time."""
+        for games in pages(GameState.query(GameState.mode == mode), size):
+            for game in self.withPlayers(games):
+                yield game
+
+    def pageInMode(self, mode, cursor=None, size=PAGE_SIZE):
+        """Return (games, cursor, more): up to size games in mode, with
+        their players, starting at cursor; cursor resumes with the next
+        page."""
+        games, cursor, more = GameState.query(
+            GameState.mode == mode).fetch_page(size, start_cursor=cursor)
+        return self.withPlayers(games), cursor, more
+
+    def withPlayers(self, games):
+        """Restore games and their players, with a constant number of RPCs.
+
+        Players of games stored as PlayerState entities are queried for
+        all games concurrently, and their users fetched in one batch."""
+        for game in games:
             self.restoreTransients(game)
-        return all
+        legacy = [game for game in games if self.hasPlayerStates(game)]
+        players = PlayerStateRepository()
+        queries = [players.queryByGame(game).fetch_async() for game in legacy]
+        states = [q.get_result() for q in queries]
+        players.restoreAll([p for list in states for p in list], legacy)
+        for game, list in zip(legacy, states):
+            game.players = list
+        return games
 
     def playersToNotify(self):
         """Find players who've taken more than 5 minutes to play their turn.
         but filter out those who've already been notified.
         Return PlayerState objects that include reference to game."""
         idleGames = [game for game in self.allActive() if self.idle(game)]
-        # get list of users whose turn it is
-        playersUp = [game.nextPlayer() for game in idleGames]
+        # get list of users whose turn it is (bots play without reminders)
+        playersUp = [game.nextPlayer() for game in idleGames
+                     if not game.nextPlayer().player.bot]
         # filter out those who have alread been notified in the last day
         skipList = NotificationRepository().getUsersRecentlyNotified()
         return [p for p in playersUp if self.notify(p.player, skipList)]
@@ -141,10 +820,11 @@ class PlayerStateRepository():
         return self.update(p)
 
     def update(self, p):
-        """update playerState in collection"""
-        UserRepository().update(p.player)
+        """update playerState in collection if it has changed"""
         self.setPersistents(p)
-        p.put()
+        work = UnitOfWork()
+        work.add(p, self.snapshot(p))
+        work.commit()
         return p
 
     def id(self, p):
@@ -153,36 +833,92 @@ class PlayerStateRepository():
 
     def setPersistents(self, state):
         """set persistent fields from transient values"""
+        if state.player.key is None:
+            UserRepository().register(state.player)
         state.gameKey = state.game.key
         state.userKey = state.player.key
         state.letters = state.bag.asString()
         return state
 
+    def snapshot(self, state):
+        """return persistent fields of state, to tell if it has changed"""
+        return (state.gameKey, state.userKey, state.turnNumber,
+                state.letters, state.score)
+
     def restoreTransients(self, state):
         """set (derive) transient values from persistent fields"""
-        state.game = state.gameKey.get()
-        state.player = state.userKey.get()
-        state.bag = LetterBag.fromString(state.letters)
+        self.restoreAll([state])
         return state
 
+    def restoreAll(self, states, known=()):
+        """restore transient values of all states, fetching their games and
+        users in one batch.  Entities in known (e.g. the game being
+        loaded) are used as they are instead of being fetched again."""
+        loaded = resolveKeys(
+            [key for p in states for key in (p.gameKey, p.userKey)], known)
+        for p in states:
+            p.game = loaded[p.gameKey]
+            p.player = loaded[p.userKey]
+            p.bag = LetterBag.fromString(p.letters)
+            p.savedState = self.snapshot(p)
+        return states
+
     def findById(self, id):
         """return player with this id"""
         p = get_by_urlsafe(id, PlayerState)
         return self.restoreTransients(p)
 
+    def queryByGame(self, game):
+        """return query for players in this game"""
+        return PlayerState.query(PlayerState.gameKey == game.key)
+
     def findByGame(self, game):
         """return list of players in this game"""
-        list = PlayerState.query(PlayerState.gameKey == game.key).fetch()
-        for p in list:
-            self.restoreTransients(p)
-        return list
+        return self.restoreAll(self.queryByGame(game).fetch(), [game])
 
     def findByUser(self, user):
         """return list of game-player roles for this user"""
         list = PlayerState.query(PlayerState.userKey == user.key).fetch()
-        for p in list:
-            self.restoreTransients(p)
-        return list
+        return self.restoreAll(list, [user])
+
+
+class UserStatsRepository():
+    """access persistent collection of UserStats, each user's record in
+    completed games, kept up to date as games complete (see
+    GameStateRepository.update)"""
+
+    def key(self, user):
+        """return key of user's UserStats"""
+        return ndb.Key(UserStats, user.key.id())
+
+    def findByUser(self, user):
+        """return UserStats of user, or None if user completed no games"""
+        return self.key(user).get()
+
+    @ndb.tasklet
+    def tallyAsync(self, game):
+        """return future for saving game's result in the UserStats of its
+        players; call in the transaction that saves the completed game"""
+        winner = game.leader().player.key
+        players = dict((p.player.key, p) for p in game.players)
+        users = players.keys()
+        keys = [self.key(players[user].player) for user in users]
+        found = yield ndb.get_multi_async(keys)
+        stats = []
+        for user, key, record in zip(users, keys, found):
+            p = players[user]
+            record = record or UserStats.create(key, p.player)
+            record.record(user == winner, p.score)
+            stats.append(record)
+        yield ndb.put_multi_async(stats)
+        raise ndb.Return(stats)
+
+    def rankingPage(self, cursor=None, size=PAGE_SIZE):
+        """return (stats, cursor, more): up to size UserStats, highest
+        win/loss ratio first, starting at cursor; cursor resumes with the
+        next page"""
+        return UserStats.query().order(-UserStats.ratio).fetch_page(
+            size, start_cursor=cursor)
 
 
 class MoveRepository():
@@ -194,9 +930,18 @@ class MoveRepository():
 
     def update(self, move):
         """update move in collection"""
+        return self.updateAsync(move).get_result()
+
+    def registerAsync(self, move):
+        """return future for register(move)"""
+        return self.updateAsync(move)
+
+    @ndb.tasklet
+    def updateAsync(self, move):
+        """return future for update(move)"""
         self.setPersistents(move)
-        move.put()
-        return move
+        yield move.put_async()
+        raise ndb.Return(move)
 
     def setPersistents(self, move):
         """set persistent fields from transient values"""
@@ -209,12 +954,49 @@ class MoveRepository():
         return move.key.urlsafe()
 
     def historyForGame(self, game):
-        """return list of moves from this game"""
-        list = Move.query(Move.gameKey == game.key).fetch()
-        for move in list:
+        """return list of moves from this game, oldest first"""
+        moves = []
+        for page in pages(self.queryByGame(game)):
+            moves.extend(self.restoreAll(game, page))
+        return moves
+
+    def historyPage(self, game, cursor=None, size=PAGE_SIZE):
+        """return (moves, cursor, more): up to size moves from this game,
+        oldest first, starting at cursor; cursor resumes with the next
+        page"""
+        moves, cursor, more = self.queryByGame(game).fetch_page(
+            size, start_cursor=cursor)
+        return self.restoreAll(game, moves), cursor, more
+
+    def changesSince(self, game, version):
+        """return (placed, users) for the changes to game since version:
+        the set of board indexes where letters were placed and the set of
+        keys of the users who moved, changing their letters and score.
+        Return None if those are not all the changes: if a version since
+        was saved without a move (as when the game started), or its move
+        was saved before moves recorded versions."""
+        moves = Move.query(
+            Move.gameKey == game.key, Move.version > version).fetch()
+        saved = set(range(version + 1, game.version + 1))
+        if not saved <= set(move.version for move in moves):
+            return None
+        placed = set()
+        users = set()
+        for move in moves:
+            placed.update(move.placed)
+            users.add(move.userKey)
+        return placed, users
+
+    def queryByGame(self, game):
+        """return query for moves from this game, in the order played"""
+        return Move.query(Move.gameKey == game.key).order(Move.time)
+
+    def restoreAll(self, game, moves):
+        """set transient values of moves from game"""
+        for move in moves:
             move.game = game
             move.user = self.getPlayer(game, move)
-        return list
+        return moves
 
     def getPlayer(self, game, move):
         """get user for this move from game by userKey"""
@@ -234,12 +1016,14 @@ class NotificationRepository():
     def getUsersRecentlyNotified(self):
         "Return list of Users notified in the last 24 hours."
         now = datetime.datetime.now()
-        yesterday = now - datetime.timedelta(days=1)
+        return self.usersNotifiedSince(now - datetime.timedelta(days=1))
+
+    def usersNotifiedSince(self, since):
+        "Return list of Users notified since datetime since."
         lastDaysNotes = Notification.query(
-            Notification.createdTime > yesterday).fetch()
-        for note in lastDaysNotes:
-            self.restoreTransients(note)
-        return [note.user for note in lastDaysNotes]
+            Notification.createdTime > since).fetch()
+        loaded = resolveKeys([note.userKey for note in lastDaysNotes])
+        return [loaded[note.userKey] for note in lastDaysNotes]
 
     def registerTurnNotification(self, user, game):
         "Register an It's Your Turn email has been sent to user."
@@ -266,3 +1050,57 @@ class NotificationRepository():
         note.game = note.gameKey.get()
         note.user = note.userKey.get()
         return note
+
+
+class NdbStore(Store):
+    """Store (see storage.py) keeping users, games and their history in the
+    datastore, through the repositories above."""
+
+    def __init__(self, layout=None):
+        self.users = UserRepository()
+        self.games = GameStateRepository(layout)
+        self.moves = MoveRepository()
+        self.notifications = NotificationRepository()
+
+    def id(self, entity):
+        return entity.key.urlsafe()
+
+    def registerUser(self, user):
+        return self.users.register(user)
+
+    def findUserByName(self, name):
+        return self.users.findByName(name)
+
+    def allUsers(self):
+        return list(self.users.all())
+
+    def registerGame(self, game):
+        return self.games.register(game)
+
+    def updateGame(self, game):
+        return self.games.update(game)
+
+    def findGame(self, id):
+        return self.games.findById(id)
+
+    def gamesInMode(self, mode):
+        return list(self.games.allInMode(mode))
+
+    def gameIdsForUser(self, user):
+        return self.games.idsForUser(user)
+
+    def mutateGame(self, id, operation, attempts=MUTATE_ATTEMPTS):
+        return self.games.mutate(id, operation, attempts)[0]
+
+    def registerMove(self, move):
+        return self.moves.register(move)
+
+    def movesForGame(self, game):
+        return self.moves.historyForGame(game)
+
+    def registerNotification(self, game, user, description):
+        self.notifications.register(
+            Notification.create(game, user, description))
+
+    def usersNotifiedSince(self, since):
+        return self.notifications.usersNotifiedSince(since)
@@ -0,0 +1,93 @@
+"""scoring.py - Find and score every word formed by placing new letters.
+
+A play puts new letters on empty squares of one row or column.  It forms
+a main word (the contiguous run of letters along the play, including
+letters already on the board at either end) plus one cross-word for each
+new letter that touches letters perpendicular to the play.  Word extents
+come from the board's occupancy bitmasks for the line of the play and the
+perpendicular lines through each new letter, and only the letters of the
+words found are read, so the cost is O(letters placed x word length),
+whatever the board size."""
+
+from board import runAround
+from letters import letterValue
+
+
+class ScoredWord(object):
+    """A word formed by a play, where it starts and what it scored."""
+
+    def __init__(self, word, x, y, across, score):
+        self.word = word
+        self.x = x
+        self.y = y
+        self.across = across
+        self.score = score
+
+    def __repr__(self):
+        return '{}@({},{},{})={}'.format(
+            self.word, self.x, self.y,
+            'across' if self.across else 'down', self.score)
+
+
+def scorePlacement(board, placed, across):
+    """Return ScoredWord list for new letters placed on board.
+
+    placed maps (x, y) to a letter for each new letter, none of which are
+    on the board yet; board is not changed.  across gives the direction of
+    the play, which decides the main word when only one letter is placed.
+    The main word comes first, followed by cross-words in play order."""
+    if not placed:
+        return []
+    squares = sorted(placed)    # all in one line, so this is play order
+    crosses = []
+    for x, y in squares:
+        # the only new letter in its perpendicular line is this one
+        if across:
+            mask = board.cols[x] | (1 << y)
+        else:
+            mask = board.rows[y] | (1 << x)
+        cross = wordThrough(board, placed, x, y, not across, mask)
+        if cross is not None:
+            crosses.append(cross)
+    x, y = squares[0]
+    mask = board.lineMask(across, y if across else x)
+    for px, py in squares:
+        mask |= 1 << (px if across else py)
+    # a lone letter touching nothing still scores as a one letter word
+    main = wordThrough(board, placed, x, y, across, mask,
+                       2 if crosses else 1)
+    if main is None:
+        return crosses
+    return [main] + crosses
+
+
+def wordThrough(board, placed, x, y, across, mask, minimum=2):
+    """Return ScoredWord for the run of letters through (x, y), or None
+    if the run is shorter than minimum letters.
+
+    mask is the occupancy bitmask of the line through (x, y) in the given
+    direction, including placed letters."""
+    start, end = runAround(mask, x if across else y)
+    if end - start < minimum:
+        return None
+    letters = []
+    for pos in range(start, end):
+        square = (pos, y) if across else (x, pos)
+        letter = placed.get(square)
+        if letter is None:
+            letter = board.letter(square[0], square[1])
+        letters.append(letter)
+    word = ''.join(letters)
+    if across:
+        return ScoredWord(word, start, y, across, wordValue(word))
+    return ScoredWord(word, x, start, across, wordValue(word))
+
+
+def wordValue(word):
+    """Return sum of letter values in word."""
+    return sum([letterValue[l] for l in word])
+
+
+def total(scored):
+    """Return total score of a list of ScoredWord."""
+    return sum([s.score for s in scored])
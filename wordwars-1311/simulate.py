@@ -0,0 +1,206 @@
+"""simulate.py - Play complete games headless, without the datastore.
+
+Games are played with the plain Game/Player/Member classes from game.py,
+so the same rules as the service run at full speed with no ndb or App
+Engine SDK.  Each game uses its own seeded random.Random, so a run is
+reproducible from its seed.  Games are split into shards across worker
+processes and the run reports games/sec and moves/sec.
+
+Strategies decide each player's move from the game and the player's
+state: 'greedy' plays the best scoring move, 'random' plays any legal move
+found and 'pass' always skips.  Use it to compare letter distributions
+(see letters.duplicates) or benchmark engine changes, e.g.:
+
+    python simulate.py --dictionary words.dawg --games 1000 --processes 4
+
+With --store, every move is loaded from and saved to a storage backend
+(see storage.py) as the service would, to compare backends' throughput:
+
+    python simulate.py --store sqlite:games.db --processes 1
+"""
+
+import argparse
+import multiprocessing
+import random
+import time
+
+from game import Game, Member, MODE_OVER
+from letters import LetterBag
+from storage import HistoryEntry, openStore
+import dictionary
+import movegen
+import scoring
+
+# stop a game that has not ended after this many moves
+MAX_MOVES = 1000
+
+
+def greedy(game, playerState, lexicon, rng):
+    best = movegen.suggestMoves(
+        lexicon, game.boardContent, playerState.bag, 1, timeBudget=None)
+    return best[0] if best else None
+
+
+def anyMove(game, playerState, lexicon, rng):
+    moves = list(movegen.MoveGenerator(
+        lexicon, game.boardContent, playerState.bag, timeBudget=None).generate())
+    return rng.choice(moves) if moves else None
+
+
+def alwaysPass(game, playerState, lexicon, rng):
+    return None
+
+STRATEGIES = {'greedy': greedy, 'random': anyMove, 'pass': alwaysPass}
+
+
+def playGame(seed, strategies, lexicon, width=10, height=10, letters=None,
+             store=None):
+    """Play one game to the end; return dict of statistics about it.
+
+    strategies is a list of strategy functions, one per player.  If store
+    is given, the game is loaded from it before each move and the game and
+    move saved to it after."""
+    rng = random.Random(seed)
+    game = Game.create(width, height, letters and letters.copy())
+    game.rng = rng
+    for i in range(len(strategies)):
+        game.addPlayer(Member('player{}-{}'.format(seed, i)))
+    game.start()
+    if store is not None:
+        store.registerGame(game)
+    moves = plays = 0
+    while game.mode != MODE_OVER and moves < MAX_MOVES:
+        if store is not None:
+            game = store.findGame(store.id(game))
+            game.rng = rng
+        playerState = game.nextPlayer()
+        user = playerState.player
+        move = strategies[playerState.turnNumber](
+            game, playerState, lexicon, rng)
+        if move is None:
+            game.skipTurn(user)
+            scored = []
+        else:
+            scored = game.playWord(
+                user, move.x, move.y, move.across, move.word)
+            plays += 1
+        moves += 1
+        if store is not None:
+            store.updateGame(game)
+            if move is None:
+                store.registerMove(HistoryEntry(
+                    game, user, '', None, None, None, 0))
+            else:
+                store.registerMove(HistoryEntry(
+                    game, user, move.word, move.across, move.x, move.y,
+                    scoring.total(scored), scored))
+    return {
+        'moves': moves,
+        'plays': plays,
+        'scores': [p.score for p in game.players],
+        'lettersLeft': game.bagOfLetters.contentCount(),
+    }
+
+
+def runShard(args):
+    """Play games for seeds in one shard; return summed statistics."""
+    (seeds, strategyNames, dictionaryPath, width, height, letters,
+     storeSpec) = args
+    lexicon = dictionary.Dictionary.load(dictionaryPath)
+    # validate plays against the same words they are generated from
+    dictionary.install(lexicon)
+    store = storeSpec and openStore(storeSpec)
+    strategies = [STRATEGIES[name] for name in strategyNames]
+    bag = letters and LetterBag.fromString(letters)
+    totals = {'games': 0, 'moves': 0, 'plays': 0, 'points': 0,
+              'lettersLeft': 0, 'wins': [0] * len(strategies)}
+    for seed in seeds:
+        stats = playGame(
+            seed, strategies, lexicon, width, height, bag, store)
+        totals['games'] += 1
+        totals['moves'] += stats['moves']
+        totals['plays'] += stats['plays']
+        totals['points'] += sum(stats['scores'])
+        totals['lettersLeft'] += stats['lettersLeft']
+        scores = stats['scores']
+        totals['wins'][scores.index(max(scores))] += 1
+    return totals
+
+
+def simulate(games, strategyNames, dictionaryPath, processes=1, seed=0,
+             width=10, height=10, letters=None, store=None):
+    """Play games across processes; return dict of totals and rates.
+
+    store is None or a storage backend spec for storage.openStore; each
+    process opens its own store."""
+    processes = max(1, processes)
+    seeds = range(seed, seed + games)
+    shards = [(seeds[i::processes], strategyNames, dictionaryPath,
+               width, height, letters, store) for i in range(processes)]
+    start = time.time()
+    if processes == 1:
+        results = [runShard(shards[0])]
+    else:
+        workers = multiprocessing.Pool(processes)
+        try:
+            results = workers.map(runShard, shards)
+        finally:
+            workers.close()
+    elapsed = time.time() - start
+    report = {'games': 0, 'moves': 0, 'plays': 0, 'points': 0,
+              'lettersLeft': 0, 'wins': [0] * len(strategyNames)}
+    for totals in results:
+        for name in ('games', 'moves', 'plays', 'points', 'lettersLeft'):
+            report[name] += totals[name]
+        report['wins'] = [a + b for a, b in zip(report['wins'],
+                                                totals['wins'])]
+    report['seconds'] = elapsed
+    report['gamesPerSecond'] = report['games'] / max(elapsed, 1e-9)
+    report['movesPerSecond'] = report['moves'] / max(elapsed, 1e-9)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate WordWars games.')
+    parser.add_argument('--dictionary', default=dictionary.DEFAULT_PATH,
+                        help='compiled dictionary file (see dictionary.py)')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--processes', type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first game; games use seed+n')
+    parser.add_argument('--players', default='greedy,greedy',
+                        help='comma separated strategy for each player: '
+                        + ', '.join(sorted(STRATEGIES)))
+    parser.add_argument('--width', type=int, default=10)
+    parser.add_argument('--height', type=int, default=10)
+    parser.add_argument('--letters', default=None,
+                        help='letters in the bag, e.g. aaabbc '
+                        '(default: standard set)')
+    parser.add_argument('--store', default=None,
+                        help='save every move to a storage backend: memory, '
+                        'sqlite (in memory) or sqlite:FILE')
+    args = parser.parse_args()
+    strategyNames = args.players.split(',')
+    for name in strategyNames:
+        if name not in STRATEGIES:
+            parser.error('unknown strategy {}'.format(name))
+    report = simulate(args.games, strategyNames, args.dictionary,
+                      args.processes, args.seed, args.width, args.height,
+                      args.letters, args.store)
+    games = max(report['games'], 1)
+    print('{} games, {} moves in {:.2f}s: {:.1f} games/sec, '
+          '{:.1f} moves/sec'.format(
+              report['games'], report['moves'], report['seconds'],
+              report['gamesPerSecond'], report['movesPerSecond']))
+    print('average {:.1f} plays, {:.1f} points, {:.1f} letters left '
+          'per game'.format(
+              report['plays'] / float(games), report['points'] / float(games),
+              report['lettersLeft'] / float(games)))
+    print('wins by player: {}'.format(
+        ', '.join(['{}={}'.format(name, wins) for name, wins in
+                   zip(strategyNames, report['wins'])])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,521 @@
+"""storage.py - Storage interface for users, games and their history, with
+backends that run without App Engine.
+
+Store is the interface simulate.py and the tests save through; the game
+service itself (api.py, bots.py) uses the repositories in repositories.py
+directly.  NdbStore (in repositories.py) adapts those repositories to
+Store; MemoryStore and SQLiteStore save the plain Game, Player and Member
+classes from game.py, so the engine can be run, load tested and
+benchmarked on any machine with Python, e.g. simulate.py --store
+sqlite:games.db.
+
+Every backend hands out copies: a game found twice gives two independent
+objects, and changes are only kept when saved with updateGame.  Games
+carry a version, incremented by each save, and updateGame raises
+ConcurrentUpdate if the game was saved by someone else since it was
+loaded; mutateGame retries such changes on the latest game.
+
+The plain backends save a game's bag, board and players in the compact
+encoding of codec.py, with each player's user given by its id."""
+
+import datetime
+import json
+import random
+import sqlite3
+import threading
+import time
+
+from board import Board
+import codec
+from game import Game, Player, Member
+from letters import LetterBag
+
+# attempts Store.mutateGame makes to apply a change, and seconds it waits
+# before the first retry (doubled for each further retry)
+MUTATE_ATTEMPTS = 5
+MUTATE_BACKOFF = 0.05
+
+
+class ConcurrentUpdate(Exception):
+    """Raised when a game was saved by someone else since it was loaded."""
+    pass
+
+
+class HistoryEntry(object):
+    """A move played in a game, as kept in a store's game history."""
+
+    def __init__(self, game, user, word, across, x, y, score, scored=(),
+                 time=None):
+        self.game = game
+        self.user = user
+        self.word = word
+        self.across = across
+        self.x = x
+        self.y = y
+        self.moveScore = score
+        self.words = list(scored)   # list of scoring.ScoredWord
+        self.time = time or datetime.datetime.now()
+
+
+class ScoredRecord(object):
+    """A word scored by a move, as read back from a store."""
+
+    def __init__(self, word, score, across, x, y):
+        self.word = word
+        self.score = score
+        self.across = across
+        self.x = x
+        self.y = y
+
+
+class Store(object):
+    """Interface to a collection of users, games, moves and notifications.
+
+    Users, games and moves are given an id when registered; id(entity)
+    returns it as a string."""
+
+    def id(self, entity):
+        raise NotImplementedError()
+
+    # users
+
+    def registerUser(self, user):
+        """add user to the store, set its identity and return it"""
+        raise NotImplementedError()
+
+    def findUserByName(self, name):
+        """return user with this name, or None"""
+        raise NotImplementedError()
+
+    def allUsers(self):
+        """return list of all users"""
+        raise NotImplementedError()
+
+    # games
+
+    def registerGame(self, game):
+        """add game and its players to the store; return game"""
+        raise NotImplementedError()
+
+    def registerPlayers(self, game):
+        """register the users playing game who are not in the store yet"""
+        for p in game.players:
+            if getattr(p.player, 'id', None) is None:
+                self.registerUser(p.player)
+
+    def updateGame(self, game):
+        """save changes to game, raising ConcurrentUpdate if it was saved
+        by someone else since it was loaded; return game"""
+        raise NotImplementedError()
+
+    def findGame(self, id):
+        """return game with this id, or None"""
+        raise NotImplementedError()
+
+    def gamesInMode(self, mode):
+        """return list of games in mode, e.g. MODE_PLAYING"""
+        raise NotImplementedError()
+
+    def gameIdsForUser(self, user):
+        """return ids of the games user is playing"""
+        raise NotImplementedError()
+
+    def mutateGame(self, id, operation, attempts=MUTATE_ATTEMPTS):
+        """Apply operation(game) to the game with id and save it, retrying
+        on the latest game if someone else saves it first.  Return game,
+        or None if there is no game with id."""
+        delay = MUTATE_BACKOFF
+        for attempt in range(attempts):
+            game = self.findGame(id)
+            if game is None:
+                return None
+            operation(game)
+            try:
+                return self.updateGame(game)
+            except ConcurrentUpdate:
+                if attempt == attempts - 1:
+                    raise
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay *= 2
+
+    # history
+
+    def registerMove(self, entry):
+        """add HistoryEntry (or Move) to its game's history"""
+        raise NotImplementedError()
+
+    def movesForGame(self, game):
+        """return list of moves played in game, oldest first"""
+        raise NotImplementedError()
+
+    # notifications
+
+    def registerNotification(self, game, user, description):
+        """record that user was sent a notification about game"""
+        raise NotImplementedError()
+
+    def usersNotifiedSince(self, since):
+        """return list of users notified since datetime since"""
+        raise NotImplementedError()
+
+
+def gameRecord(game):
+    """return dict of game's fields as saved by the plain backends"""
+    return {
+        'width': game.width,
+        'height': game.height,
+        'state': codec.encodeGame(game, lambda user: [str(user.id)]),
+        'turn': game.turn,
+        'mode': game.mode,
+        'consecutivePasses': game.consecutivePasses,
+        'version': getattr(game, 'version', 0),
+    }
+
+
+def playerIds(game):
+    """return ids of the users playing game"""
+    return [p.player.id for p in game.players]
+
+
+def restoreGame(id, record, users):
+    """return Game from its gameRecord; users maps user id to Member"""
+    packed = codec.decodeGame(record['state'])
+    game = Game()
+    game.id = id
+    game.width = record['width']
+    game.height = record['height']
+    game.bagOfLetters = LetterBag.fromCounts(packed.counts)
+    game.boardContent = Board.fromCells(game.width, game.height, packed.cells)
+    game.turn = record['turn']
+    game.mode = record['mode']
+    game.consecutivePasses = record['consecutivePasses']
+    game.version = record['version']
+    game.players = []
+    for data in packed.players:
+        p = Player()
+        p.game = game
+        p.player = users[int(data.user[0])]
+        p.turnNumber = data.turnNumber
+        p.bag = LetterBag.fromCounts(data.counts)
+        p.score = data.score
+        game.players.append(p)
+    return game
+
+
+def copyMember(user):
+    member = Member(user.name, user.email, user.bot)
+    member.id = user.id
+    return member
+
+
+class MemoryStore(Store):
+    """Store holding everything in this process's memory.
+
+    Safe to share between threads: each operation holds the store's lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.nextId = 1
+        self.users = {}         # id -> Member
+        self.games = {}         # id -> (gameRecord, [user id])
+        self.moves = {}         # game id -> [HistoryEntry]
+        self.notifications = []     # (time, user id)
+
+    def newId(self):
+        id = self.nextId
+        self.nextId += 1
+        return id
+
+    def id(self, entity):
+        return str(entity.id)
+
+    def registerUser(self, user):
+        with self.lock:
+            user.id = self.newId()
+            self.users[user.id] = copyMember(user)
+        return user
+
+    def findUserByName(self, name):
+        with self.lock:
+            for user in self.users.values():
+                if user.name == name:
+                    return copyMember(user)
+        return None
+
+    def allUsers(self):
+        with self.lock:
+            return [copyMember(user) for user in self.users.values()]
+
+    def registerGame(self, game):
+        self.registerPlayers(game)
+        with self.lock:
+            game.id = self.newId()
+            game.version = 1
+            self.games[game.id] = (gameRecord(game), playerIds(game))
+            self.moves[game.id] = []
+        return game
+
+    def updateGame(self, game):
+        with self.lock:
+            record, players = self.games[game.id]
+            if record['version'] != game.version:
+                raise ConcurrentUpdate('Game was changed by another request.')
+            game.version += 1
+            self.games[game.id] = (gameRecord(game), playerIds(game))
+        return game
+
+    def findGame(self, id):
+        with self.lock:
+            saved = self.games.get(int(id))
+            if saved is None:
+                return None
+            return self.restore(int(id), saved)
+
+    def restore(self, id, saved):
+        record, userIds = saved
+        users = dict((userId, copyMember(self.users[userId]))
+                     for userId in userIds)
+        return restoreGame(id, record, users)
+
+    def gamesInMode(self, mode):
+        with self.lock:
+            return [self.restore(id, saved)
+                    for id, saved in sorted(self.games.items())
+                    if saved[0]['mode'] == mode]
+
+    def gameIdsForUser(self, user):
+        with self.lock:
+            return [str(id) for id, (record, userIds)
+                    in sorted(self.games.items()) if user.id in userIds]
+
+    def registerMove(self, entry):
+        with self.lock:
+            self.moves[entry.game.id].append(entry)
+        return entry
+
+    def movesForGame(self, game):
+        with self.lock:
+            return list(self.moves.get(game.id, []))
+
+    def registerNotification(self, game, user, description):
+        with self.lock:
+            self.notifications.append((datetime.datetime.now(), user.id))
+
+    def usersNotifiedSince(self, since):
+        with self.lock:
+            return [copyMember(self.users[userId])
+                    for when, userId in self.notifications if when > since]
+
+
+SCHEMA = '''
+create table if not exists users (
+    id integer primary key,
+    name text not null unique,
+    email text,
+    bot integer not null default 0);
+create table if not exists games (
+    id integer primary key,
+    width integer not null,
+    height integer not null,
+    state blob not null,
+    turn integer not null,
+    mode text not null,
+    passes integer not null,
+    version integer not null,
+    created timestamp not null,
+    updated timestamp not null);
+create index if not exists games_mode on games (mode, updated);
+create index if not exists games_updated on games (updated);
+create table if not exists players (
+    game_id integer not null references games (id),
+    user_id integer not null references users (id),
+    turn_number integer not null,
+    primary key (game_id, turn_number));
+create index if not exists players_user on players (user_id);
+create table if not exists moves (
+    id integer primary key,
+    game_id integer not null references games (id),
+    user_id integer not null references users (id),
+    time timestamp not null,
+    word text not null,
+    across integer,
+    x integer,
+    y integer,
+    score integer not null,
+    words text not null);
+create index if not exists moves_game on moves (game_id, time);
+create table if not exists notifications (
+    id integer primary key,
+    game_id integer not null references games (id),
+    user_id integer not null references users (id),
+    description text not null,
+    created timestamp not null);
+create index if not exists notifications_created on notifications (created);
+'''
+
+
+class SQLiteStore(Store):
+    """Store saving to a SQLite database file (or ':memory:').
+
+    Each game save is one transaction, so several processes may share a
+    database file.  A game's bag, board and players are one blob in the
+    games table; the players table indexes the users playing each game."""
+
+    def __init__(self, path=':memory:'):
+        self.connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def id(self, entity):
+        return str(entity.id)
+
+    def query(self, sql, args=()):
+        with self.lock:
+            return self.connection.execute(sql, args).fetchall()
+
+    def member(self, row):
+        user = Member(row['name'], row['email'], bool(row['bot']))
+        user.id = row['id']
+        return user
+
+    def registerUser(self, user):
+        with self.lock, self.connection:
+            user.id = self.connection.execute(
+                'insert into users (name, email, bot) values (?, ?, ?)',
+                (user.name, user.email, int(bool(user.bot)))).lastrowid
+        return user
+
+    def findUserByName(self, name):
+        rows = self.query('select * from users where name = ?', (name,))
+        return self.member(rows[0]) if rows else None
+
+    def allUsers(self):
+        return [self.member(row) for row in self.query('select * from users')]
+
+    def savePlayers(self, game):
+        self.connection.execute(
+            'delete from players where game_id = ?', (game.id,))
+        self.connection.executemany(
+            'insert into players (game_id, user_id, turn_number) '
+            'values (?, ?, ?)',
+            [(game.id, p.player.id, p.turnNumber) for p in game.players])
+
+    def registerGame(self, game):
+        self.registerPlayers(game)
+        record = gameRecord(game)
+        now = datetime.datetime.now()
+        with self.lock, self.connection:
+            game.id = self.connection.execute(
+                'insert into games (width, height, state, turn, mode, '
+                'passes, version, created, updated) '
+                'values (?, ?, ?, ?, ?, ?, 1, ?, ?)',
+                (record['width'], record['height'],
+                 sqlite3.Binary(record['state']), record['turn'],
+                 record['mode'], record['consecutivePasses'],
+                 now, now)).lastrowid
+            game.version = 1
+            self.savePlayers(game)
+        return game
+
+    def updateGame(self, game):
+        record = gameRecord(game)
+        with self.lock, self.connection:
+            updated = self.connection.execute(
+                'update games set state = ?, turn = ?, mode = ?, passes = ?, '
+                'version = version + 1, updated = ? '
+                'where id = ? and version = ?',
+                (sqlite3.Binary(record['state']), record['turn'],
+                 record['mode'], record['consecutivePasses'],
+                 datetime.datetime.now(), game.id, game.version)).rowcount
+            if not updated:
+                raise ConcurrentUpdate('Game was changed by another request.')
+            self.savePlayers(game)
+        game.version += 1
+        return game
+
+    def restore(self, rows):
+        """return list of Games for rows of the games table"""
+        if not rows:
+            return []
+        ids = [row['id'] for row in rows]
+        marks = ', '.join('?' * len(ids))
+        users = dict((row['id'], self.member(row)) for row in self.query(
+            'select distinct u.* from players p '
+            'join users u on u.id = p.user_id '
+            'where p.game_id in ({})'.format(marks), ids))
+        return [restoreGame(row['id'], {
+            'width': row['width'], 'height': row['height'],
+            'state': row['state'], 'turn': row['turn'], 'mode': row['mode'],
+            'consecutivePasses': row['passes'],
+            'version': row['version']}, users)
+            for row in rows]
+
+    def findGame(self, id):
+        games = self.restore(
+            self.query('select * from games where id = ?', (int(id),)))
+        return games[0] if games else None
+
+    def gamesInMode(self, mode):
+        return self.restore(self.query(
+            'select * from games where mode = ? order by updated', (mode,)))
+
+    def gameIdsForUser(self, user):
+        return [str(row['game_id']) for row in self.query(
+            'select game_id from players where user_id = ? order by game_id',
+            (user.id,))]
+
+    def registerMove(self, entry):
+        words = json.dumps([
+            [s.word, s.score, s.across, s.x, s.y] for s in entry.words])
+        across = None if entry.across is None else int(entry.across)
+        with self.lock, self.connection:
+            entry.id = self.connection.execute(
+                'insert into moves (game_id, user_id, time, word, across, x, '
+                'y, score, words) values (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (entry.game.id, entry.user.id, entry.time, entry.word,
+                 across, entry.x, entry.y, entry.moveScore, words)).lastrowid
+        return entry
+
+    def movesForGame(self, game):
+        users = dict((p.player.id, p.player) for p in game.players)
+        moves = []
+        for row in self.query(
+                'select * from moves where game_id = ? order by time, id',
+                (game.id,)):
+            entry = HistoryEntry(
+                game, users.get(row['user_id']), row['word'],
+                None if row['across'] is None else bool(row['across']),
+                row['x'], row['y'], row['score'], time=row['time'])
+            entry.id = row['id']
+            entry.words = [ScoredRecord(*data)
+                           for data in json.loads(row['words'])]
+            moves.append(entry)
+        return moves
+
+    def registerNotification(self, game, user, description):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'insert into notifications (game_id, user_id, description, '
+                'created) values (?, ?, ?, ?)',
+                (game.id, user.id, description, datetime.datetime.now()))
+
+    def usersNotifiedSince(self, since):
+        return [self.member(row) for row in self.query(
+            'select u.* from notifications n join users u on u.id = n.user_id '
+            'where n.created > ?', (since,))]
+
+
+def openStore(spec):
+    """Return Store for spec: 'memory', 'sqlite' (an in-memory database)
+    or 'sqlite:PATH'."""
+    if spec == 'memory':
+        return MemoryStore()
+    if spec == 'sqlite':
+        return SQLiteStore()
+    if spec.startswith('sqlite:'):
+        return SQLiteStore(spec[len('sqlite:'):])
+    raise ValueError('unknown store {}'.format(spec))
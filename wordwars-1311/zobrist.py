@@ -0,0 +1,50 @@
+"""zobrist.py - Zobrist hashing of board positions and racks.
+
+Each (square, letter) pair and each (letter, count) pair of a rack gets a
+fixed random 64 bit key.  The hash of a board is the XOR of the keys of
+its letters, so placing or removing one letter updates it with a single
+XOR (see Board.setLetter).  XOR in the rack hash to identify a position a
+player searches from, e.g. as a transposition cache key in movegen.py."""
+
+import random
+
+from letters import alphabet
+
+# keys are drawn from a fixed seed so hashes agree across processes
+SEED = 0x5eed
+# highest letter count in a rack that gets its own key
+MAX_COUNT = 64
+
+_tables = {}
+_rng = random.Random(SEED)
+_rackKeys = [[_rng.getrandbits(64) for c in range(MAX_COUNT + 1)]
+             for l in alphabet]
+for _keys in _rackKeys:
+    _keys[0] = 0    # a letter the rack does not hold adds nothing
+
+
+def boardKeys(width, height):
+    """Return list of keys for a width x height board.
+
+    The key for letter number l at cell i is at index i * 26 + l."""
+    keys = _tables.get((width, height))
+    if keys is None:
+        rng = random.Random((SEED, width, height).__hash__())
+        keys = [rng.getrandbits(64)
+                for i in xrange(width * height * len(alphabet))]
+        _tables[(width, height)] = keys
+    return keys
+
+
+def rackHash(bag):
+    """Return hash of the letter counts in a LetterBag."""
+    h = 0
+    for i, count in enumerate(bag.counts):
+        if count:
+            h ^= _rackKeys[i][min(count, MAX_COUNT)]
+    return h
+
+
+def positionHash(board, bag):
+    """Return hash identifying board together with a player's rack."""
+    return board.hash ^ rackHash(bag)